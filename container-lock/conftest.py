@@ -0,0 +1,30 @@
+from unittest.mock import Mock, patch
+import pytest
+
+from container_lock.mock_redis import MockRedis
+
+
+def make_vm(index, image="kali", status="exited", labels=None, attrs=None):
+    """Mock Docker container of VM <image>_<index> with ID id<index>; exec in it succeeds"""
+    vm = Mock()
+    vm.id = f"id{index}"
+    vm.name = f"{image}_{index}"
+    vm.status = status
+    vm.labels = labels or {}
+    vm.attrs = attrs or {}
+    vm.exec_run.return_value = (0, b"")
+    return vm
+
+
+@pytest.fixture
+def docker_client():
+    """Mock Docker client used by container_lock, with every container managed by the lab"""
+    client = Mock()
+    with patch("container_lock.lock.get_docker_client", return_value=client), \
+         patch("container_lock.lock.is_managed_container", return_value=True):
+        yield client
+
+
+@pytest.fixture
+def redis_client(docker_client):
+    return MockRedis()
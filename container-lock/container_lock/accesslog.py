@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import re
+import sys
+from container_lock.config import config
+from container_lock import metrics
+
+logger = logging.getLogger(__name__)
+
+# VM routes are /vm/<container name>/... (see templates/Caddyfile.j2)
+VM_PATH = re.compile(r"^/vm/([A-Za-z0-9_.-]+)")
+
+# Sablier answers with its waiting page and this header while the VM boots
+SABLIER_STATUS_HEADER = "X-Sablier-Session-Status"
+
+# Latency histogram bucket upper bounds in seconds: 1ms to ~30min, 25% apart
+BUCKETS = [0.001 * 1.25 ** i for i in range(65)]
+
+READ_CHUNK = 64 * 1024
+MAX_LINE = 1024 * 1024
+
+
+class Histogram:
+    """Fixed-bucket histogram; memory stays constant however many values are observed"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th percentile (0 < q <= 100)"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else math.inf
+        return math.inf
+
+
+class VMStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.bytes_served = 0
+        self.latency = Histogram()
+        self.cold_starts = Histogram()
+        # Start of the current wake, while Sablier is still serving its waiting page
+        self.waking_since: float | None = None
+
+
+class AccessLogAnalyzer:
+    """Aggregates Caddy JSON access log entries per VM"""
+
+    def __init__(self, max_vms: int = 500):
+        self.max_vms = max_vms
+        self.vms: dict[str, VMStats] = {}
+        self.skipped = 0
+
+    def feed_line(self, line: str) -> None:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            self.skipped += 1
+            return
+        if isinstance(entry, dict) and entry.get("msg") == "handled request":
+            self.feed(entry)
+
+    def feed(self, entry: dict) -> None:
+        request = entry.get("request") or {}
+        match = VM_PATH.match(request.get("uri", ""))
+        if not match:
+            return
+        name = match.group(1)
+        stats = self.vms.get(name)
+        if stats is None:
+            if len(self.vms) >= self.max_vms:
+                self.skipped += 1
+                return
+            stats = self.vms[name] = VMStats()
+
+        status = entry.get("status", 0)
+        duration = float(entry.get("duration", 0))
+        end = float(entry.get("ts", 0))
+        stats.requests += 1
+        stats.bytes_served += entry.get("size", 0)
+        if status >= 500:
+            stats.errors += 1
+        # WebSocket upgrades are logged when the console closes; their duration is session length
+        if status != 101:
+            stats.latency.observe(duration)
+
+        sablier_status = (entry.get("resp_headers") or {}).get(SABLIER_STATUS_HEADER)
+        if sablier_status and "not-ready" in sablier_status:
+            if stats.waking_since is None:
+                stats.waking_since = end - duration
+        elif 200 <= status < 300 and stats.waking_since is not None:
+            stats.cold_starts.observe(max(0.0, end - stats.waking_since))
+            stats.waking_since = None
+
+    def report(self) -> dict:
+        report = {}
+        for name, stats in sorted(self.vms.items()):
+            report[name] = {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "bytes_served": stats.bytes_served,
+                "latency_p50": stats.latency.percentile(50),
+                "latency_p95": stats.latency.percentile(95),
+                "latency_p99": stats.latency.percentile(99),
+                "cold_starts": stats.cold_starts.count,
+                "cold_start_p50": stats.cold_starts.percentile(50),
+                "cold_start_p95": stats.cold_starts.percentile(95),
+                "waking": stats.waking_since is not None,
+            }
+        return report
+
+
+class LogTailer:
+    """
+    Incrementally reads new lines from a log file, following rotation
+
+    Caddy rolls access.log by renaming it, so the open handle is drained
+    before the new file at the same path is opened. A file that shrank
+    was truncated and is read again from the start.
+    """
+
+    def __init__(self, path: str, from_start: bool = True):
+        self.path = path
+        self.from_start = from_start
+        self._file = None
+        self._inode = None
+        self.offset = 0
+        self._partial = b""
+
+    def _open(self, from_start: bool) -> bool:
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self.offset = 0 if from_start else self._file.seek(0, os.SEEK_END)
+        self._file.seek(self.offset)
+        return True
+
+    def _drain(self):
+        while True:
+            chunk = self._file.read(READ_CHUNK)
+            if not chunk:
+                return
+            self.offset += len(chunk)
+            lines = (self._partial + chunk).split(b"\n")
+            self._partial = lines.pop()
+            if len(self._partial) > MAX_LINE:
+                logger.warning("Dropping oversized access log line in %s", self.path)
+                self._partial = b""
+            for line in lines:
+                if line.strip():
+                    yield line.decode("utf-8", "replace")
+
+    def read_lines(self):
+        """Yield every complete line written since the last call"""
+        if self._file is None:
+            if not self._open(self.from_start):
+                return
+            self.from_start = True  # Files appearing later are read whole
+        yield from self._drain()
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if current.st_ino != self._inode:
+            # Rotated: finish the old file, then continue with the new one
+            yield from self._drain()
+            self.close()
+            if self._open(True):
+                yield from self._drain()
+        elif current.st_size < self.offset:
+            logger.info("Access log %s was truncated, reading from the start", self.path)
+            self._file.seek(0)
+            self.offset = 0
+            self._partial = b""
+            yield from self._drain()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._partial = b""
+
+
+analyzer = AccessLogAnalyzer(max_vms=config.ACCESS_LOG_MAX_VMS)
+
+
+def poll(tailer: LogTailer, target: AccessLogAnalyzer | None = None) -> int:
+    """Feed all new access log lines to the analyzer; returns the number of lines read"""
+    target = target or analyzer
+    read = 0
+    for line in tailer.read_lines():
+        target.feed_line(line)
+        read += 1
+    return read
+
+
+async def access_log_analyzer():
+    """Background task: tail the Caddy access log every ACCESS_LOG_POLL_INTERVAL"""
+    tailer = LogTailer(config.ACCESS_LOG_PATH)
+    try:
+        while True:
+            try:
+                await asyncio.to_thread(poll, tailer)
+                await asyncio.sleep(config.ACCESS_LOG_POLL_INTERVAL)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error("Error while analyzing access log: %s", e)
+                await asyncio.sleep(config.ACCESS_LOG_POLL_INTERVAL)
+    finally:
+        tailer.close()
+
+
+def _per_vm(field):
+    def collect():
+        return {(("vm", name),): field(stats) for name, stats in analyzer.vms.items()}
+    return collect
+
+
+def _quantiles(histogram):
+    def collect():
+        result = {}
+        for name, stats in analyzer.vms.items():
+            for q in ("0.5", "0.95", "0.99"):
+                value = histogram(stats).percentile(float(q) * 100)
+                if value is not None:
+                    result[(("quantile", q), ("vm", name))] = value
+        return result
+    return collect
+
+
+metrics.Counter("vm_http_requests_total", "Requests proxied to each VM", _per_vm(lambda s: s.requests))
+metrics.Counter("vm_http_errors_total", "5xx responses for each VM", _per_vm(lambda s: s.errors))
+metrics.Counter("vm_http_response_bytes_total", "Response bytes served for each VM", _per_vm(lambda s: s.bytes_served))
+metrics.Gauge("vm_http_request_duration_seconds", "Request latency percentiles per VM", _quantiles(lambda s: s.latency))
+metrics.Counter("vm_cold_starts_total", "Wakes observed through the Sablier waiting page", _per_vm(lambda s: s.cold_starts.count))
+metrics.Gauge("vm_cold_start_seconds", "Time from the first Sablier waiting page to the first 2xx, per VM", _quantiles(lambda s: s.cold_starts))
+
+
+def _format_seconds(value):
+    if value is None:
+        return "-"
+    return "inf" if math.isinf(value) else f"{value:.3f}s"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-VM latency and cold-start report from Caddy access logs")
+    parser.add_argument("path", nargs="?", default="/var/log/caddy/access.log", help="Caddy JSON access log")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"❌ Access log not found: {args.path}", file=sys.stderr)
+        return 1
+    tailer = LogTailer(args.path)
+    report_analyzer = AccessLogAnalyzer(max_vms=config.ACCESS_LOG_MAX_VMS)
+    poll(tailer, report_analyzer)
+    tailer.close()
+    report = report_analyzer.report()
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"{'VM':<20} {'requests':>9} {'5xx':>5} {'bytes':>12} {'p50':>9} {'p95':>9} {'p99':>9} {'wakes':>6} {'wake p50':>9} {'wake p95':>9}")
+    for name, stats in report.items():
+        print(
+            f"{name:<20} {stats['requests']:>9} {stats['errors']:>5} {stats['bytes_served']:>12} "
+            f"{_format_seconds(stats['latency_p50']):>9} {_format_seconds(stats['latency_p95']):>9} "
+            f"{_format_seconds(stats['latency_p99']):>9} {stats['cold_starts']:>6} "
+            f"{_format_seconds(stats['cold_start_p50']):>9} {_format_seconds(stats['cold_start_p95']):>9}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
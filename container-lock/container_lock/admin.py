@@ -0,0 +1,12 @@
+import hmac
+from fastapi import HTTPException, Request
+from container_lock.config import config
+
+
+def require_admin(request: Request) -> None:
+    """Admin endpoints (reservations, bulk VM operations) need `Authorization: Bearer <ADMIN_TOKEN>`"""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled; set ADMIN_TOKEN to enable it")
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required")
@@ -0,0 +1,88 @@
+import hashlib
+import hmac
+import logging
+import time
+import httpx
+from fastapi import Response
+from container_lock.config import config
+
+logger = logging.getLogger(__name__)
+
+# Last time the Sablier session of each container was refreshed
+_last_refresh: dict[str, float] = {}
+
+
+def is_enabled() -> bool:
+    return bool(config.AFFINITY_SECRET)
+
+
+def cookie_name(container_name: str) -> str:
+    return f"{config.AFFINITY_COOKIE_PREFIX}{container_name}"
+
+
+# Set by container-lock on VM requests whose affinity cookie checks out; Caddy
+# copies it from the forward_auth response and skips Sablier when it is present
+AFFINITY_HEADER = "X-VM-Affinity"
+
+
+def affinity_token(container_name: str, owner: str, expires_at: int, secret: str | None = None) -> str:
+    """
+    Cookie value binding a VM to its lock holder until expires_at (Unix time)
+    The owner is signed but not included, so session tokens never end up in the cookie
+    """
+    secret = secret or config.AFFINITY_SECRET
+    message = f"{container_name}|{owner}|{expires_at}"
+    signature = hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()[:32]
+    return f"{expires_at}.{signature}"
+
+
+def verify_affinity_token(token: str | None, container_name: str, owner: str) -> bool:
+    """Check that a cookie value was issued to this owner for this VM and has not expired"""
+    if not token or not is_enabled():
+        return False
+    expires_at, _, _ = token.partition(".")
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(token, affinity_token(container_name, owner, int(expires_at)))
+
+
+def set_affinity_cookie(response: Response, container_name: str, owner: str) -> None:
+    response.set_cookie(
+        cookie_name(container_name),
+        affinity_token(container_name, owner, int(time.time()) + config.AFFINITY_COOKIE_TTL),
+        max_age=config.AFFINITY_COOKIE_TTL,
+        path=f"/vm/{container_name}/",
+        httponly=True,
+        samesite="strict"
+    )
+
+
+def clear_affinity_cookie(response: Response, container_name: str) -> None:
+    response.delete_cookie(cookie_name(container_name), path=f"/vm/{container_name}/")
+
+
+async def refresh_sablier_session(container_name: str) -> bool:
+    """
+    Extend the Sablier session of a container whose traffic bypasses Sablier.
+    Without this, Sablier would scale the VM down session_duration after the
+    lock holder's last cold request. Refreshes at most once per interval.
+    """
+    now = time.monotonic()
+    if now - _last_refresh.get(container_name, 0) < config.SABLIER_REFRESH_INTERVAL:
+        return False
+    _last_refresh[container_name] = now
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.get(
+                f"{config.SABLIER_URL}/api/strategies/blocking",
+                params={
+                    "names": container_name,
+                    "session_duration": config.SABLIER_SESSION_DURATION,
+                    "timeout": "1s"
+                }
+            )
+        return response.status_code < 400
+    except httpx.HTTPError as e:
+        logger.warning(f"Failed to refresh Sablier session for {container_name}: {str(e)}")
+        _last_refresh.pop(container_name, None)
+        return False
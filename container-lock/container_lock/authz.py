@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+import docker
+import redis.asyncio
+from container_lock.config import config
+from container_lock import lock
+
+logger = logging.getLogger(__name__)
+
+
+class OwnerCache:
+    """
+    In-process cache of which IP owns each VM, for the Caddy forward-auth hot path.
+
+    Entries are dropped as soon as a lock changes (locally or, via Redis
+    pub/sub, on another replica), and expire after a short TTL as a safety net
+    in case an invalidation message is missed.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._owners: dict[str, tuple[str | None, float]] = {}  # container ID -> (owner IP, expires at)
+        self._ids: dict[str, str] = {}  # container name -> container ID
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, container_id: str) -> tuple[bool, str | None]:
+        entry = self._owners.get(container_id)
+        if entry is not None and entry[1] > time.monotonic():
+            self.hits += 1
+            return True, entry[0]
+        self.misses += 1
+        return False, None
+
+    def put(self, container_id: str, owner: str | None) -> None:
+        self._owners[container_id] = (owner, time.monotonic() + self.ttl)
+
+    def invalidate(self, container_id: str | None = None) -> None:
+        if container_id is None:
+            self._owners.clear()
+        else:
+            self._owners.pop(container_id, None)
+
+    def resolve_id(self, container_name: str) -> str | None:
+        return self._ids.get(container_name)
+
+    def remember_id(self, container_name: str, container_id: str) -> None:
+        self._ids[container_name] = container_id
+
+    def forget_id(self, container_name: str) -> None:
+        self._ids.pop(container_name, None)
+
+
+owner_cache = OwnerCache(ttl=config.AUTHZ_CACHE_TTL)
+lock.lock_change_listeners.append(owner_cache.invalidate)
+
+
+def _lookup_owner(container_name: str) -> tuple[str | None, str | None]:
+    """
+    Slow path: resolve a VM name to its container ID and current lock owner
+    Returns (container_id, owner_ip); container_id is None for unknown VMs
+    """
+    container_id = owner_cache.resolve_id(container_name)
+    if container_id is not None:
+        owner = lock.get_container_owner(container_id)
+        if owner is not None:
+            return container_id, owner
+        # Unlocked, or the container was recreated under a new ID
+        owner_cache.forget_id(container_name)
+    try:
+        container = lock.get_docker_client().containers.get(container_name)
+    except docker.errors.NotFound:
+        return None, None
+    if container.labels.get("sablier.group") != config.GROUP_LABEL:
+        return None, None
+    owner_cache.remember_id(container_name, container.id)
+    return container.id, lock.get_container_owner(container.id)
+
+
+async def get_vm_owner(container_name: str) -> str | None:
+    """
+    Get the IP owning a VM, served from the in-process cache when possible
+    """
+    container_id = owner_cache.resolve_id(container_name)
+    if container_id is not None:
+        hit, owner = owner_cache.get(container_id)
+        if hit:
+            return owner
+    container_id, owner = await asyncio.to_thread(_lookup_owner, container_name)
+    if container_id is not None:
+        owner_cache.put(container_id, owner)
+    return owner
+
+
+async def listen_for_lock_changes():
+    """
+    Background task: invalidate cached owners when another replica changes a lock
+    """
+    while True:
+        try:
+            client = redis.asyncio.Redis.from_url(config.REDIS_URL)
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(lock.LOCK_CHANGES_CHANNEL)
+                # Anything may have changed while we were not subscribed
+                owner_cache.invalidate()
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = message["data"]
+                    owner_cache.invalidate(data.decode() if isinstance(data, bytes) else data)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Lock change subscription failed, retrying: {e}")
+            owner_cache.invalidate()
+            await asyncio.sleep(5)
@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import struct
+import sys
+import time
+import httpx
+from websockets.asyncio.client import connect
+from container_lock.config import config
+from container_lock import lock
+from container_lock import snapshot
+from container_lock.accesslog import SABLIER_STATUS_HEADER
+from container_lock.bulk import select_vms
+
+logger = logging.getLogger(__name__)
+
+# State a VM is in when the student clicks Connect
+SCENARIOS = ("cold", "warm", "resume")
+# Phases of one connect, each timed from the end of the previous one:
+# POST /acquire, first answer on the VM route (Sablier's waiting page or the VM),
+# the VM's own :8006 page through the route, and the first noVNC frame
+PHASES = ("acquire", "route", "healthy", "first_frame")
+
+POLL_INTERVAL = 0.25
+
+
+class BenchmarkError(Exception):
+    """Raised when a VM cannot be prepared for a scenario or a connect fails"""
+
+
+class RFBStream:
+    """RFB bytes over WebSocket messages, which need not line up with RFB messages"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.buffer = b""
+
+    async def read(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            message = await self.ws.recv()
+            self.buffer += message if isinstance(message, bytes) else message.encode()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+async def first_frame(url: str, headers: dict | None = None, timeout: float = 60) -> None:
+    """
+    Connect to a noVNC websocket as the browser does and return once the first
+    framebuffer update arrives. Only VNC servers without a password are supported.
+    """
+    async with asyncio.timeout(timeout):
+        async with connect(url, additional_headers=headers, subprotocols=["binary"], max_size=None) as ws:
+            stream = RFBStream(ws)
+            await stream.read(12)
+            await ws.send(b"RFB 003.008\n")
+            count = (await stream.read(1))[0]
+            if not count:
+                reason_length, = struct.unpack("!I", await stream.read(4))
+                raise BenchmarkError(f"VNC server refused: {(await stream.read(reason_length)).decode(errors='replace')}")
+            if 1 not in await stream.read(count):
+                raise BenchmarkError("VNC server requires authentication")
+            await ws.send(b"\x01")
+            result, = struct.unpack("!I", await stream.read(4))
+            if result:
+                raise BenchmarkError("VNC security handshake failed")
+            await ws.send(b"\x01")  # ClientInit: share the desktop
+            width, height = struct.unpack("!HH", await stream.read(4))
+            await stream.read(16)  # pixel format
+            name_length, = struct.unpack("!I", await stream.read(4))
+            await stream.read(name_length)
+            await ws.send(struct.pack("!BBHHHH", 3, 0, 0, 0, width, height))
+            while True:
+                message_type = (await stream.read(1))[0]
+                if message_type == 0:  # FramebufferUpdate
+                    return
+                if message_type == 1:  # SetColourMapEntries
+                    _, colours = struct.unpack("!3xH", await stream.read(5))
+                    await stream.read(6 * colours)
+                elif message_type == 3:  # ServerCutText
+                    length, = struct.unpack("!3xI", await stream.read(7))
+                    await stream.read(length)
+                elif message_type != 2:  # Bell has no body
+                    raise BenchmarkError(f"Unexpected VNC message type {message_type}")
+
+
+def _ws_url(base_url: str, name: str) -> str:
+    return base_url.rstrip("/").replace("http", "ws", 1) + f"/vm/{name}/websockify"
+
+
+async def measure(client: httpx.AsyncClient, vm: dict, ws_url: str, timeout: float = 600) -> dict:
+    """
+    Time one connect the way the session page makes it
+    Returns the wake mode container-lock chose, the seconds spent in each phase
+    and the total from clicking Connect to the first frame.
+    """
+    marks = [time.monotonic()]
+    response = await client.post("/acquire", data={"container_id": vm["id"]})
+    if response.status_code != 200:
+        raise BenchmarkError(f"Acquire failed ({response.status_code}): {response.text}")
+    result = {"wake_mode": response.json().get("wake_mode")}
+    marks.append(time.monotonic())
+    async with asyncio.timeout(timeout):
+        while True:
+            response = await client.get(f"/vm/{vm['name']}/")
+            if len(marks) == 2:
+                marks.append(time.monotonic())
+            waiting = "not-ready" in response.headers.get(SABLIER_STATUS_HEADER, "")
+            if response.is_success and not waiting:
+                break
+            await asyncio.sleep(POLL_INTERVAL)
+        marks.append(time.monotonic())
+        cookies = "; ".join(f"{name}={value}" for name, value in client.cookies.items())
+        await first_frame(ws_url, {"Cookie": cookies} if cookies else None, timeout)
+        marks.append(time.monotonic())
+    result.update({phase: round(end - start, 3) for phase, start, end in zip(PHASES, marks, marks[1:])})
+    result["total"] = round(marks[-1] - marks[0], 3)
+    return result
+
+
+def _wait_healthy(container_id: str, timeout: float) -> bool:
+    """Wait for Docker to report the VM healthy (or just running, without a healthcheck)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        container = lock.docker_breaker.call(lock.get_docker_client().containers.get, container_id)
+        health = container.attrs.get("State", {}).get("Health", {}).get("Status")
+        if container.status == "running" and health in (None, "healthy"):
+            return True
+        time.sleep(1)
+    return False
+
+
+async def prepare(vm: dict, scenario: str, redis_client=None, timeout: float = 600) -> None:
+    """
+    Put a VM in the state a scenario starts from
+    cold: stopped without saved guest state; warm: running with its desktop up;
+    resume: stopped right after its guest state was saved (needs SNAPSHOT_ENABLED)
+    """
+    redis_client = redis_client or lock.get_redis_client()
+    if scenario == "cold":
+        snapshot.discard_snapshot(vm["id"], redis_client)
+        container = lock.docker_breaker.call(lock.get_docker_client().containers.get, vm["id"])
+        if container.status == "running":
+            # Stopped directly: lock.stop_container would save guest state
+            await asyncio.to_thread(lock.docker_breaker.call, container.stop, timeout=config.BULK_STOP_TIMEOUT)
+        return
+    if scenario == "resume" and not config.SNAPSHOT_ENABLED:
+        raise BenchmarkError("Snapshot resume is disabled (render with --snapshot)")
+    if not await asyncio.to_thread(lock.start_container, vm["id"], redis_client) \
+            or not await asyncio.to_thread(_wait_healthy, vm["id"], timeout):
+        raise BenchmarkError(f"{vm['name']} did not become healthy")
+    # Straight to the VM over the lab network, not through Caddy and Sablier
+    await first_frame(f"ws://{vm['name']}:8006/websockify", timeout=timeout)
+    if scenario == "resume":
+        await asyncio.to_thread(lock.stop_container, vm["id"], redis_client, config.BULK_STOP_TIMEOUT)
+        if not snapshot.has_snapshot(vm["id"], redis_client):
+            raise BenchmarkError(f"No guest state was saved for {vm['name']}")
+
+
+def describe_vms(vms: list[dict]) -> list[dict]:
+    """Add the boot image and boot mode of each VM, from its container environment"""
+    client = lock.get_docker_client()
+    described = []
+    for vm in vms:
+        container = lock.docker_breaker.call(client.containers.get, vm["id"])
+        env = dict(item.partition("=")[::2] for item in container.attrs.get("Config", {}).get("Env") or [])
+        described.append({**vm, "image": env.get("BOOT", "unknown"), "boot_mode": env.get("BOOT_MODE", "legacy")})
+    return described
+
+
+async def run(base_url: str, vms: list[dict], scenarios=SCENARIOS, repeat: int = 1,
+              timeout: float = 600, redis_client=None):
+    """
+    Connect to every VM `repeat` times per scenario, one connect at a time so
+    runs do not slow each other down. Yields one result per connect.
+    """
+    redis_client = redis_client or lock.get_redis_client()
+    for scenario in scenarios:
+        for _ in range(repeat):
+            for vm in vms:
+                result = {"vm": vm["name"], "image": vm["image"], "boot_mode": vm["boot_mode"], "scenario": scenario}
+                try:
+                    await prepare(vm, scenario, redis_client, timeout)
+                    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+                        # Load the session page first, as the student does, for its session cookie
+                        await client.get(f"/session/{vm['name']}")
+                        try:
+                            result.update(await measure(client, vm, _ws_url(base_url, vm["name"]), timeout))
+                        finally:
+                            await client.post("/release")
+                except Exception as e:
+                    result["error"] = str(e) or type(e).__name__
+                    logger.warning("[BENCHMARK] %s connect to %s failed: %s", scenario, vm["name"], result["error"])
+                yield result
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile (0 < q <= 100) of sorted values"""
+    if not values:
+        return None
+    return values[max(1, math.ceil(len(values) * q / 100)) - 1]
+
+
+def summarize(results: list[dict]) -> list[dict]:
+    """Distribution of every phase and of the total, per image, boot mode and scenario"""
+    groups: dict[tuple, list[dict]] = {}
+    for result in results:
+        groups.setdefault((result["image"], result["boot_mode"], result["scenario"]), []).append(result)
+    summary = []
+    for (image, boot_mode, scenario), runs in sorted(groups.items(), key=lambda g: (g[0][:2], SCENARIOS.index(g[0][2]))):
+        ok = [r for r in runs if "error" not in r]
+        entry = {"image": image, "boot_mode": boot_mode, "scenario": scenario,
+                 "runs": len(runs), "failed": len(runs) - len(ok)}
+        for phase in PHASES + ("total",):
+            values = sorted(r[phase] for r in ok)
+            entry[phase] = {
+                "p50": _percentile(values, 50),
+                "p90": _percentile(values, 90),
+                "p99": _percentile(values, 99),
+                "max": values[-1] if values else None,
+            }
+        summary.append(entry)
+    return summary
+
+
+def _format_seconds(value):
+    return "-" if value is None else f"{value:.1f}s"
+
+
+def print_summary(summary: list[dict]) -> None:
+    print(f"{'image':<12} {'boot':<7} {'scenario':<8} {'runs':>5} {'failed':>7} "
+          + " ".join(f"{phase + ' p50':>15}" for phase in PHASES)
+          + f" {'total p50':>10} {'p90':>7} {'p99':>7} {'max':>7}")
+    for entry in summary:
+        total = entry["total"]
+        print(f"{entry['image']:<12} {entry['boot_mode']:<7} {entry['scenario']:<8} {entry['runs']:>5} {entry['failed']:>7} "
+              + " ".join(f"{_format_seconds(entry[phase]['p50']):>15}" for phase in PHASES)
+              + f" {_format_seconds(total['p50']):>10} {_format_seconds(total['p90']):>7}"
+              f" {_format_seconds(total['p99']):>7} {_format_seconds(total['max']):>7}")
+    cold = {(e["image"], e["boot_mode"]): e["total"]["p50"] for e in summary if e["scenario"] == "cold"}
+    for entry in summary:
+        baseline = cold.get((entry["image"], entry["boot_mode"]))
+        if entry["scenario"] != "cold" and baseline and entry["total"]["p50"]:
+            print(f"{entry['image']} ({entry['boot_mode']}): {entry['scenario']} is "
+                  f"{baseline / entry['total']['p50']:.1f}x faster than cold boot (p50)")
+
+
+async def _main(args) -> int:
+    vms = describe_vms(select_vms(args.label, args.prefix, args.all))
+    if not vms:
+        print("No matching VMs", file=sys.stderr)
+        return 1
+    print(f"Benchmarking {len(vms)} VMs: {', '.join(args.scenario)} × {args.repeat} against {args.url}", file=sys.stderr)
+    results = []
+    async for result in run(args.url, vms, args.scenario, args.repeat, args.timeout):
+        results.append(result)
+        if args.json:
+            print(json.dumps(result), flush=True)
+        elif "error" in result:
+            print(f"❌ {result['scenario']} {result['vm']}: {result['error']}", flush=True)
+        else:
+            print(f"✅ {result['scenario']} {result['vm']} ({result['wake_mode']}): {result['total']:.1f}s", flush=True)
+    summary = summarize(results)
+    if args.json:
+        print(json.dumps({"summary": summary}), flush=True)
+    else:
+        print()
+        print_summary(summary)
+    return 1 if any("error" in r for r in results) else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Time from Connect to the first noVNC frame for cold boots, warm VMs and snapshot resumes"
+    )
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--label", help="Docker label selector, e.g. lab.pool=web")
+    selection.add_argument("--prefix", help="Container name prefix, e.g. kali_")
+    selection.add_argument("--all", action="store_true", help="Every managed VM")
+    parser.add_argument("--url", default="http://caddy", help="Lab entry point (default: http://caddy)")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, default=None,
+                        help="Scenario to run (repeatable; default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Connects per VM and scenario (default: 3)")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds one connect may take (default: 600)")
+    parser.add_argument("--json", action="store_true", help="Print NDJSON results and the summary")
+    args = parser.parse_args(argv)
+    args.scenario = args.scenario or list(SCENARIOS)
+    return asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+import docker
+import requests
+from container_lock import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency while its breaker is open"""
+
+
+def is_docker_failure(error: Exception) -> bool:
+    """
+    Errors that mean the daemon itself is unhealthy
+    A 404 or other client error is a healthy daemon answering, so it doesn't count
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return isinstance(error, docker.errors.APIError) and error.is_server_error()
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker.
+
+    After failure_threshold consecutive failures the breaker opens and calls
+    fail fast with CircuitOpenError. Once reset_timeout has passed a single
+    trial call is let through (half open); its outcome closes or re-opens
+    the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, is_failure=is_docker_failure):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Circuit breaker '%s' closed", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning("Circuit breaker '%s' opened after %s failures", self.name, self.failures)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def call(self, func, *args, **kwargs):
+        """Call func through the breaker, raising CircuitOpenError while open"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, round(self.reset_timeout - (time.monotonic() - self.opened_at), 1))
+            return {"state": self.state, "consecutive_failures": self.failures, "retry_in": retry_in}
+
+
+def register_metrics(breaker: CircuitBreaker) -> None:
+    metrics.Gauge(
+        f"{breaker.name}_circuit_state",
+        f"State of the {breaker.name} circuit breaker (0 closed, 1 half open, 2 open)",
+        lambda: _STATE_VALUES[breaker.state]
+    )
+    metrics.Gauge(
+        f"{breaker.name}_circuit_consecutive_failures",
+        f"Consecutive failed {breaker.name} calls",
+        lambda: breaker.failures
+    )
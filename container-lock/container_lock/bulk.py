@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from fastapi import HTTPException
+from container_lock.config import config
+from container_lock import lock
+from container_lock import snapshot
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ("start", "stop", "reset", "release")
+
+
+def select_vms(label: str | None = None, prefix: str | None = None, all_vms: bool = False) -> list[dict]:
+    """
+    Managed VMs matching a selection: a `key=value` label, a name prefix, or all
+    At least one criterion is required so a typo cannot select the whole lab
+    """
+    if not (label or prefix or all_vms):
+        raise HTTPException(status_code=400, detail="Select VMs by label, prefix or all")
+    filters = [f"sablier.group={config.GROUP_LABEL}"]
+    if label:
+        filters.append(label)
+    client = lock.get_docker_client()
+    containers = lock.docker_breaker.call(client.containers.list, all=True, filters={"label": filters})
+    return sorted(
+        ({"id": c.id, "name": c.name} for c in containers if not prefix or c.name.startswith(prefix)),
+        key=lambda vm: vm["name"]
+    )
+
+
+def _restart_cold(container_id: str, redis_client) -> bool:
+    """Forget saved guest state and boot the VM from scratch"""
+    snapshot.discard_snapshot(container_id, redis_client)
+    container = lock.docker_breaker.call(lock.get_docker_client().containers.get, container_id)
+    if container.status == "running":
+        container.restart(timeout=config.BULK_STOP_TIMEOUT)
+    else:
+        container.start()
+    return True
+
+
+def _stop(container_id: str, redis_client) -> bool:
+    return lock.stop_container(container_id, redis_client, timeout=config.BULK_STOP_TIMEOUT)
+
+
+_ACTIONS = {
+    "start": lock.start_container,
+    "stop": _stop,
+    "reset": _restart_cold,
+}
+
+
+async def run(operation: str, vms: list[dict], redis_client=None, parallelism: int | None = None):
+    """
+    Apply an operation to VMs with bounded concurrency
+    Yields one progress dict per VM as it finishes, then a summary with the total time.
+    stop, reset and release first drop the VMs' locks in one pipelined batch.
+    """
+    if operation not in OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Operation must be one of: {', '.join(OPERATIONS)}")
+    redis_client = redis_client or lock.get_redis_client()
+    started = time.monotonic()
+    released = {}
+    if operation != "start":
+        released = await asyncio.to_thread(lock.release_locks, [vm["id"] for vm in vms], redis_client)
+
+    results = []
+    if operation == "release":
+        for vm in vms:
+            results.append({"vm": vm["name"], "ok": True, "released": vm["id"] in released, "seconds": 0.0})
+            yield results[-1]
+    else:
+        action = _ACTIONS[operation]
+        semaphore = asyncio.Semaphore(parallelism or config.BULK_PARALLELISM)
+
+        async def apply(vm):
+            async with semaphore:
+                vm_started = time.monotonic()
+                try:
+                    ok = await asyncio.to_thread(action, vm["id"], redis_client)
+                    error = None if ok else f"{operation} failed"
+                except Exception as e:
+                    ok, error = False, str(e)
+                result = {"vm": vm["name"], "ok": ok, "released": vm["id"] in released,
+                          "seconds": round(time.monotonic() - vm_started, 3)}
+                if error:
+                    result["error"] = error
+                return result
+
+        for next_result in asyncio.as_completed([apply(vm) for vm in vms]):
+            results.append(await next_result)
+            yield results[-1]
+
+    failed = sum(not r["ok"] for r in results)
+    summary = {
+        "done": True,
+        "operation": operation,
+        "total": len(vms),
+        "ok": len(results) - failed,
+        "failed": failed,
+        "released": len(released),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info("[BULK] %s on %s VMs: %s failed, %.1fs", operation, len(vms), failed, summary["seconds"])
+    yield summary
+
+
+async def _main(args) -> int:
+    vms = select_vms(args.label, args.prefix, args.all)
+    if not vms:
+        print("No matching VMs", file=sys.stderr)
+        return 1
+    print(f"{args.operation} {len(vms)} VMs ({args.parallelism or config.BULK_PARALLELISM} at a time)")
+    summary = {}
+    async for result in run(args.operation, vms, parallelism=args.parallelism):
+        if args.json:
+            print(json.dumps(result), flush=True)
+        elif not result.get("done"):
+            mark = "✅" if result["ok"] else "❌"
+            print(f"{mark} {result['vm']} ({result['seconds']:.1f}s){' ' + result['error'] if 'error' in result else ''}", flush=True)
+        summary = result
+    if not args.json:
+        print(f"{summary['ok']}/{summary['total']} done, {summary['failed']} failed, "
+              f"{summary['released']} locks released in {summary['seconds']:.1f}s")
+    return 1 if summary["failed"] else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Start, stop, reset or release many lab VMs at once")
+    parser.add_argument("operation", choices=OPERATIONS)
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--label", help="Docker label selector, e.g. lab.pool=web")
+    selection.add_argument("--prefix", help="Container name prefix, e.g. kali_")
+    selection.add_argument("--all", action="store_true", help="Every managed VM")
+    parser.add_argument("--parallelism", type=int, default=None, help=f"VMs handled at once (default: {config.BULK_PARALLELISM})")
+    parser.add_argument("--json", action="store_true", help="Print NDJSON progress")
+    return asyncio.run(_main(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,8 +20,125 @@ class Config(BaseSettings):
     DOCKER_HOST: Optional[str] = Field(default=None, description="Docker daemon host URL")
     DOCKER_TLS_VERIFY: Optional[str] = Field(default="0", description="Docker TLS verification")
     DOCKER_CERT_PATH: Optional[str] = Field(default=None, description="Path to Docker TLS certificates")
+    DOCKER_TIMEOUT: float = Field(default=5.0, description="Deadline in seconds for each Docker API call")
+    DOCKER_BREAKER_THRESHOLD: int = Field(default=5, description="Consecutive Docker failures that open the circuit breaker")
+    DOCKER_BREAKER_RESET: float = Field(default=30.0, description="Seconds the Docker breaker stays open before a trial call")
+    
+    # Client IP resolution
+    TRUSTED_PROXIES: list[str] = Field(
+        default=["127.0.0.0/8", "::1/128", "172.16.0.0/12"],
+        description="CIDRs of proxies (Caddy) whose X-Forwarded-For/X-Real-IP headers are trusted"
+    )
+    CLIENT_IP_CACHE_SIZE: int = Field(default=4096, description="Recently seen (peer, header) combinations kept resolved")
+    
+    # Session identity
+    SESSION_TOKENS_ENABLED: bool = Field(default=True, description="Identify lock owners by a session cookie, falling back to IP")
+    SESSION_COOKIE_NAME: str = Field(default="lab_session", description="Name of the session token cookie")
+    SESSION_COOKIE_MAX_AGE: int = Field(default=7 * 24 * 3600, description="Session cookie lifetime in seconds")
+    MAX_LOCKS_PER_IP: int = Field(default=25, description="Max session-token owners holding locks from one IP (0 = unlimited)")
+    
+    # Session request serialization
+    SERVICE_REPLICAS: int = Field(default=1, description="Number of container-lock replicas; >1 adds a Redis lock across replicas")
+    SESSION_LOCK_WAIT: float = Field(default=10.0, description="Max seconds a session request waits behind another from the same IP")
+    
+    # Rate limiting for status and session endpoints (token buckets, requests/second)
+    RATE_LIMIT_ENABLED: bool = Field(default=True, description="Enable per-IP and global rate limits")
+    RATE_LIMIT_PER_IP: float = Field(default=10.0, description="Sustained requests per second per client (session, or IP without one)")
+    RATE_LIMIT_PER_IP_BURST: float = Field(default=30.0, description="Burst size per client (session, or IP without one)")
+    RATE_LIMIT_SHARED_IP_FACTOR: float = Field(default=5.0, description="Per-IP ceiling shared by all clients behind one address, as a multiple of the per-client limit")
+    RATE_LIMIT_GLOBAL: float = Field(default=500.0, description="Sustained requests per second for all clients")
+    RATE_LIMIT_GLOBAL_BURST: float = Field(default=1000.0, description="Burst size for all clients")
+    RATE_LIMIT_BACKEND: str = Field(default="memory", description="memory (per replica) or redis (shared per-IP buckets)")
+    RATE_LIMIT_MAX_CLIENTS: int = Field(default=10000, description="Max per-client buckets kept in memory")
+    
+    # Idle session detection
+    IDLE_TIMEOUT: int = Field(default=900, description="Seconds without activity before a session is ended and its VM stopped (0 disables)")
+    IDLE_CHECK_INTERVAL: int = Field(default=60, description="Seconds between idle checks")
+    IDLE_CPU_THRESHOLD: float = Field(default=0.2, description="Guest CPU use (in cores) that counts as activity (0 disables CPU sampling)")
+    HEARTBEAT_INTERVAL: int = Field(default=30, description="Seconds between activity heartbeats from the session page")
+
+    # Per-VM resource telemetry
+    TELEMETRY_ENABLED: bool = Field(default=True, description="Sample CPU, memory, block IO and network of every VM")
+    TELEMETRY_INTERVAL: int = Field(default=10, description="Seconds between telemetry samples")
+    TELEMETRY_RETENTION: int = Field(default=3600, description="Seconds of telemetry history kept in memory per VM")
+    TELEMETRY_CGROUP_ROOT: str = Field(default="/sys/fs/cgroup", description="Mount point of the host cgroup v2 hierarchy")
+    TELEMETRY_PROC_ROOT: str = Field(default="/proc", description="Mount point of the host /proc, for per-VM network counters")
+    TELEMETRY_WORKERS: int = Field(default=8, description="Threads used for docker stats calls when cgroups are not readable")
+
+    # Caddy access log analysis
+    ACCESS_LOG_PATH: str = Field(default="", description="Caddy JSON access log to analyze for per-VM latency and cold starts ('' disables)")
+    ACCESS_LOG_POLL_INTERVAL: int = Field(default=5, description="Seconds between reads of new access log lines")
+    ACCESS_LOG_MAX_VMS: int = Field(default=500, description="Most VMs tracked by the access log analyzer")
+
+    # Scheduled class reservations
+    ADMIN_TOKEN: Optional[str] = Field(default=None, description="Bearer token for the reservation API (unset disables reservations)")
+    RESERVATION_PREWARM_LEAD: int = Field(default=600, description="Seconds before a reservation starts that its VMs are started")
+    RESERVATION_PREWARM_PARALLELISM: int = Field(default=8, description="VMs started concurrently while pre-warming")
+    RESERVATION_CHECK_INTERVAL: int = Field(default=30, description="Seconds between reservation scheduler passes")
+
+    # Session demand forecasting and warm pool
+    DEMAND_FORECAST_ENABLED: bool = Field(default=True, description="Record session starts and forecast demand per interval of the week")
+    DEMAND_PREWARM: bool = Field(default=False, description="Keep a pool of running VMs sized from the forecast")
+    DEMAND_INTERVAL: int = Field(default=900, description="Seconds per demand bucket and forecast interval")
+    DEMAND_ALPHA: float = Field(default=0.3, description="Weight of the latest week in each interval's moving average")
+    DEMAND_HEADROOM: float = Field(default=1.2, description="Warm pool size as a multiple of the forecast")
+    DEMAND_MAX_WARM: int = Field(default=10, description="Most VMs kept warm ahead of demand")
+    DEMAND_RETENTION: int = Field(default=14 * 24 * 3600, description="Seconds of raw session counts kept in Redis")
+    DEMAND_CHECK_INTERVAL: int = Field(default=60, description="Seconds between forecaster passes")
+
+    # IO and network fairness
+    FAIRNESS_ENABLED: bool = Field(default=False, description="Throttle VMs whose disk or network use stays above the thresholds")
+    FAIRNESS_IO_THRESHOLD: float = Field(default=50 * 1024 * 1024, description="Block IO (read + write, bytes/s) that marks a VM as a heavy consumer (0 disables)")
+    FAIRNESS_NET_THRESHOLD: float = Field(default=12.5e6, description="Network traffic (receive + transmit, bytes/s) that marks a VM as a heavy consumer (0 disables)")
+    FAIRNESS_WINDOW: int = Field(default=60, description="Seconds of telemetry averaged when judging a VM")
+    FAIRNESS_COOLDOWN: int = Field(default=300, description="Seconds a throttled VM must stay under half the threshold before its limits are restored")
+    FAIRNESS_IO_WEIGHT: int = Field(default=10, description="Block IO weight given to throttled VMs (10-1000)")
+    FAIRNESS_DEFAULT_IO_WEIGHT: int = Field(default=500, description="IO weight restored to VMs rendered without one")
+    FAIRNESS_NET_RATE: str = Field(default="10mbit", description="tc rate, each direction, for throttled VMs")
+    FAIRNESS_NET_DEVICE: str = Field(default="eth0", description="Interface inside VM containers shaped with tc")
+    FAIRNESS_CHECK_INTERVAL: int = Field(default=30, description="Seconds between fairness passes")
+
+    # VM pools
+    POOL_CAPACITY: dict[str, int] = Field(default={}, description="Most VMs of each pool in use at once, by pool name; unlisted pools are limited only by their size")
+
+    # Bulk VM operations
+    BULK_PARALLELISM: int = Field(default=16, description="VMs started, stopped or reset at once by bulk operations")
+    BULK_STOP_TIMEOUT: int = Field(default=10, description="Seconds a VM gets to shut down during bulk stop and reset")
+
+    # Leader election for background jobs
+    LEADER_LEASE_TTL: float = Field(default=15.0, description="Seconds a leader lease lasts without renewal")
+    
+    # Snapshot resume configuration
+    SNAPSHOT_ENABLED: bool = Field(default=False, description="Save guest state before stop and restore it on wake")
+    SNAPSHOT_TAG: str = Field(default="scale-to-zero", description="QEMU snapshot tag used for suspend/resume")
+    QEMU_MONITOR_PORT: int = Field(default=7100, description="QEMU HMP monitor port inside the VM container")
+    SNAPSHOT_TIMEOUT: int = Field(default=120, description="Seconds to wait for savevm/loadvm to complete")
+    
+    # Session affinity configuration (lock holders bypass the Sablier check)
+    AFFINITY_SECRET: Optional[str] = Field(default=None, description="Shared secret for affinity cookies, must match render.py")
+    AFFINITY_COOKIE_PREFIX: str = Field(default="vm_affinity_", description="Affinity cookie name prefix")
+    AFFINITY_COOKIE_TTL: int = Field(default=60, description="Affinity cookie lifetime in seconds, renewed by status polls")
+    SABLIER_URL: str = Field(default="http://sablier:10000", description="Sablier API URL")
+    SABLIER_SESSION_DURATION: str = Field(default="10m", description="Sablier session duration for refreshed sessions")
+    SABLIER_REFRESH_INTERVAL: int = Field(default=60, description="Minimum seconds between Sablier session refreshes per VM")
+    
+    # Readiness probing of waking VMs, pushed to the session page
+    VM_WEB_PORT: int = Field(default=8006, description="Port of the VM web console probed for readiness")
+    READINESS_INITIAL_INTERVAL: float = Field(default=0.25, description="Seconds between the first readiness probes of a waking VM")
+    READINESS_MAX_INTERVAL: float = Field(default=2.0, description="Longest gap between readiness probes as they back off")
+    READINESS_PROBE_TIMEOUT: float = Field(default=2.0, description="Timeout of one readiness probe")
+    READINESS_TIMEOUT: int = Field(default=600, description="Seconds a waking VM is probed before the session page falls back to Sablier's refresh")
+    STATUS_STREAM_KEEPALIVE: int = Field(default=15, description="Seconds between keepalive comments on the VM status stream")
+    
+    # Forward-auth configuration
+    AUTHZ_CACHE_TTL: float = Field(default=5.0, description="Seconds a cached VM owner is trusted without an invalidation")
     
     # Logging configuration
     LOG_LEVEL: str = Field(default="INFO", description="Logging level")
+    LOG_FORMAT: str = Field(default="json", description="json (one object per line) or text")
+    LOG_SAMPLE_RATES: dict[str, float] = Field(
+        default={"STATUS": 0.05, "STATUS_ALL": 0.05, "MY_ACTIVE": 0.05, "CHECK": 0.1},
+        description="Fraction of routine (below WARNING) logs kept per [TAG]; unlisted tags are always kept"
+    )
 
 config = Config()
\ No newline at end of file
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import time
+from container_lock.config import config
+from container_lock import lock
+from container_lock import metrics
+from container_lock import reservations
+from container_lock.leader import elector
+
+logger = logging.getLogger(__name__)
+
+# Hashes: bucket index (unix time // DEMAND_INTERVAL) -> sessions started / ended
+STARTS_KEY = "demand:starts"
+ENDS_KEY = "demand:ends"
+# JSON: one moving average per interval of the week, plus the open forecast
+MODEL_KEY = "demand:model"
+# Hash: warm pool hits and misses, forecast error totals
+STATS_KEY = "demand:stats"
+# Set: VMs started by the warm pool that no session has claimed yet
+WARM_POOL_KEY = "warm_pool"
+
+WEEK = 7 * 24 * 3600
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _slots() -> int:
+    return max(1, WEEK // config.DEMAND_INTERVAL)
+
+
+def bucket_of(ts: float) -> int:
+    return int(ts // config.DEMAND_INTERVAL)
+
+
+def record_session(event: str, container_id: str, redis_client, now: float | None = None) -> None:
+    """Count a session start or end in its time bucket (lock.session_listeners hook)"""
+    if not config.DEMAND_FORECAST_ENABLED:
+        return
+    bucket = bucket_of(time.time() if now is None else now)
+    redis_client.hincrby(STARTS_KEY if event == "start" else ENDS_KEY, bucket, 1)
+    if event == "start":
+        # A session landing on a VM the pool started ahead of time is a hit
+        hit = redis_client.srem(WARM_POOL_KEY, container_id)
+        redis_client.hincrby(STATS_KEY, "hits" if hit else "misses", 1)
+
+
+lock.session_listeners.append(record_session)
+
+
+def load_model(redis_client) -> dict:
+    raw = redis_client.get(MODEL_KEY)
+    model = json.loads(_decode(raw)) if raw else None
+    if not model or len(model["slots"]) != _slots():
+        model = {"slots": [None] * _slots(), "last_bucket": None, "pending": None}
+    return model
+
+
+def _counts(redis_client, key: str) -> dict[int, int]:
+    return {int(_decode(b)): int(_decode(c)) for b, c in redis_client.hgetall(key).items()}
+
+
+def update_model(redis_client, now: float) -> dict:
+    """
+    Fold every finished bucket into the moving average of its slot of the week
+    Buckets older than DEMAND_RETENTION are dropped from the raw counters
+    """
+    model = load_model(redis_client)
+    current = bucket_of(now)
+    if model["last_bucket"] is None:
+        model["last_bucket"] = current - 1
+    starts = _counts(redis_client, STARTS_KEY)
+    # After a long outage only the last week can still be learned from
+    first = max(model["last_bucket"] + 1, current - _slots())
+    for bucket in range(first, current):
+        observed = starts.get(bucket, 0)
+        slot = bucket % _slots()
+        previous = model["slots"][slot]
+        model["slots"][slot] = observed if previous is None else (
+            config.DEMAND_ALPHA * observed + (1 - config.DEMAND_ALPHA) * previous
+        )
+        pending = model["pending"]
+        if pending and pending["bucket"] == bucket:
+            redis_client.hincrby(STATS_KEY, "forecasts", 1)
+            redis_client.hincrby(STATS_KEY, "forecast_error_milli", int(abs(pending["value"] - observed) * 1000))
+            model["pending"] = None
+    model["last_bucket"] = current - 1
+
+    oldest = current - config.DEMAND_RETENTION // config.DEMAND_INTERVAL
+    for key, counts in ((STARTS_KEY, starts), (ENDS_KEY, _counts(redis_client, ENDS_KEY))):
+        expired = [bucket for bucket in counts if bucket < oldest]
+        if expired:
+            redis_client.hdel(key, *expired)
+    return model
+
+
+def forecast(model: dict, bucket: int) -> float:
+    """Expected session starts in a bucket: the moving average of its slot of the week"""
+    return model["slots"][bucket % _slots()] or 0.0
+
+
+def warm_target(expected: float) -> int:
+    return min(config.DEMAND_MAX_WARM, max(0, round(expected * config.DEMAND_HEADROOM)))
+
+
+def _managed_vms() -> list[dict]:
+    client = lock.get_docker_client()
+    containers = lock.docker_breaker.call(
+        client.containers.list, all=True, filters={"label": f"sablier.group={config.GROUP_LABEL}"}
+    )
+    return sorted(({"id": c.id, "name": c.name, "status": c.status} for c in containers), key=lambda vm: vm["name"])
+
+
+def size_warm_pool(target: int, redis_client) -> dict:
+    """
+    Keep `target` running VMs free for walk-in users
+    VMs already running without a lock count; the rest are started, and pool VMs
+    beyond the target are queued for stopping
+    """
+    pool = {_decode(m) for m in redis_client.smembers(WARM_POOL_KEY)}
+    free_running, stopped = [], []
+    for vm in _managed_vms():
+        if lock.get_container_owner(vm["id"], redis_client) is not None or reservations.is_reserved(vm["id"], redis_client):
+            continue
+        (free_running if vm["status"] == "running" else stopped).append(vm["id"])
+    for container_id in pool - set(free_running):
+        # Stopped, claimed or removed since the last pass
+        redis_client.srem(WARM_POOL_KEY, container_id)
+    pool &= set(free_running)
+
+    started = stopped_count = 0
+    for container_id in stopped[:max(0, target - len(free_running))]:
+        if lock.start_container(container_id, redis_client):
+            redis_client.sadd(WARM_POOL_KEY, container_id)
+            started += 1
+    # Shrink only VMs the pool itself started; other free VMs belong to Sablier sessions
+    excess = len(free_running) - target
+    for container_id in sorted(pool)[:max(0, excess)]:
+        lock.enqueue_stop(container_id, redis_client)
+        redis_client.srem(WARM_POOL_KEY, container_id)
+        stopped_count += 1
+    return {"started": started, "stopped": stopped_count}
+
+
+def run_forecast(redis_client=None, now: float | None = None) -> dict:
+    """One forecaster pass: learn from finished buckets, then size the pool for the next one"""
+    redis_client = redis_client or lock.get_redis_client()
+    now = time.time() if now is None else now
+    model = update_model(redis_client, now)
+    next_bucket = bucket_of(now) + 1
+    expected = forecast(model, next_bucket)
+    model["pending"] = {"bucket": next_bucket, "value": expected}
+    redis_client.set(MODEL_KEY, json.dumps(model))
+    result = {"forecast": expected, "target": warm_target(expected)}
+    if config.DEMAND_PREWARM:
+        result.update(size_warm_pool(result["target"], redis_client))
+    return result
+
+
+def status(redis_client=None) -> dict:
+    """Forecast, warm pool and how well both have done so far"""
+    redis_client = redis_client or lock.get_redis_client()
+    model = load_model(redis_client)
+    stats = {_decode(k): int(_decode(v)) for k, v in redis_client.hgetall(STATS_KEY).items()}
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    forecasts = stats.get("forecasts", 0)
+    pending = model["pending"] or {}
+    return {
+        "interval": config.DEMAND_INTERVAL,
+        "forecast": pending.get("value", 0.0),
+        "forecast_bucket_start": pending["bucket"] * config.DEMAND_INTERVAL if pending else None,
+        "warm_target": warm_target(pending.get("value", 0.0)),
+        "warm_pool": sorted(_decode(m) for m in redis_client.smembers(WARM_POOL_KEY)),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else None,
+        "forecast_mae": stats.get("forecast_error_milli", 0) / 1000 / forecasts if forecasts else None,
+        "model_bytes": len(json.dumps(model)),
+    }
+
+
+async def demand_forecaster():
+    """Background task (leader only): forecast session demand and size the warm pool"""
+    while True:
+        try:
+            await asyncio.sleep(config.DEMAND_CHECK_INTERVAL)
+            if not await elector.is_current():
+                continue
+            result = await asyncio.to_thread(run_forecast)
+            if result.get("started") or result.get("stopped"):
+                logger.info("[DEMAND] Forecast %.1f sessions: started %s, stopped %s warm VMs",
+                            result["forecast"], result["started"], result["stopped"])
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error("Error in demand forecaster: %s", e)
+
+
+# Scrapes within this many seconds share one Redis read
+_STATUS_CACHE_TTL = 5.0
+_status_cache: tuple[float, dict] = (0.0, {})
+
+
+def _cached_status() -> dict:
+    global _status_cache
+    if time.monotonic() - _status_cache[0] > _STATUS_CACHE_TTL:
+        try:
+            _status_cache = (time.monotonic(), status())
+        except Exception as e:
+            logger.debug("Demand status unavailable: %s", e)
+            _status_cache = (time.monotonic(), {})
+    return _status_cache[1]
+
+
+def _stat(field: str):
+    def collect():
+        if not config.DEMAND_FORECAST_ENABLED:
+            return {}
+        value = _cached_status().get(field)
+        if isinstance(value, list):
+            value = len(value)
+        return {} if value is None else {(): value}
+    return collect
+
+
+metrics.Gauge("demand_forecast_sessions", "Session starts expected in the next interval", _stat("forecast"))
+metrics.Gauge("warm_pool_target", "Free running VMs the warm pool aims for", _stat("warm_target"))
+metrics.Gauge("warm_pool_size", "VMs started by the warm pool and not yet claimed", _stat("warm_pool"))
+metrics.Gauge("warm_pool_hit_ratio", "Share of session starts that landed on a pre-warmed VM", _stat("hit_rate"))
+metrics.Gauge("demand_forecast_mean_abs_error", "Mean absolute error of past forecasts, in sessions", _stat("forecast_mae"))
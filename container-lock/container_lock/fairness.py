@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import re
+import time
+import docker
+from container_lock.config import config
+from container_lock import lock
+from container_lock import telemetry
+from container_lock.leader import elector
+
+logger = logging.getLogger(__name__)
+
+# Container label with a VM's baseline bandwidth cap (render.py --net-rate)
+NET_RATE_LABEL = "lab.net_rate"
+
+# Hash: container ID -> JSON of the limits tightened on it and how to undo them
+THROTTLED_KEY = "fairness:throttled"
+# Hash: container ID -> StartedAt of the run whose tc shaping is in place.
+# tc rules live in the container's network namespace and vanish on restart.
+SHAPED_KEY = "fairness:shaped"
+
+RATE_UNITS = {"": 1, "k": 1e3, "m": 1e6, "g": 1e9}
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def rate_bytes(rate: str) -> float:
+    """Bytes per second of a tc rate such as 100mbit"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kmg]?)bit", rate)
+    if not match:
+        raise ValueError(f"Invalid rate: {rate}")
+    return float(match.group(1)) * RATE_UNITS[match.group(2)] / 8
+
+
+def tc_script(device: str, rate: str | None) -> str:
+    """
+    Shell script that caps a device to `rate` in both directions, or lifts the cap
+    Egress is shaped with a token bucket; ingress is policed, as it cannot be queued
+    """
+    script = f"tc qdisc del dev {device} root 2>/dev/null; tc qdisc del dev {device} ingress 2>/dev/null; "
+    if not rate:
+        return script + "true"
+    # About 20ms of traffic, and never less than tbf needs to reach the rate
+    burst = f"{max(32, int(rate_bytes(rate) * 0.02 / 1024))}kb"
+    return script + " && ".join([
+        f"tc qdisc add dev {device} root tbf rate {rate} burst {burst} latency 50ms",
+        f"tc qdisc add dev {device} handle ffff: ingress",
+        f"tc filter add dev {device} parent ffff: matchall action police rate {rate} burst {burst} conform-exceed drop",
+    ])
+
+
+def set_net_rate(container, rate: str | None) -> bool:
+    exit_code, output = lock.docker_breaker.call(
+        container.exec_run, ["sh", "-c", tc_script(config.FAIRNESS_NET_DEVICE, rate)]
+    )
+    if exit_code != 0:
+        output = output.decode(errors="replace") if isinstance(output, bytes) else (output or "")
+        logger.warning("[FAIRNESS] tc failed in %s (exit %s): %s", container.name, exit_code, output.strip())
+        return False
+    return True
+
+
+def set_io_weight(container, weight: int) -> None:
+    lock.docker_breaker.call(container.update, blkio_weight=weight)
+
+
+def _tighter(rate: str, baseline: str | None) -> str:
+    return baseline if baseline and rate_bytes(baseline) < rate_bytes(rate) else rate
+
+
+def _throttle(container, resource: str, baseline: str | None) -> dict:
+    if resource == "io":
+        original = container.attrs.get("HostConfig", {}).get("BlkioWeight") or 0
+        set_io_weight(container, config.FAIRNESS_IO_WEIGHT)
+        return {"original": original}
+    set_net_rate(container, _tighter(config.FAIRNESS_NET_RATE, baseline))
+    return {}
+
+
+def _restore(container, resource: str, state: dict, baseline: str | None) -> None:
+    if resource == "io":
+        set_io_weight(container, state.get("original") or config.FAIRNESS_DEFAULT_IO_WEIGHT)
+    else:
+        set_net_rate(container, baseline)
+
+
+def _restore_stopped(container_id: str, entry: dict) -> None:
+    """An IO weight set with update() outlives the run; put it back once the VM stops"""
+    if "io" not in entry:
+        return
+    try:
+        container = lock.docker_breaker.call(lock.get_docker_client().containers.get, container_id)
+        set_io_weight(container, entry["io"].get("original") or config.FAIRNESS_DEFAULT_IO_WEIGHT)
+    except docker.errors.NotFound:
+        pass
+
+
+def run_fairness(redis_client=None, now: float | None = None, store=None) -> dict:
+    """
+    One fairness pass over the running VMs
+    Re-applies baseline bandwidth caps after restarts, tightens IO weight and
+    bandwidth on VMs averaging above the thresholds over FAIRNESS_WINDOW, and
+    restores them after FAIRNESS_COOLDOWN seconds under half the threshold.
+    """
+    redis_client = redis_client or lock.get_redis_client()
+    now = time.time() if now is None else now
+    store = store or telemetry.store
+    client = lock.get_docker_client()
+    containers = lock.docker_breaker.call(
+        client.containers.list, filters={"label": f"sablier.group={config.GROUP_LABEL}", "status": "running"}
+    )
+    throttled = {_decode(k): json.loads(_decode(v)) for k, v in redis_client.hgetall(THROTTLED_KEY).items()}
+    shaped = {_decode(k): _decode(v) for k, v in redis_client.hgetall(SHAPED_KEY).items()}
+    running = {c.id for c in containers}
+    for container_id in set(throttled) - running:
+        try:
+            _restore_stopped(container_id, throttled.pop(container_id))
+            redis_client.hdel(THROTTLED_KEY, container_id)
+        except Exception as e:
+            # Kept in THROTTLED_KEY, so the next pass tries again
+            logger.error("[FAIRNESS] Failed to restore IO weight of stopped %s: %s", container_id, e)
+    for container_id in set(shaped) - running:
+        redis_client.hdel(SHAPED_KEY, container_id)
+
+    result = {"shaped": 0, "throttled": [], "restored": []}
+    thresholds = {"io": config.FAIRNESS_IO_THRESHOLD, "net": config.FAIRNESS_NET_THRESHOLD}
+    for container in containers:
+        try:
+            baseline = (container.labels or {}).get(NET_RATE_LABEL)
+            entry = throttled.get(container.id, {"vm": container.name})
+            started = container.attrs.get("State", {}).get("StartedAt", "")
+            if shaped.get(container.id) != started:
+                rate = _tighter(config.FAIRNESS_NET_RATE, baseline) if "net" in entry else baseline
+                if not rate or set_net_rate(container, rate):
+                    redis_client.hset(SHAPED_KEY, container.id, started)
+                    result["shaped"] += bool(rate)
+
+            rates = store.average(container.id, config.FAIRNESS_WINDOW) if config.FAIRNESS_ENABLED else None
+            if rates is None:
+                continue
+            usage = {
+                "io": rates["block_read_bps"] + rates["block_write_bps"],
+                "net": rates["net_rx_bps"] + rates["net_tx_bps"],
+            }
+            for resource, threshold in thresholds.items():
+                if threshold <= 0:
+                    continue
+                state = entry.get(resource)
+                if state is None:
+                    if usage[resource] > threshold:
+                        entry[resource] = {"since": now, "calm_since": None, **_throttle(container, resource, baseline)}
+                        result["throttled"].append(f"{container.name}:{resource}")
+                        logger.info("[FAIRNESS] Throttled %s of %s: %.0f bytes/s over %ss",
+                                    resource, container.name, usage[resource], config.FAIRNESS_WINDOW)
+                elif usage[resource] < threshold / 2:
+                    state["calm_since"] = state["calm_since"] or now
+                    if now - state["calm_since"] >= config.FAIRNESS_COOLDOWN:
+                        _restore(container, resource, state, baseline)
+                        del entry[resource]
+                        result["restored"].append(f"{container.name}:{resource}")
+                        logger.info("[FAIRNESS] Restored %s of %s", resource, container.name)
+                else:
+                    state["calm_since"] = None
+            if "io" in entry or "net" in entry:
+                redis_client.hset(THROTTLED_KEY, container.id, json.dumps(entry))
+            elif container.id in throttled:
+                redis_client.hdel(THROTTLED_KEY, container.id)
+        except Exception as e:
+            # One VM failing to be inspected or throttled must not stop the pass for the rest
+            logger.error("[FAIRNESS] Failed to balance %s: %s", container.name, e)
+    return result
+
+
+def status(redis_client=None) -> list[dict]:
+    """VMs whose limits are currently tightened"""
+    redis_client = redis_client or lock.get_redis_client()
+    entries = (json.loads(_decode(v)) for v in redis_client.hgetall(THROTTLED_KEY).values())
+    return sorted(
+        ({"vm": e["vm"], **{r: {"since": e[r]["since"]} for r in ("io", "net") if r in e}} for e in entries),
+        key=lambda e: e["vm"]
+    )
+
+
+async def fairness_controller():
+    """Background task (leader only): keep bandwidth caps in place and throttle heavy consumers"""
+    while True:
+        try:
+            await asyncio.sleep(config.FAIRNESS_CHECK_INTERVAL)
+            if not await elector.is_current():
+                continue
+            await asyncio.to_thread(run_fairness)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error("Error in fairness controller: %s", e)
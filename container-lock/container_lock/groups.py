@@ -0,0 +1,48 @@
+import asyncio
+import logging
+import docker
+from container_lock.config import config
+from container_lock import lock
+
+logger = logging.getLogger(__name__)
+
+# Docker label naming the VM group a container belongs to (render.py --vm-group)
+GROUP_NAME_LABEL = "lab.group"
+
+
+def group_members(container_id: str) -> list[dict]:
+    """
+    Every VM in the same group as a container, itself included, sorted by name
+    Returns [] for a container that is not part of a group
+    """
+    client = lock.get_docker_client()
+    try:
+        container = lock.docker_breaker.call(client.containers.get, container_id)
+    except docker.errors.NotFound:
+        return []
+    name = (container.labels or {}).get(GROUP_NAME_LABEL)
+    if not name:
+        return []
+    containers = lock.docker_breaker.call(
+        client.containers.list, all=True,
+        filters={"label": [f"sablier.group={config.GROUP_LABEL}", f"{GROUP_NAME_LABEL}={name}"]}
+    )
+    return sorted(({"id": c.id, "name": c.name} for c in containers), key=lambda vm: vm["name"])
+
+
+async def start_all(members: list[dict], redis_client=None) -> dict[str, bool]:
+    """
+    Start every member of a group at once
+    The group is ready after its slowest VM boots rather than after all of them in turn.
+    Returns {name: started} per member
+    """
+    results = await asyncio.gather(
+        *(asyncio.to_thread(lock.start_container, vm["id"], redis_client) for vm in members),
+        return_exceptions=True
+    )
+    started = {}
+    for vm, result in zip(members, results):
+        if isinstance(result, Exception):
+            logger.error("[GROUP] Failed to start %s: %s", vm["name"], result)
+        started[vm["name"]] = result is True
+    return started
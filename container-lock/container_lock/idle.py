@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from container_lock.config import config
+from container_lock import lock
+from container_lock.leader import elector
+
+logger = logging.getLogger(__name__)
+
+# Sorted set: container ID -> unix time of its last observed activity
+ACTIVITY_KEY = "vm_activity"
+
+# Last CPU sample per container: (monotonic time, total CPU ns)
+_cpu_samples: dict[str, tuple[float, int]] = {}
+
+
+def is_enabled() -> bool:
+    return config.IDLE_TIMEOUT > 0
+
+
+def record_activity(container_id: str, redis_client=None, now: float | None = None) -> None:
+    redis_client = redis_client or lock.get_redis_client()
+    redis_client.zadd(ACTIVITY_KEY, {container_id: time.time() if now is None else now})
+
+
+def heartbeat(owner: str, redis_client=None) -> str | None:
+    """
+    Record user activity for the owner's locked VM and extend the lock
+    Returns the container ID, or None if the owner holds no lock
+    """
+    redis_client = redis_client or lock.get_redis_client()
+    container_id = lock.refresh_lock(owner, redis_client)
+    if container_id is not None:
+        record_activity(container_id, redis_client)
+    return container_id
+
+
+def _cpu_busy(container_id: str) -> bool:
+    """
+    Whether the guest used more than IDLE_CPU_THRESHOLD cores since the last sample
+    An idle desktop guest still ticks, so only sustained load counts as activity
+    """
+    stats = lock.docker_breaker.call(
+        lock.get_docker_client().containers.get(container_id).stats, stream=False, one_shot=True
+    )
+    total = stats["cpu_stats"]["cpu_usage"]["total_usage"]
+    now = time.monotonic()
+    previous = _cpu_samples.get(container_id)
+    _cpu_samples[container_id] = (now, total)
+    if previous is None or now <= previous[0]:
+        return False
+    cores = (total - previous[1]) / 1e9 / (now - previous[0])
+    return cores > config.IDLE_CPU_THRESHOLD
+
+
+def reap_idle_sessions(redis_client=None, now: float | None = None) -> int:
+    """
+    Release and stop every locked VM without activity for IDLE_TIMEOUT
+    Returns the number of sessions ended
+    """
+    redis_client = redis_client or lock.get_redis_client()
+    now = time.time() if now is None else now
+    reaped = 0
+    for container_id in lock.get_active_containers(redis_client):
+        owner = lock.get_container_owner(container_id, redis_client)
+        if owner is None:
+            redis_client.zrem(ACTIVITY_KEY, container_id)
+            _cpu_samples.pop(container_id, None)
+            continue
+        if config.IDLE_CPU_THRESHOLD > 0:
+            try:
+                if _cpu_busy(container_id):
+                    record_activity(container_id, redis_client, now)
+                    continue
+            except Exception as e:
+                logger.debug("CPU sample failed for %s: %s", container_id, e)
+        last_active = redis_client.zscore(ACTIVITY_KEY, container_id)
+        if last_active is None:
+            # Locked before tracking began; start its idle clock now
+            record_activity(container_id, redis_client, now)
+            continue
+        if now - float(last_active) < config.IDLE_TIMEOUT:
+            continue
+        logger.info("[IDLE] Ending idle session on %s after %ss without activity", container_id, int(now - float(last_active)))
+        if lock.release_lock(owner, redis_client, stop_container_flag=True):
+            reaped += 1
+        redis_client.zrem(ACTIVITY_KEY, container_id)
+        _cpu_samples.pop(container_id, None)
+    return reaped
+
+
+async def idle_reaper():
+    """Background task (leader only): end sessions whose VM has gone idle"""
+    while True:
+        try:
+            await asyncio.sleep(config.IDLE_CHECK_INTERVAL)
+            if not await elector.is_current():
+                continue
+            reaped = await asyncio.to_thread(reap_idle_sessions)
+            if reaped:
+                logger.info("Idle reaper: ended %s sessions", reaped)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error("Error during idle reaping: %s", e)
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable
+import redis
+import redis.asyncio
+from container_lock.config import config
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "container_lock:leader"
+FENCE_KEY = "container_lock:leader:fence"
+
+# Extend the lease only if we still hold it
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Give up the lease only if we still hold it
+RESIGN_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElector:
+    """
+    Redis lease based leader election for background jobs.
+
+    Every replica runs an elector; the one holding the lease runs the
+    registered jobs and the others stand by. Each new leader gets a fencing
+    token from an ever-increasing counter, so a replica that lost its lease
+    (e.g. after a long GC or network pause) can tell its token is stale
+    before doing destructive work. With a single replica there is nothing to
+    elect and jobs always run.
+    """
+
+    def __init__(self, redis_url: str = None, replicas: int = None, lease_ttl: float = None):
+        self.replicas = replicas if replicas is not None else config.SERVICE_REPLICAS
+        self.lease_ttl = lease_ttl or config.LEADER_LEASE_TTL
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.fencing_token: int | None = None
+        self.is_leader = False
+        self._jobs: list[tuple[str, Callable[[], Awaitable[None]]]] = []
+        self._tasks: list[asyncio.Task] = []
+        self.redis_client = None
+        if self.replicas > 1:
+            self.redis_client = redis.asyncio.Redis.from_url(redis_url or config.REDIS_URL, decode_responses=True)
+
+    def register(self, name: str, job: Callable[[], Awaitable[None]]) -> None:
+        """Register an async job function to run only while leader"""
+        self._jobs.append((name, job))
+
+    async def run(self):
+        """Background task: hold or contend for the lease and start/stop jobs"""
+        if self.redis_client is None:
+            self._become_leader(fencing_token=0)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                self._step_down()
+            return
+        try:
+            while True:
+                try:
+                    if self.is_leader:
+                        if not await self._renew():
+                            logger.warning("Lost leader lease (%s)", self.identity)
+                            self._step_down()
+                    elif await self._try_acquire():
+                        self._become_leader(await self.redis_client.incr(FENCE_KEY))
+                except redis.RedisError as e:
+                    logger.error("Leader election error: %s", e)
+                    # Without Redis we cannot prove we still hold the lease
+                    self._step_down()
+                await asyncio.sleep(self.lease_ttl / 3)
+        finally:
+            self._step_down()
+            if self.redis_client is not None:
+                try:
+                    await self.redis_client.eval(RESIGN_SCRIPT, 1, LEADER_KEY, self.identity)
+                except redis.RedisError:
+                    pass
+
+    async def _try_acquire(self) -> bool:
+        return bool(await self.redis_client.set(LEADER_KEY, self.identity, nx=True, px=int(self.lease_ttl * 1000)))
+
+    async def _renew(self) -> bool:
+        return bool(await self.redis_client.eval(RENEW_SCRIPT, 1, LEADER_KEY, self.identity, int(self.lease_ttl * 1000)))
+
+    async def is_current(self) -> bool:
+        """
+        Check the fencing token right before destructive work
+        Returns False if another replica has been elected since we were
+        """
+        if not self.is_leader:
+            return False
+        if self.redis_client is None:
+            return True
+        try:
+            return int(await self.redis_client.get(FENCE_KEY) or 0) == self.fencing_token
+        except redis.RedisError:
+            return False
+
+    def _become_leader(self, fencing_token: int) -> None:
+        self.is_leader = True
+        self.fencing_token = fencing_token
+        logger.info("Elected leader %s (fencing token %s), starting %s jobs", self.identity, fencing_token, len(self._jobs))
+        self._tasks = [asyncio.create_task(job(), name=name) for name, job in self._jobs]
+
+    def _step_down(self) -> None:
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        self.fencing_token = None
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        logger.info("Stepped down as leader (%s)", self.identity)
+
+
+elector = LeaderElector()
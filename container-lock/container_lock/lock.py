@@ -4,11 +4,78 @@ from fastapi import HTTPException
 import logging
 import docker
 import os
+import time
 from typing import Optional
 from container_lock.mock_redis import MockRedis
+from container_lock import snapshot
+from container_lock.session import public_owner
+from container_lock.breaker import CircuitBreaker, CircuitOpenError, is_docker_failure, register_metrics
 
 logger = logging.getLogger(__name__)
 
+LOCK_CHANGES_CHANNEL = "lock_changes"
+STOP_QUEUE = "stop_queue"
+# Stops taken off STOP_QUEUE stay here until the stop worker has handled them
+STOP_PROCESSING = "stop_queue:processing"
+
+# Claim KEYS[1] for ARGV[1] only while fewer than ARGV[3] of the other keys (a pool's locked VMs) exist
+POOL_CLAIM_SCRIPT = """
+local in_use = 0
+for i = 2, #KEYS do
+    in_use = in_use + redis.call('exists', KEYS[i])
+end
+if in_use >= tonumber(ARGV[3]) then
+    return -1
+end
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+# Callbacks run in this process whenever a container's lock changes
+lock_change_listeners = []
+
+# Callbacks run with (event, container_id, redis_client) when a session "start"s or "end"s
+session_listeners = []
+
+# Fails Docker calls fast while the daemon is unreachable or erroring
+docker_breaker = CircuitBreaker("docker", config.DOCKER_BREAKER_THRESHOLD, config.DOCKER_BREAKER_RESET)
+register_metrics(docker_breaker)
+
+# Last known state of each container, served (marked stale) while Docker is unavailable
+_container_cache: dict[str, dict] = {}
+_container_list_cache: list[dict] = []
+
+def _owner_key(container_id: str) -> str:
+    """Reverse index: container ID -> IP holding its lock"""
+    return f"lock_owner:{container_id}"
+
+def _members_key(owner: str) -> str:
+    """Owner -> comma-separated containers of a group lock, the requested one first"""
+    return f"lock_members:{owner}"
+
+def _notify_lock_change(redis_client, container_id: str) -> None:
+    """
+    Tell in-process listeners and other replicas that a container's lock changed
+    """
+    for listener in lock_change_listeners:
+        try:
+            listener(container_id)
+        except Exception as e:
+            logger.error(f"Lock change listener failed: {str(e)}")
+    try:
+        redis_client.publish(LOCK_CHANGES_CHANNEL, container_id)
+    except Exception as e:
+        logger.warning(f"Failed to publish lock change for {container_id}: {str(e)}")
+
+def _notify_session(event: str, container_id: str, redis_client) -> None:
+    for listener in session_listeners:
+        try:
+            listener(event, container_id, redis_client)
+        except Exception as e:
+            logger.error(f"Session listener failed: {str(e)}")
+
 def get_redis_client(redis_url=None):
     return Redis.from_url(redis_url or config.REDIS_URL)
 
@@ -30,7 +97,7 @@ def get_docker_client() -> docker.DockerClient:
     if not docker_host:
         # Local Docker socket - use default configuration
         logger.debug("Using local Docker socket")
-        return docker.from_env()
+        return docker.from_env(timeout=config.DOCKER_TIMEOUT)
     
     # Remote Docker host with TLS
     if docker_tls_verify == '1' and docker_cert_path:
@@ -55,7 +122,8 @@ def get_docker_client() -> docker.DockerClient:
             logger.info(f"Connecting to remote Docker host: {docker_host}")
             return docker.DockerClient(
                 base_url=docker_host,
-                tls=tls_config
+                tls=tls_config,
+                timeout=config.DOCKER_TIMEOUT
             )
             
         except Exception as e:
@@ -68,12 +136,12 @@ def get_docker_client() -> docker.DockerClient:
     # Remote Docker host without TLS (insecure - not recommended for production)
     elif docker_host.startswith('tcp://'):
         logger.warning("Connecting to remote Docker host without TLS (insecure)")
-        return docker.DockerClient(base_url=docker_host)
+        return docker.DockerClient(base_url=docker_host, timeout=config.DOCKER_TIMEOUT)
     
     # Fallback to local Docker socket
     else:
         logger.warning("Invalid DOCKER_HOST configuration, falling back to local socket")
-        return docker.from_env()
+        return docker.from_env(timeout=config.DOCKER_TIMEOUT)
 
 def test_docker_connection() -> dict:
     """
@@ -85,7 +153,7 @@ def test_docker_connection() -> dict:
     try:
         client = get_docker_client()
         # Test connection by getting Docker info
-        info = client.info()
+        info = docker_breaker.call(client.info)
         
         return {
             "status": "connected",
@@ -102,12 +170,40 @@ def test_docker_connection() -> dict:
             "docker_host": os.getenv('DOCKER_HOST', 'local')
         }
 
+def _docker_unavailable(error: Exception) -> bool:
+    return isinstance(error, CircuitOpenError) or is_docker_failure(error)
+
+def inspect_container(container_id: str) -> tuple[dict, bool]:
+    """
+    Get name, status, health and management label of a container
+    Returns (info, stale); stale info comes from the last successful lookup
+    while Docker is unavailable. Raises docker.errors.NotFound for unknown
+    containers, and the Docker error if there is nothing cached.
+    """
+    try:
+        container = docker_breaker.call(get_docker_client().containers.get, container_id)
+    except docker.errors.NotFound:
+        _container_cache.pop(container_id, None)
+        raise
+    except Exception as e:
+        cached = _container_cache.get(container_id)
+        if cached is None or not _docker_unavailable(e):
+            raise
+        logger.warning(f"Docker unavailable, serving cached state of {container_id}: {str(e)}")
+        return cached, True
+    info = {
+        "name": container.name,
+        "status": container.status,
+        "health": get_container_health(container),
+        "managed": container.labels.get("sablier.group") == config.GROUP_LABEL
+    }
+    _container_cache[container_id] = info
+    return info, False
+
 def is_managed_container(container_id: str) -> bool:
     try:
-        client = get_docker_client()
-        container = client.containers.get(container_id)
-        labels = container.labels
-        return labels.get("sablier.group") == config.GROUP_LABEL
+        info, _ = inspect_container(container_id)
+        return info["managed"]
     except docker.errors.NotFound:
         logger.warning(f"Container {container_id} not found")
         return False
@@ -115,51 +211,129 @@ def is_managed_container(container_id: str) -> bool:
         logger.error(f"Docker error during label check: {str(e)}")
         return False
 
-def acquire_lock(ip: str, container_id: str, redis_client=None) -> bool:
+def _ip_locks_key(client_ip: str) -> str:
+    """Owners holding locks from one client IP, scored by when their lock expires"""
+    return f"ip_locks:{client_ip}"
+
+class ContainerInUse(HTTPException):
+    """409 for a container whose lock is held by another owner"""
+
+    def __init__(self):
+        super().__init__(status_code=409, detail="Container already in use by another user")
+
+def _claim_in_pool(container_id: str, owner: str, capacity: int, pool_vms: list[str], redis_client) -> int:
+    """
+    Claim a container of a pool with a capacity, counting the pool's other
+    locked VMs in the same atomic step so concurrent claims cannot overfill it
+    Returns 1 if claimed, 0 if the container is already locked, -1 if the pool is full
+    """
+    others = [_owner_key(c) for c in pool_vms if c != container_id]
+    if isinstance(redis_client, MockRedis):
+        # No Lua in the test double, which is only used from one thread
+        if sum(redis_client.get(key) is not None for key in others) >= capacity:
+            return -1
+        return 1 if redis_client.set(_owner_key(container_id), owner, nx=True, ex=config.LOCK_TTL) else 0
+    return int(redis_client.eval(POOL_CLAIM_SCRIPT, 1 + len(others), _owner_key(container_id), *others,
+                                 owner, config.LOCK_TTL, capacity))
+
+def _claim_containers(container_ids: list[str], owner: str, redis_client,
+                      pool_limit: tuple[int, list[str]] | None = None) -> str | None:
+    """
+    Claim containers for an owner through the reverse index, all or none
+    Claims are made in sorted order, so owners racing for overlapping groups
+    collide on their first shared container instead of each holding part.
+    Containers in pool_limit's VMs are claimed only while fewer than its
+    capacity of them are locked; raises 409 if the pool is full.
+    Returns the first container held by someone else, or None on success
+    """
+    capacity, pool_vms = pool_limit or (None, [])
+    claimed = []
+    for container_id in sorted(container_ids):
+        if capacity is not None and container_id in pool_vms:
+            result = _claim_in_pool(container_id, owner, capacity, pool_vms, redis_client)
+        else:
+            result = 1 if redis_client.set(_owner_key(container_id), owner, nx=True, ex=config.LOCK_TTL) else 0
+        if result == 1:
+            claimed.append(container_id)
+            continue
+        if result == 0 and get_container_owner(container_id, redis_client) == owner:
+            continue
+        if claimed:
+            redis_client.delete(*(_owner_key(c) for c in claimed))
+        if result == -1:
+            logger.warning("Pool of %s is at capacity (%s VMs in use)", container_id, capacity)
+            raise HTTPException(status_code=409, detail=f"Pool is at capacity ({capacity} VMs in use)")
+        return container_id
+    return None
+
+def acquire_lock(owner: str, container_id: str, redis_client=None, client_ip: str | None = None,
+                 members: list[str] | None = None, pool_limit: tuple[int, list[str]] | None = None) -> bool:
     """
-    Acquire an exclusive lock for a container by IP address
+    Acquire an exclusive lock for a container
     Returns True if lock was successfully acquired
-    Only one container per IP is allowed at a time
+    Only one container per owner is allowed at a time. The owner is a
+    session token key or, for clients without one, the IP address.
+    When client_ip is given and differs from the owner, at most
+    config.MAX_LOCKS_PER_IP owners may hold locks from that IP.
+    members are the other containers of a VM group; they are locked
+    together with container_id, or not at all.
+    pool_limit is (capacity, IDs of a pool's VMs) from pools.check_capacity;
+    the capacity is enforced atomically with the claim.
+    Raises ContainerInUse if another owner holds any of the containers.
     """
-    if not ip or not container_id:
+    if not owner or not container_id:
         raise HTTPException(status_code=400, detail="IP and container_id are required")
     
-    if not is_managed_container(container_id):
+    group = [container_id] + sorted(set(members or []) - {container_id})
+    if not all(is_managed_container(c) for c in group):
         raise HTTPException(status_code=403, detail="Container not managed by lock service")
     
     redis_client = redis_client or get_redis_client()
     
     try:
-        # Check if IP already has a container
-        existing_container = redis_client.get(f"lock:{ip}")
+        # Check if the owner already has a container
+        existing_container = redis_client.get(f"lock:{owner}")
         if existing_container:
             existing_id = existing_container.decode() if isinstance(existing_container, bytes) else existing_container
-            logger.warning(f"IP {ip} already has container {existing_id}")
+            logger.warning("Owner %s already has container %s", public_owner(owner), existing_id)
             # For basic MockRedis-based tests, return False instead of raising
             if isinstance(redis_client, MockRedis):
                 return False
             raise HTTPException(status_code=409, detail=f"IP already has active container: {existing_id}")
 
-        # Check if the requested container is already locked by another IP
-        for key in redis_client.scan_iter("lock:*"):
-            key_str = key.decode() if isinstance(key, bytes) else key
-            other_ip = key_str.split(":", 1)[1]
-            locked_container = redis_client.get(key_str)
-            if locked_container:
-                locked_id = locked_container.decode() if isinstance(locked_container, bytes) else locked_container
-                if locked_id == container_id and other_ip != ip:
-                    logger.warning(f"Container {container_id} already locked by IP {other_ip}")
-                    raise HTTPException(status_code=409, detail=f"Container already in use by another user")
+        if client_ip and client_ip != owner and config.MAX_LOCKS_PER_IP:
+            ip_key = _ip_locks_key(client_ip)
+            now = time.time()
+            redis_client.zremrangebyscore(ip_key, 0, now)
+            if redis_client.zcard(ip_key) >= config.MAX_LOCKS_PER_IP:
+                logger.warning("IP %s already holds %s locks", client_ip, config.MAX_LOCKS_PER_IP)
+                raise HTTPException(status_code=429, detail="Too many active sessions from this network")
+
+        # Claim the containers through the reverse index, all or none
+        taken = _claim_containers(group, owner, redis_client, pool_limit)
+        if taken is not None:
+            logger.warning("Container %s already locked by %s", taken, public_owner(get_container_owner(taken, redis_client)))
+            raise ContainerInUse()
 
         # Set lock with TTL
-        success = redis_client.setex(f"lock:{ip}", config.LOCK_TTL, container_id)
+        success = redis_client.setex(f"lock:{owner}", config.LOCK_TTL, container_id)
+        if success and len(group) > 1:
+            success = redis_client.setex(_members_key(owner), config.LOCK_TTL, ",".join(group))
         if not success:
-            logger.error(f"Failed to acquire lock for IP {ip} and container {container_id}")
+            logger.error("Failed to acquire lock for %s and container %s", public_owner(owner), container_id)
+            redis_client.delete(f"lock:{owner}", *(_owner_key(c) for c in group))
             return False
 
+        if client_ip and client_ip != owner and config.MAX_LOCKS_PER_IP:
+            redis_client.zadd(_ip_locks_key(client_ip), {owner: time.time() + config.LOCK_TTL})
+            redis_client.expire(_ip_locks_key(client_ip), config.LOCK_TTL)
         # Track active containers
-        redis_client.sadd("active_containers", container_id)
-        logger.info(f"IP {ip} successfully locked container {container_id}")
+        for member in group:
+            redis_client.sadd("active_containers", member)
+            _notify_lock_change(redis_client, member)
+        _notify_session("start", container_id, redis_client)
+        logger.info("Owner %s successfully locked container %s%s", public_owner(owner), container_id,
+                    f" and {len(group) - 1} group members" if len(group) > 1 else "")
         return True
         
     except HTTPException:
@@ -168,17 +342,26 @@ def acquire_lock(ip: str, container_id: str, redis_client=None) -> bool:
         logger.error(f"Redis error during lock acquisition: {str(e)}")
         raise HTTPException(status_code=500, detail="Lock service unavailable")
 
-def stop_container(container_id: str) -> bool:
+def stop_container(container_id: str, redis_client=None, timeout: int = 10) -> bool:
     """
     Stop a container by ID
     Returns True if container was stopped successfully
+    When snapshots are enabled, guest state is saved first so the next wake resumes
     """
     try:
         client = get_docker_client()
         container = client.containers.get(container_id)
         
         if container.status == 'running':
-            container.stop(timeout=10)
+            if config.SNAPSHOT_ENABLED:
+                redis_client = redis_client or get_redis_client()
+                try:
+                    snapshot.save_vm_state(container, redis_client)
+                except Exception as e:
+                    # An older snapshot would roll the guest back to a stale disk and memory state
+                    snapshot.discard_snapshot(container_id, redis_client)
+                    logger.warning("Failed to save guest state for %s, next wake will cold boot: %s", container_id, e)
+            container.stop(timeout=timeout)
             logger.info(f"Container {container_id} stopped successfully")
             return True
         else:
@@ -192,34 +375,105 @@ def stop_container(container_id: str) -> bool:
         logger.error(f"Error stopping container {container_id}: {str(e)}")
         return False
 
-def release_lock(ip: str, redis_client=None, stop_container_flag: bool = False) -> bool:
+def enqueue_stop(container_id: str, redis_client=None) -> None:
+    """
+    Queue a container to be stopped by the leader's stop worker
+    Stopping (and saving guest state) can take a while, so requests don't wait for it
+    """
+    redis_client = redis_client or get_redis_client()
+    redis_client.rpush(STOP_QUEUE, container_id)
+
+def resume_container(container_id: str, redis_client=None) -> bool:
+    """
+    Start a container and restore its saved guest state
+    Returns True if the guest was resumed, False if it will cold boot instead
+    A container that is already running is left alone: its guest is newer
+    than the snapshot, which is discarded instead of rolling the guest back.
+    """
+    redis_client = redis_client or get_redis_client()
+    if not snapshot.has_snapshot(container_id, redis_client):
+        return False
+    try:
+        client = get_docker_client()
+        container = client.containers.get(container_id)
+        if container.status == 'running':
+            snapshot.discard_snapshot(container_id, redis_client)
+            logger.info("Container %s is already running, dropped its older saved state", container_id)
+            return False
+        container.start()
+        if not snapshot.wait_for_monitor(container):
+            logger.warning(f"QEMU monitor of {container_id} not reachable, container will cold boot")
+            return False
+        return snapshot.restore_vm_state(container, redis_client)
+    except Exception as e:
+        logger.warning(f"Failed to resume container {container_id}, falling back to cold boot: {str(e)}")
+        return False
+
+def start_container(container_id: str, redis_client=None) -> bool:
+    """
+    Start a container ahead of use, restoring saved guest state when there is some
+    Returns True if the container is running
+    """
+    if config.SNAPSHOT_ENABLED and resume_container(container_id, redis_client):
+        return True
+    try:
+        container = docker_breaker.call(get_docker_client().containers.get, container_id)
+        if container.status != 'running':
+            docker_breaker.call(container.start)
+            logger.info("Container %s started", container_id)
+        return True
+    except Exception as e:
+        logger.error("Error starting container %s: %s", container_id, e)
+        return False
+
+def get_wake_mode(container_id: str, redis_client=None) -> str:
     """
-    Release container lock for a given IP address
+    Return "resume" if the container has saved guest state to restore, else "boot"
+    """
+    if not config.SNAPSHOT_ENABLED:
+        return "boot"
+    redis_client = redis_client or get_redis_client()
+    try:
+        return "resume" if snapshot.has_snapshot(container_id, redis_client) else "boot"
+    except Exception as e:
+        logger.error(f"Redis error during snapshot lookup: {str(e)}")
+        return "boot"
+
+def release_lock(owner: str, redis_client=None, stop_container_flag: bool = False, client_ip: str | None = None) -> bool:
+    """
+    Release container lock for a given owner
     Returns True if lock existed and was successfully removed
     
     Args:
-        ip: IP address to release lock for
+        owner: Session token key or IP address to release lock for
         redis_client: Redis client instance
-        stop_container_flag: Whether to stop the container after releasing lock
+        stop_container_flag: Whether to queue the container to be stopped after releasing lock
+        client_ip: IP the owner's lock is counted against, if different from the owner
     """
     redis_client = redis_client or get_redis_client()
     try:
-        container_id = redis_client.get(f"lock:{ip}")
+        container_id = redis_client.get(f"lock:{owner}")
         if not container_id:
             return False
         container_id_str = container_id.decode() if isinstance(container_id, bytes) else container_id
         if not is_managed_container(container_id_str):
             raise HTTPException(status_code=403, detail="Container not managed by lock service")
         
-        # Stop container if requested
+        group = get_locked_members(owner, redis_client) or [container_id_str]
+        # Stop containers if requested
         if stop_container_flag:
-            stop_success = stop_container(container_id_str)
-            if not stop_success:
-                logger.warning(f"Failed to stop container {container_id_str}, but will continue with lock release")
+            for member in group:
+                enqueue_stop(member, redis_client)
         
-        redis_client.delete(f"lock:{ip}")
-        redis_client.srem("active_containers", container_id_str)
-        logger.info(f"Released container {container_id_str} for IP {ip}{' and stopped container' if stop_container_flag else ''}")
+        redis_client.delete(f"lock:{owner}", _members_key(owner), *(_owner_key(c) for c in group))
+        for member in group:
+            redis_client.srem("active_containers", member)
+        if client_ip and client_ip != owner:
+            redis_client.zrem(_ip_locks_key(client_ip), owner)
+        for member in group:
+            _notify_lock_change(redis_client, member)
+        _notify_session("end", container_id_str, redis_client)
+        logger.info("Released container %s for %s%s", container_id_str, public_owner(owner), " and queued container stop" if stop_container_flag else "")
         return True
     except HTTPException:
         # Surface application errors to tests
@@ -228,14 +482,52 @@ def release_lock(ip: str, redis_client=None, stop_container_flag: bool = False)
         logger.error(f"Redis error during lock release: {str(e)}")
         raise HTTPException(status_code=500, detail="Lock service unavailable")
 
-def get_locked_container(ip: str, redis_client=None) -> str | None:
+def release_locks(container_ids: list[str], redis_client=None) -> dict[str, str]:
+    """
+    Release the locks on many containers in three Redis round trips
+    Releasing one member of a VM group releases the whole group.
+    Returns {container_id: owner} for the containers that were locked
+    """
+    redis_client = redis_client or get_redis_client()
+    owners = redis_client.mget([_owner_key(c) for c in container_ids]) if container_ids else []
+    released = {
+        container_id: owner.decode() if isinstance(owner, bytes) else owner
+        for container_id, owner in zip(container_ids, owners) if owner
+    }
+    if not released:
+        return released
+    # The containers each owner holds: its whole group, or just the one container
+    groups = {owner: [container_id] for container_id, owner in released.items()}
+    for owner, raw in zip(list(groups), redis_client.mget([_members_key(o) for o in groups])):
+        if raw:
+            groups[owner] = (raw.decode() if isinstance(raw, bytes) else raw).split(",")
+    released = {container_id: owner for owner, group in groups.items() for container_id in group}
+    pipe = redis_client.pipeline(transaction=False)
+    for owner, group in groups.items():
+        pipe.delete(f"lock:{owner}", _members_key(owner), *(_owner_key(c) for c in group))
+        for container_id in group:
+            pipe.srem("active_containers", container_id)
+            pipe.publish(LOCK_CHANGES_CHANNEL, container_id)
+    pipe.execute()
+    for container_id in released:
+        for listener in lock_change_listeners:
+            try:
+                listener(container_id)
+            except Exception as e:
+                logger.error(f"Lock change listener failed: {str(e)}")
+    for group in groups.values():
+        _notify_session("end", group[0], redis_client)
+    logger.info("Released %s locks in one batch", len(released))
+    return released
+
+def get_locked_container(owner: str, redis_client=None) -> str | None:
     """
-    Get the container ID currently locked by an IP address
+    Get the container ID currently locked by an owner (session token key or IP)
     Returns container ID string or None if no lock exists
     """
     redis_client = redis_client or get_redis_client()
     try:
-        container_id = redis_client.get(f"lock:{ip}")
+        container_id = redis_client.get(f"lock:{owner}")
         if not container_id:
             return None
         container_id_str = container_id.decode() if isinstance(container_id, bytes) else container_id
@@ -246,6 +538,46 @@ def get_locked_container(ip: str, redis_client=None) -> str | None:
         logger.error(f"Redis error during container lookup: {str(e)}")
         raise HTTPException(status_code=500, detail="Lock service unavailable")
 
+def refresh_lock(owner: str, redis_client=None) -> str | None:
+    """
+    Extend an owner's lock (and its reverse index) by another LOCK_TTL
+    Returns the locked container ID, or None if the owner holds no lock
+    """
+    redis_client = redis_client or get_redis_client()
+    container_id = redis_client.get(f"lock:{owner}")
+    if not container_id:
+        return None
+    container_id_str = container_id.decode() if isinstance(container_id, bytes) else container_id
+    redis_client.expire(f"lock:{owner}", config.LOCK_TTL)
+    group = get_locked_members(owner, redis_client)
+    if group:
+        redis_client.expire(_members_key(owner), config.LOCK_TTL)
+    for member in group or [container_id_str]:
+        redis_client.expire(_owner_key(member), config.LOCK_TTL)
+    return container_id_str
+
+def get_locked_members(owner: str, redis_client=None) -> list[str]:
+    """
+    All containers of the VM group an owner has locked, the requested one first
+    Returns [] if the owner holds no group lock
+    """
+    redis_client = redis_client or get_redis_client()
+    raw = redis_client.get(_members_key(owner))
+    if not raw:
+        return []
+    return (raw.decode() if isinstance(raw, bytes) else raw).split(",")
+
+def get_container_owner(container_id: str, redis_client=None) -> str | None:
+    """
+    Get the owner (session token key or IP) holding the lock on a container via the reverse index
+    Returns the owner or None if the container is not locked
+    """
+    redis_client = redis_client or get_redis_client()
+    owner = redis_client.get(_owner_key(container_id))
+    if not owner:
+        return None
+    return owner.decode() if isinstance(owner, bytes) else owner
+
 def get_active_containers(redis_client=None) -> list[str]:
     redis_client = redis_client or get_redis_client()
     try:
@@ -255,14 +587,14 @@ def get_active_containers(redis_client=None) -> list[str]:
         logger.error(f"Redis error during active containers lookup: {str(e)}")
         raise HTTPException(status_code=500, detail="Lock service unavailable")
 
-def get_user_active_container(ip: str, redis_client=None) -> dict | None:
+def get_user_active_container(owner: str, redis_client=None) -> dict | None:
     """
-    Get the currently active container for a specific IP
+    Get the currently active container for an owner (session token key or IP)
     Returns container info or None if no active container
     """
     redis_client = redis_client or get_redis_client()
     try:
-        container_id = redis_client.get(f"lock:{ip}")
+        container_id = redis_client.get(f"lock:{owner}")
         if not container_id:
             return None
         
@@ -270,19 +602,20 @@ def get_user_active_container(ip: str, redis_client=None) -> dict | None:
         
         # Get container details
         try:
-            client = get_docker_client()
-            container = client.containers.get(container_id_str)
+            info, stale = inspect_container(container_id_str)
             return {
                 "container_id": container_id_str,
-                "container_name": container.name,
-                "container_status": container.status,
-                "locked_by_ip": ip,
-                "is_active": container.status == 'running'
+                "container_name": info["name"],
+                "container_status": info["status"],
+                "locked_by_ip": owner,
+                "is_active": info["status"] == 'running',
+                "stale": stale
             }
         except docker.errors.NotFound:
             # Container no longer exists, clean up the lock
-            redis_client.delete(f"lock:{ip}")
+            redis_client.delete(f"lock:{owner}", _owner_key(container_id_str))
             redis_client.srem("active_containers", container_id_str)
+            _notify_lock_change(redis_client, container_id_str)
             return None
             
     except Exception as e:
@@ -297,32 +630,34 @@ def list_all_containers_with_locks(redis_client=None):
     redis_client = redis_client or get_redis_client()
     try:
         # Use local Docker client to honor test monkeypatch of docker.from_env
-        client = docker.from_env()
-        containers = client.containers.list(all=True)
+        try:
+            client = docker.from_env()
+            # Same per-call deadline as clients from get_docker_client()
+            if hasattr(client, "api"):
+                client.api.timeout = config.DOCKER_TIMEOUT
+            containers = [
+                {"id": c.id, "name": c.name, "status": c.status}
+                for c in docker_breaker.call(client.containers.list, all=True)
+                if c.labels.get("sablier.group") == config.GROUP_LABEL
+            ]
+            _container_list_cache[:] = containers
+            stale = False
+        except Exception as e:
+            if not _container_list_cache or not _docker_unavailable(e):
+                raise
+            logger.warning(f"Docker unavailable, serving cached container list: {str(e)}")
+            containers = list(_container_list_cache)
+            stale = True
+        # One lookup in the reverse index covers every member of a group lock
+        owners = redis_client.mget([_owner_key(container["id"]) for container in containers]) if containers else []
         result = []
-        for container in containers:
-            labels = container.labels
-            if labels.get("sablier.group") != config.GROUP_LABEL:
-                continue
-            container_id = container.id
-            name = container.name
-            status = container.status
-            # Find which IP (if any) has this container locked
-            locked_by_ip = None
-            for key in redis_client.scan_iter("lock:*"):
-                key_str = key.decode() if isinstance(key, bytes) else key
-                ip = key_str.split(":", 1)[1]
-                locked_id = redis_client.get(key_str)
-                if locked_id:
-                    locked_id = locked_id.decode() if isinstance(locked_id, bytes) else locked_id
-                    if str(locked_id) == str(container_id):
-                        locked_by_ip = ip
-                        break
+        for container, owner in zip(containers, owners):
             result.append({
-                "id": container_id,
-                "name": name,
-                "status": status,
-                "locked_by_ip": locked_by_ip
+                "id": container["id"],
+                "name": container["name"],
+                "status": container["status"],
+                "locked_by_ip": owner.decode() if isinstance(owner, bytes) else owner,
+                "stale": stale
             })
         return result
     except Exception as e:
@@ -356,6 +691,64 @@ def list_all_containers() -> list[dict]:
         raise HTTPException(status_code=500, detail="Unable to list containers")
         
 
+def get_container_health(container) -> str | None:
+    """
+    Return the Docker healthcheck status of a container, or None if it has none
+    """
+    try:
+        health = (container.attrs.get('State') or {}).get('Health') or {}
+        status = health.get('Status')
+        return status if isinstance(status, str) else None
+    except (AttributeError, TypeError):
+        return None
+
+def _parse_tmpfs_limit(options: dict | None) -> int | None:
+    """Extract the size= limit in bytes from tmpfs volume mount options"""
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+    for opt in ((options or {}).get('o') or '').split(','):
+        if opt.startswith('size='):
+            value = opt[len('size='):].lower()
+            try:
+                if value and value[-1] in units:
+                    return int(float(value[:-1]) * units[value[-1]])
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+def get_volume_usage() -> list[dict]:
+    """
+    Returns per-VM storage usage for all managed containers.
+    Each dict contains: container_name, container_status, volume, type, size_bytes, limit_bytes
+    size_bytes is None for bind mounts, which the Docker daemon does not measure.
+    """
+    try:
+        client = get_docker_client()
+        volumes = {v['Name']: v for v in (client.df().get('Volumes') or [])}
+        result = []
+        for container in client.containers.list(all=True):
+            if container.labels.get("sablier.group") != config.GROUP_LABEL:
+                continue
+            for mount in container.attrs.get('Mounts', []):
+                if mount.get('Destination') != '/storage':
+                    continue
+                volume = volumes.get(mount.get('Name')) if mount.get('Type') == 'volume' else None
+                options = (volume or {}).get('Options') or {}
+                usage = (volume or {}).get('UsageData') or {}
+                size = usage.get('Size')
+                result.append({
+                    "container_name": container.name,
+                    "container_status": container.status,
+                    "volume": mount.get('Name') or mount.get('Source'),
+                    "type": options.get('type') or mount.get('Type'),
+                    "size_bytes": size if size is not None and size >= 0 else None,
+                    "limit_bytes": _parse_tmpfs_limit(options)
+                })
+        return sorted(result, key=lambda v: v["size_bytes"] or 0, reverse=True)
+    except Exception as e:
+        logger.error(f"Error getting volume usage: {str(e)}")
+        raise HTTPException(status_code=500, detail="Unable to get volume usage")
+
 def cleanup_exited_containers(redis_client=None) -> int:
     """
     Clean up locks for exited containers
@@ -365,7 +758,7 @@ def cleanup_exited_containers(redis_client=None) -> int:
     cleaned_count = 0
     try:
         client = get_docker_client()
-        containers = client.containers.list(all=True)
+        containers = docker_breaker.call(client.containers.list, all=True)
         
         # Get all current locks
         for key in redis_client.scan_iter("lock:*"):
@@ -393,9 +786,10 @@ def cleanup_exited_containers(redis_client=None) -> int:
                 
                 # If container no longer exists, remove the lock
                 if not container_found:
-                    redis_client.delete(key_str)
+                    redis_client.delete(key_str, _members_key(ip), _owner_key(locked_container_id))
                     redis_client.srem("active_containers", locked_container_id)
-                    logger.info(f"Cleaned up lock for non-existent container {locked_container_id} (IP: {ip})")
+                    _notify_lock_change(redis_client, locked_container_id)
+                    logger.info("Cleaned up lock for non-existent container %s (owner: %s)", locked_container_id, public_owner(ip))
                     cleaned_count += 1
                     
         return cleaned_count
@@ -406,15 +800,16 @@ def cleanup_exited_containers(redis_client=None) -> int:
 def get_container_lock_status(container_id: str, redis_client=None) -> dict:
     """
     Get detailed lock status for a specific container
-    Returns dict with lock info and container status
+    Returns dict with lock info and container status; "stale" marks container
+    state served from cache because Docker is unavailable
     """
     redis_client = redis_client or get_redis_client()
     try:
-        client = get_docker_client()
         try:
-            container = client.containers.get(container_id)
-            container_status = container.status
-            container_name = container.name
+            info, stale = inspect_container(container_id)
+            container_status = info["status"]
+            container_name = info["name"]
+            container_health = info["health"]
         except docker.errors.NotFound:
             return {
                 "container_id": container_id,
@@ -425,17 +820,8 @@ def get_container_lock_status(container_id: str, redis_client=None) -> dict:
                 "is_clickable": False
             }
         
-        # Check if container is locked
-        locked_by_ip = None
-        for key in redis_client.scan_iter("lock:*"):
-            key_str = key.decode() if isinstance(key, bytes) else key
-            ip = key_str.split(":", 1)[1]
-            locked_id = redis_client.get(key_str)
-            if locked_id:
-                locked_id = locked_id.decode() if isinstance(locked_id, bytes) else locked_id
-                if str(locked_id) == str(container_id):
-                    locked_by_ip = ip
-                    break
+        # Check if container is locked, also as a non-first member of a group
+        locked_by_ip = get_container_owner(container_id, redis_client)
         
         is_locked = locked_by_ip is not None
         # Container is clickable if it's not locked and running
@@ -447,7 +833,10 @@ def get_container_lock_status(container_id: str, redis_client=None) -> dict:
             "container_status": container_status,
             "is_locked": is_locked,
             "locked_by_ip": locked_by_ip,
-            "is_clickable": is_clickable
+            "is_clickable": is_clickable,
+            "container_health": container_health,
+            "wake_mode": get_wake_mode(container_id, redis_client) if container_status != 'running' else None,
+            "stale": stale
         }
     except Exception as e:
         logger.error(f"Error getting container lock status: {str(e)}")
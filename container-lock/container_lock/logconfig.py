@@ -0,0 +1,108 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from container_lock.config import config
+
+# Attributes every LogRecord has; anything else was passed via extra= and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def log_tag(record: logging.LogRecord) -> str | None:
+    """The [TAG] prefix of a log call's format string, e.g. STATUS for "[STATUS] ..." """
+    msg = record.msg
+    if isinstance(msg, str) and msg.startswith("["):
+        end = msg.find("]")
+        if end > 1:
+            return msg[1:end]
+    return None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with extra= fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        tag = log_tag(record)
+        if tag:
+            entry["tag"] = tag
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of routine logs from chatty routes.
+    Routes are identified by the message's [TAG]; records at WARNING and
+    above are always kept.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(log_tag(record))
+        return rate is None or random.random() < rate
+
+
+def setup_logging(level: str | None = None, fmt: str | None = None, sample_rates: dict[str, float] | None = None, stream=None) -> None:
+    """
+    Route all logging through a queue so request handlers never block on
+    stdout; a background listener thread formats and writes the records.
+    Safe to call more than once (the previous pipeline is replaced).
+    """
+    global _listener
+    level = (level or config.LOG_LEVEL).upper()
+    fmt = fmt or config.LOG_FORMAT
+    sample_rates = config.LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Sample before enqueueing so dropped records cost only the filter call
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    for handler in [h for h in root.handlers if isinstance(h, logging.handlers.QueueHandler)]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
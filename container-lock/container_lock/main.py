@@ -1,167 +1,372 @@
 from fastapi import FastAPI, HTTPException, Request, Form
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response, StreamingResponse
 from container_lock.lock import (
     acquire_lock, list_all_containers, release_lock, get_locked_container, 
     get_active_containers, list_all_containers_with_locks, cleanup_exited_containers, 
     get_container_lock_status, get_user_active_container, test_docker_connection,
-    stop_container
+    stop_container, resume_container, get_wake_mode, get_volume_usage,
+    get_redis_client, STOP_QUEUE, STOP_PROCESSING, docker_breaker, inspect_container, is_managed_container,
+    ContainerInUse
 )
 from container_lock.utils import get_client_ip
+from container_lock.session import get_owner, public_owner, mask_owner, create_session_cookie_middleware
 from container_lock.middleware import create_ip_lock_middleware
+from container_lock.ratelimit import create_rate_limit_middleware
+from container_lock import affinity
+from container_lock import authz
+from container_lock import metrics
+from container_lock import idle
+from container_lock import telemetry
+from container_lock import accesslog
+from container_lock import reservations
+from container_lock import demand
+from container_lock.admin import require_admin
+from container_lock import bulk
+from container_lock import groups
+from container_lock import pools
+from container_lock import fairness
+from container_lock import readiness
+from container_lock.config import config
+from container_lock.logconfig import setup_logging
+from container_lock.leader import elector
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+import json
 import logging
 import os
 import asyncio
 from contextlib import asynccontextmanager
 
-# Background task for cleanup
-cleanup_task = None
+# Background tasks
+leader_task = None
+lock_changes_task = None
+telemetry_task = None
+access_log_task = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global cleanup_task
-    cleanup_task = asyncio.create_task(periodic_cleanup())
-    logger.info("Started periodic cleanup task")
+    global leader_task, lock_changes_task, telemetry_task, access_log_task
+    # Cleanup and stops run on the elected leader only; cache invalidation on every replica
+    leader_task = asyncio.create_task(elector.run())
+    lock_changes_task = asyncio.create_task(authz.listen_for_lock_changes())
+    logger.info("Started leader election and lock change listener")
+    if config.TELEMETRY_ENABLED:
+        # Every replica samples so its /telemetry and /metrics are complete
+        telemetry_task = asyncio.create_task(telemetry.telemetry_sampler())
+    if config.ACCESS_LOG_PATH:
+        access_log_task = asyncio.create_task(accesslog.access_log_analyzer())
     yield
     # Shutdown
-    if cleanup_task:
-        cleanup_task.cancel()
-        try:
-            await cleanup_task
-        except asyncio.CancelledError:
-            pass
-    logger.info("Stopped periodic cleanup task")
+    for task in (leader_task, lock_changes_task, telemetry_task, access_log_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    logger.info("Stopped background tasks")
 
 async def periodic_cleanup():
     """Background task to periodically clean up exited containers"""
     while True:
         try:
             await asyncio.sleep(30)  # Run every 30 seconds
+            if not await elector.is_current():
+                continue
             cleaned_count = cleanup_exited_containers()
             if cleaned_count > 0:
-                logger.info(f"Periodic cleanup: cleaned {cleaned_count} locks")
+                logger.info("Periodic cleanup: cleaned %s locks", cleaned_count)
         except asyncio.CancelledError:
             break
         except Exception as e:
-            logger.error(f"Error during periodic cleanup: {e}")
+            logger.error("Error during periodic cleanup: %s", e)
+
+def requeue_stops(redis_client) -> int:
+    """Put stops taken but not finished (by a cancelled or crashed worker) back at the head of the queue"""
+    count = 0
+    while redis_client.lmove(STOP_PROCESSING, STOP_QUEUE, "RIGHT", "LEFT") is not None:
+        count += 1
+    return count
+
+async def stop_worker():
+    """
+    Background task: stop containers queued by released sessions
+    Each container is moved to STOP_PROCESSING while it is handled, so a worker
+    cancelled mid-stop (e.g. on losing leadership) leaves it for the next one.
+    """
+    redis_client = get_redis_client()
+    # Only the lease holder may recover leftovers; anyone else could steal stops in flight
+    if await elector.is_current():
+        requeued = requeue_stops(redis_client)
+        if requeued:
+            logger.info("Requeued %s unfinished container stops", requeued)
+    while True:
+        try:
+            item = await asyncio.to_thread(redis_client.blmove, STOP_QUEUE, STOP_PROCESSING, 1, "LEFT", "RIGHT")
+            if item is None:
+                continue
+            container_id = item.decode() if isinstance(item, bytes) else item
+            if not await elector.is_current():
+                # Leave it for whoever holds the lease now, without touching their stops in flight
+                pipe = redis_client.pipeline()
+                pipe.lrem(STOP_PROCESSING, 1, container_id)
+                pipe.lpush(STOP_QUEUE, container_id)
+                pipe.execute()
+                continue
+            if not await asyncio.to_thread(stop_container, container_id, redis_client):
+                logger.warning("Failed to stop queued container %s", container_id)
+            redis_client.lrem(STOP_PROCESSING, 1, container_id)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error("Error in stop worker: %s", e)
+            await asyncio.sleep(1)
+
+elector.register("periodic_cleanup", periodic_cleanup)
+elector.register("stop_worker", stop_worker)
+if idle.is_enabled():
+    elector.register("idle_reaper", idle.idle_reaper)
+if config.ADMIN_TOKEN:
+    elector.register("reservation_scheduler", reservations.reservation_scheduler)
+if config.DEMAND_FORECAST_ENABLED:
+    elector.register("demand_forecaster", demand.demand_forecaster)
+elector.register("fairness_controller", fairness.fairness_controller)
+
+setup_logging()
 
 app = FastAPI(title="Container Lock Service", version="0.1.0", lifespan=lifespan)
 logger = logging.getLogger(__name__)
 
+# Fire-and-forget work started by requests; the event loop only keeps weak references to tasks
+_background_tasks: set[asyncio.Task] = set()
+
+
+def run_in_background(coro) -> asyncio.Task:
+    """Start a task that outlives the request, holding a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
 # Add IP lock middleware for session endpoints
 app.middleware("http")(create_ip_lock_middleware(lock_timeout=30))
+# Hand out session token cookies used as lock owner keys
+app.middleware("http")(create_session_cookie_middleware())
+# Rate limit status and session endpoints before any other work is done
+app.middleware("http")(create_rate_limit_middleware())
 
 # Setup Jinja2 templates and static files
 templates = Jinja2Templates(directory=os.path.abspath(os.path.join(os.path.dirname(__file__), './templates')))
 app.mount("/static", StaticFiles(directory=os.path.abspath(os.path.join(os.path.dirname(__file__), './static'))), name="static")
 
 @app.post("/acquire")
-async def acquire_container_lock(request: Request, container_id: str = Form(...)):
+async def acquire_container_lock(request: Request, container_id: str | None = Form(None), pool: str | None = Form(None),
+                                 reservation_code: str | None = Form(None)):
     """
-    Acquire exclusive container lock for an IP address
-    Only one container per IP is allowed
+    Acquire exclusive container lock for the requesting session (or IP)
+    Only one container per owner is allowed
+    Give a container_id, or a pool to be handed any free VM of that pool
+    VMs held for a scheduled class need that reservation's code
+    A VM in a group is locked together with the rest of its group, and all
+    of them are started in parallel
     """
-    ip = get_client_ip(request)
-    if ip == "unknown":
+    owner = get_owner(request)
+    if owner == "unknown":
         logger.warning("[ACQUIRE] Failed: No IP provided")
         raise HTTPException(status_code=400, detail="IP address required")
+    if not container_id and not pool:
+        raise HTTPException(status_code=400, detail="container_id or pool is required")
     
-    logger.info(f"[ACQUIRE] Request: ip={ip}, container_id={container_id}")
+    logger.info("[ACQUIRE] Request: owner=%s, container_id=%s, pool=%s", public_owner(owner), container_id, pool)
     
     try:
         # Check if IP already has an active container
-        existing_container = get_user_active_container(ip)
+        existing_container = get_user_active_container(owner)
         if existing_container:
-            logger.warning(f"[ACQUIRE] Failed: IP {ip} already has active container {existing_container['container_id']}")
+            logger.warning("[ACQUIRE] Failed: owner %s already has active container %s", public_owner(owner), existing_container['container_id'])
             raise HTTPException(
                 status_code=409,
                 detail={
                     "error": "IP already has an active container",
-                    "active_container": existing_container
+                    "active_container": mask_owner(existing_container)
                 }
             )
         
-        # Try to acquire the lock
-        if not acquire_lock(ip, container_id):
-            logger.warning(f"[ACQUIRE] Failed: ip={ip}, container_id={container_id}")
+        if container_id:
+            candidates = [container_id]
+            if config.POOL_CAPACITY:
+                pool = await asyncio.to_thread(pools.pool_of, container_id)
+        else:
+            candidates = [vm["id"] for vm in await asyncio.to_thread(pools.free_vms, pool)]
+        pool_limit = await asyncio.to_thread(pools.check_capacity, pool)
+
+        # By pool, a VM taken since the pool was listed is skipped for the next free one
+        for candidate in candidates:
+            members = await asyncio.to_thread(groups.group_members, candidate)
+            for vm in members or [{"id": candidate}]:
+                reservations.check_walk_in(vm["id"], reservation_code)
+            try:
+                locked = acquire_lock(owner, candidate, client_ip=get_client_ip(request),
+                                      members=[vm["id"] for vm in members], pool_limit=pool_limit)
+            except ContainerInUse:
+                if candidate == candidates[-1]:
+                    raise
+                logger.info("[ACQUIRE] %s was taken, trying the next free VM of pool %s", candidate, pool)
+                continue
+            container_id = candidate
+            break
+        if not locked:
+            logger.warning("[ACQUIRE] Failed: owner=%s, container_id=%s", public_owner(owner), container_id)
             raise HTTPException(status_code=409, detail="Container not available")
         
-        logger.info(f"[ACQUIRE] Success: ip={ip}, container_id={container_id}")
-        return JSONResponse(status_code=200, content={"container_id": container_id, "status": "locked"})
+        logger.info("[ACQUIRE] Success: owner=%s, container_id=%s", public_owner(owner), container_id, extra={"owner": public_owner(owner), "container_id": container_id})
+        if idle.is_enabled():
+            idle.record_activity(container_id)
+        info, _ = await asyncio.to_thread(inspect_container, container_id)
+        # Only a stopped VM is resumed; a running one is handed over as it is
+        wake_mode = get_wake_mode(container_id) if info["status"] != "running" else None
+        content = {"container_id": container_id, "status": "locked", "wake_mode": wake_mode}
+        if pool:
+            content["pool"] = pool
+        if members:
+            # Boot the whole group at once (resuming members with saved state)
+            run_in_background(groups.start_all(members))
+            content["members"] = [vm["name"] for vm in members]
+        elif wake_mode == "resume":
+            # Start restoring saved guest state while the session page loads
+            run_in_background(asyncio.to_thread(resume_container, container_id))
+        # Probe the VM from now on, so its status stream can report it ready at once
+        readiness.watch(container_id)
+        return JSONResponse(status_code=200, content=content)
     
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"[ACQUIRE] Error: {str(e)}")
+        logger.error("[ACQUIRE] Error: %s", e)
         raise HTTPException(status_code=500, detail="Lock service unavailable")
 
 @app.post("/release")
 async def release_container_lock(request: Request):
     """
-    Release container lock for an IP address
+    Release container lock for the requesting session (or IP)
     """
-    ip = get_client_ip(request)
-    if ip == "unknown":
+    owner = get_owner(request)
+    if owner == "unknown":
         logger.warning("[RELEASE] Failed: No IP provided")
         raise HTTPException(status_code=400, detail="IP address required")
         
-    logger.info(f"[RELEASE] Request: ip={ip}")
-    if not release_lock(ip):
-        logger.warning(f"[RELEASE] Failed: ip={ip}")
+    logger.info("[RELEASE] Request: owner=%s", public_owner(owner))
+    active_container = get_user_active_container(owner) if affinity.is_enabled() else None
+    if not release_lock(owner, client_ip=get_client_ip(request)):
+        logger.warning("[RELEASE] Failed: owner=%s", public_owner(owner))
         raise HTTPException(status_code=400, detail="No active lock found for this IP")
-    logger.info(f"[RELEASE] Success: ip={ip}")
-    return JSONResponse(status_code=200, content={"status": "unlocked"})
+    logger.info("[RELEASE] Success: owner=%s", public_owner(owner), extra={"owner": public_owner(owner)})
+    response = JSONResponse(status_code=200, content={"status": "unlocked"})
+    if active_container:
+        affinity.clear_affinity_cookie(response, active_container['container_name'])
+    return response
 
 @app.post("/end-session")
 async def end_session(request: Request, stop_container: bool = True):
     """
     End session by releasing container lock and optionally stopping the container
     """
-    ip = get_client_ip(request)
-    if ip == "unknown":
+    owner = get_owner(request)
+    if owner == "unknown":
         logger.warning("[END_SESSION] Failed: No IP provided")
         raise HTTPException(status_code=400, detail="IP address required")
     
     # Verify user has an active container
-    user_active_container = get_user_active_container(ip)
+    user_active_container = get_user_active_container(owner)
     if not user_active_container:
-        logger.warning(f"[END_SESSION] Failed: IP {ip} has no active container")
+        logger.warning("[END_SESSION] Failed: owner %s has no active container", public_owner(owner))
         raise HTTPException(status_code=400, detail="No active session found for this IP")
         
-    logger.info(f"[END_SESSION] Request: ip={ip}, container_id={user_active_container['container_id']}, stop_container={stop_container}")
+    logger.info("[END_SESSION] Request: owner=%s, container_id=%s, stop_container=%s", public_owner(owner), user_active_container['container_id'], stop_container)
     
     # Release lock with optional container stopping
-    if not release_lock(ip, stop_container_flag=stop_container):
-        logger.warning(f"[END_SESSION] Failed: ip={ip}")
+    if not release_lock(owner, stop_container_flag=stop_container, client_ip=get_client_ip(request)):
+        logger.warning("[END_SESSION] Failed: owner=%s", public_owner(owner))
         raise HTTPException(status_code=400, detail="Failed to end session")
     
-    logger.info(f"[END_SESSION] Success: ip={ip}, container stopped: {stop_container}")
-    return JSONResponse(status_code=200, content={
+    logger.info("[END_SESSION] Success: owner=%s, stop queued: %s", public_owner(owner), stop_container, extra={"owner": public_owner(owner), "container_id": user_active_container["container_id"]})
+    # The leader's stop worker stops the container after this returns
+    response = JSONResponse(status_code=200, content={
         "status": "session_ended",
-        "container_stopped": stop_container,
+        "stop_queued": stop_container,
         "container_id": user_active_container['container_id']
     })
+    if affinity.is_enabled():
+        affinity.clear_affinity_cookie(response, user_active_container['container_name'])
+    return response
+
+@app.post("/heartbeat")
+async def session_heartbeat(request: Request):
+    """
+    Activity heartbeat from the session page
+    Marks the caller's VM as in use and extends their lock
+    """
+    owner = get_owner(request)
+    if owner == "unknown":
+        raise HTTPException(status_code=400, detail="IP address required")
+    container_id = idle.heartbeat(owner)
+    if container_id is None:
+        raise HTTPException(status_code=404, detail="No active lock found")
+    return JSONResponse(status_code=200, content={"container_id": container_id, "idle_timeout": config.IDLE_TIMEOUT})
 
 @app.get("/check")
 async def check_container_lock(request: Request):
     """
-    Check if an IP has an active container lock
+    Check if the requesting session (or IP) has an active container lock
     """
-    ip = get_client_ip(request)
-    if ip == "unknown":
-        logger.warning(f"[CHECK] Failed: No IP provided")
+    owner = get_owner(request)
+    if owner == "unknown":
+        logger.warning("[CHECK] Failed: No IP provided")
         raise HTTPException(status_code=400, detail="IP address required")
         
-    logger.info(f"[CHECK] Request: ip={ip}")
-    container_id = get_locked_container(ip)
+    logger.info("[CHECK] Request: owner=%s", public_owner(owner))
+    container_id = get_locked_container(owner)
     if not container_id:
-        logger.info(f"[CHECK] Available: ip={ip}")
+        logger.info("[CHECK] Available: owner=%s", public_owner(owner))
         return JSONResponse(status_code=200, content={"status": "available"})
-    logger.info(f"[CHECK] Locked: ip={ip}, container_id={container_id}")
+    logger.info("[CHECK] Locked: owner=%s, container_id=%s", public_owner(owner), container_id)
     return JSONResponse(status_code=200, content={"container_id": container_id, "status": "locked"})
 
+@app.get("/authz")
+async def authorize_vm_access(request: Request, vm: str):
+    """
+    Forward-auth endpoint for Caddy: allow VM traffic only from the VM's lock holder
+    Answers from an in-process owner cache, so the hot path never touches Redis
+    """
+    owner = get_owner(request)
+    vm_owner = await authz.get_vm_owner(vm)
+    if vm_owner is not None and vm_owner == owner:
+        return affinity_response(request, vm, owner)
+    logger.debug("[AUTHZ] Denied: owner=%s, vm=%s, vm_owner=%s", public_owner(owner), vm, public_owner(vm_owner))
+    return JSONResponse(status_code=403, content={
+        "error": "VM is not locked by you" if vm_owner else "Acquire this VM from the session page first"
+    })
+
+@app.get("/affinity")
+async def check_vm_affinity(request: Request, vm: str):
+    """
+    Forward-auth endpoint for Caddy when locks are not enforced: never denies,
+    but tells Caddy to skip Sablier when the affinity cookie belongs to the VM's lock holder
+    """
+    owner = get_owner(request)
+    vm_owner = await authz.get_vm_owner(vm)
+    if vm_owner is not None and vm_owner == owner:
+        return affinity_response(request, vm, owner)
+    return Response(status_code=200)
+
+def affinity_response(request: Request, vm: str, owner: str) -> Response:
+    """Forward-auth success, flagged for Sablier bypass when the lock holder's affinity cookie is valid"""
+    response = Response(status_code=200)
+    if affinity.verify_affinity_token(request.cookies.get(affinity.cookie_name(vm)), vm, owner):
+        response.headers[affinity.AFFINITY_HEADER] = "1"
+    return response
+
 @app.get("/active")
 async def get_active():
     """
@@ -169,7 +374,7 @@ async def get_active():
     """
     logger.info("[ACTIVE] Request for all active containers")
     containers = get_active_containers()
-    logger.info(f"[ACTIVE] Active containers: {containers}")
+    logger.info("[ACTIVE] Active containers: %s", containers)
     return JSONResponse(status_code=200, content={"active_containers": containers})
 
 @app.get("/health")
@@ -179,13 +384,129 @@ async def health():
 
 @app.get("/docker/health")
 async def docker_health():
-    """Docker connection health check"""
+    """Docker connection health check, including the Docker circuit breaker state"""
     try:
         connection_status = test_docker_connection()
-        return connection_status
+        return {**connection_status, "circuit_breaker": docker_breaker.snapshot()}
     except Exception as e:
-        logger.error(f"Docker health check failed: {str(e)}")
-        return {"status": "failed", "error": str(e)}
+        logger.error("Docker health check failed: %s", e)
+        return {"status": "failed", "error": str(e), "circuit_breaker": docker_breaker.snapshot()}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/telemetry")
+async def get_telemetry():
+    """Latest CPU, memory, block IO and network rates of every running VM"""
+    return {"interval": config.TELEMETRY_INTERVAL, "vms": telemetry.store.latest()}
+
+@app.get("/telemetry/{container}")
+async def get_vm_telemetry(container: str):
+    """Resource history of one VM, by name or container ID, oldest first"""
+    container_id = telemetry.store.resolve(container)
+    if container_id is None:
+        raise HTTPException(status_code=404, detail=f"No telemetry for {container}")
+    return {"container_id": container_id, "interval": config.TELEMETRY_INTERVAL, "samples": telemetry.store.series(container_id)}
+
+@app.get("/access-report")
+async def get_access_report():
+    """Per-VM request latency, bytes served and cold-start times from the Caddy access log"""
+    if not config.ACCESS_LOG_PATH:
+        raise HTTPException(status_code=404, detail="Access log analysis is disabled")
+    return accesslog.analyzer.report()
+
+@app.post("/reservations")
+async def create_reservation(
+    request: Request,
+    name: str = Form(...),
+    image: str = Form(...),
+    count: int = Form(...),
+    start: str = Form(...),
+    end: str = Form(...)
+):
+    """
+    Book VMs for a class (admin only)
+    start and end are unix timestamps or ISO 8601 times; the response carries
+    the code students pass to join, e.g. /session/<vm>?reservation=<code>
+    """
+    require_admin(request)
+    return await asyncio.to_thread(
+        reservations.create_reservation, name, image, count,
+        reservations.parse_time(start), reservations.parse_time(end)
+    )
+
+@app.get("/reservations")
+async def get_reservations(request: Request):
+    """Reservations that have not ended, by start time (admin only)"""
+    require_admin(request)
+    return await asyncio.to_thread(reservations.list_reservations)
+
+@app.get("/reservations/{reservation_id}")
+async def get_reservation(request: Request, reservation_id: str):
+    """A reservation and the state of its VMs (admin only)"""
+    require_admin(request)
+    reservation = await asyncio.to_thread(reservations.get_reservation, reservation_id)
+    if reservation is None:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    vms = []
+    for container in reservation["containers"]:
+        try:
+            info, stale = await asyncio.to_thread(inspect_container, container["id"])
+            vms.append({**container, "status": info["status"], "health": info["health"], "stale": stale})
+        except Exception:
+            vms.append({**container, "status": "unknown", "health": None, "stale": True})
+    return {**reservation, "containers": vms}
+
+@app.delete("/reservations/{reservation_id}")
+async def delete_reservation(request: Request, reservation_id: str):
+    """Cancel a reservation and free its VMs (admin only)"""
+    require_admin(request)
+    if not await asyncio.to_thread(reservations.cancel_reservation, reservation_id):
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return {"id": reservation_id, "status": "cancelled"}
+
+@app.post("/admin/vms/{operation}")
+async def bulk_vm_operation(
+    request: Request,
+    operation: str,
+    label: str | None = Form(None),
+    prefix: str | None = Form(None),
+    all: bool = Form(False),
+    parallelism: int | None = Form(None)
+):
+    """
+    Start, stop, reset or release the locks of many VMs (admin only)
+    Streams one JSON line per VM as it finishes, then a summary with the total time
+    """
+    require_admin(request)
+    if operation not in bulk.OPERATIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown operation: {operation}")
+    vms = await asyncio.to_thread(bulk.select_vms, label, prefix, all)
+
+    async def progress():
+        async for result in bulk.run(operation, vms, parallelism=parallelism):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+@app.get("/pools")
+async def get_pools():
+    """VMs per pool: total, running, in use and still available within the pool's capacity"""
+    return await asyncio.to_thread(pools.list_pools)
+
+@app.get("/fairness")
+async def get_fairness():
+    """VMs whose IO weight or bandwidth is currently tightened, and since when"""
+    return await asyncio.to_thread(fairness.status)
+
+@app.get("/demand")
+async def get_demand():
+    """Session demand forecast for the next interval, the warm pool and its hit rate"""
+    if not config.DEMAND_FORECAST_ENABLED:
+        raise HTTPException(status_code=404, detail="Demand forecasting is disabled")
+    return await asyncio.to_thread(demand.status)
 
 @app.get("/", response_class=HTMLResponse)
 async def ui(request: Request):
@@ -194,7 +515,7 @@ async def ui(request: Request):
     """
     try:
         url = request.url
-        containers = list_all_containers_with_locks()
+        containers = [mask_owner(c) for c in list_all_containers_with_locks()]
         active_containers = [c for c in containers if c['status'] == 'running' and c['locked_by_ip']]
         available_containers = [c for c in containers if not c['locked_by_ip'] or c['status'] != 'running']
         return templates.TemplateResponse(
@@ -207,7 +528,7 @@ async def ui(request: Request):
             }
         )
     except Exception as e:
-        logger.error(f"Error rendering UI: {e}")
+        logger.error("Error rendering UI: %s", e)
         # Render an error page if fetching container data fails
         return templates.TemplateResponse(
             "error.html",
@@ -222,37 +543,74 @@ async def cleanup_exited():
     """
     logger.info("[CLEANUP] Request for cleanup")
     cleaned_count = cleanup_exited_containers()
-    logger.info(f"[CLEANUP] Cleaned up {cleaned_count} locks")
+    logger.info("[CLEANUP] Cleaned up %s locks", cleaned_count)
     return JSONResponse(status_code=200, content={"cleaned_locks": cleaned_count})
 
+@app.get("/volumes/usage")
+async def volume_usage():
+    """
+    Get storage usage per managed VM, largest first
+    tmpfs volumes count against host memory, so this shows where RAM goes
+    """
+    logger.info("[VOLUMES] Request for volume usage")
+    volumes = await asyncio.to_thread(get_volume_usage)
+    tmpfs_bytes = sum(v["size_bytes"] or 0 for v in volumes if v["type"] == "tmpfs")
+    return JSONResponse(status_code=200, content={"volumes": volumes, "tmpfs_used_bytes": tmpfs_bytes})
+
 @app.get("/container/{container_id}/status")
-async def get_container_status(container_id: str):
+async def get_container_status(request: Request, container_id: str):
     """
     Get detailed status for a specific container including lock state
+    Hands the lock holder an affinity cookie once the VM is healthy, so their
+    VM traffic skips the Sablier check in Caddy
     """
-    logger.info(f"[STATUS] Request for container {container_id}")
+    logger.info("[STATUS] Request for container %s", container_id)
     status = get_container_lock_status(container_id)
-    logger.info(f"[STATUS] Container {container_id}: {status}")
-    return JSONResponse(status_code=200, content=status)
+    logger.debug("[STATUS] Container %s: %s", container_id, status)
+    response = JSONResponse(status_code=200, content=mask_owner(status))
+    owner = get_owner(request)
+    if (
+        affinity.is_enabled()
+        and status.get("container_status") == "running"
+        and status.get("container_health") in ("healthy", None)
+        and status.get("locked_by_ip") == owner
+    ):
+        affinity.set_affinity_cookie(response, status["container_name"], owner)
+        run_in_background(affinity.refresh_sablier_session(status["container_name"]))
+    return response
+
+@app.get("/container/{container_id}/events")
+async def container_events(container_id: str):
+    """
+    Server-sent events telling the session page the moment its VM is ready,
+    so it can load the VM without waiting for Sablier's next page refresh
+    """
+    if not await asyncio.to_thread(is_managed_container, container_id):
+        raise HTTPException(status_code=404, detail="Container not found")
+    return StreamingResponse(
+        readiness.status_events(container_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
 
 @app.get("/my-active-container")
 async def get_my_active_container(request: Request):
     """
-    Get the currently active container for the requesting IP
+    Get the currently active container for the requesting session (or IP)
     """
-    ip = get_client_ip(request)
-    if ip == "unknown":
+    owner = get_owner(request)
+    if owner == "unknown":
         logger.warning("[MY_ACTIVE] Failed: No IP provided")
         raise HTTPException(status_code=400, detail="IP address required")
     
-    logger.info(f"[MY_ACTIVE] Request from IP: {ip}")
-    active_container = get_user_active_container(ip)
+    logger.info("[MY_ACTIVE] Request from owner: %s", public_owner(owner))
+    active_container = get_user_active_container(owner)
     
     if active_container:
-        logger.info(f"[MY_ACTIVE] Found active container: {active_container['container_id']}")
-        return JSONResponse(status_code=200, content={"active_container": active_container})
+        logger.info("[MY_ACTIVE] Found active container: %s", active_container['container_id'])
+        return JSONResponse(status_code=200, content={"active_container": mask_owner(active_container)})
     else:
-        logger.info(f"[MY_ACTIVE] No active container for IP: {ip}")
+        logger.info("[MY_ACTIVE] No active container for owner: %s", public_owner(owner))
         return JSONResponse(status_code=200, content={"active_container": None})
 
 @app.get("/containers/status")
@@ -261,8 +619,8 @@ async def get_all_container_status(request: Request):
     Get status for all managed containers with lock information
     Also returns current user's active container if any
     """
-    ip = get_client_ip(request)
-    logger.info(f"[STATUS_ALL] Request for all container statuses from IP: {ip}")
+    owner = get_owner(request)
+    logger.info("[STATUS_ALL] Request for all container statuses from owner: %s", public_owner(owner))
     
     # First cleanup exited containers
     cleanup_exited_containers()
@@ -270,8 +628,8 @@ async def get_all_container_status(request: Request):
     
     # Get current user's active container
     user_active_container = None
-    if ip != "unknown":
-        user_active_container = get_user_active_container(ip)
+    if owner != "unknown":
+        user_active_container = get_user_active_container(owner)
     
     # Enhance with clickable status
     enhanced_containers = []
@@ -293,20 +651,20 @@ async def get_all_container_status(request: Request):
             if 'blocked_reason' in enhanced_container:
                 del enhanced_container['blocked_reason']
         # 2. If container is locked by another IP, it's not clickable
-        elif enhanced_container.get('is_locked') and enhanced_container.get('locked_by_ip') != ip:
+        elif enhanced_container.get('is_locked') and enhanced_container.get('locked_by_ip') != owner:
             enhanced_container['is_clickable'] = False
-            enhanced_container['blocked_reason'] = f"Container locked by another user ({enhanced_container.get('locked_by_ip')})"
+            enhanced_container['blocked_reason'] = f"Container locked by another user ({public_owner(enhanced_container.get('locked_by_ip'))})"
         # 3. If user has an active container, all other containers should not be clickable
         elif user_active_container and container['id'] != user_active_container['container_id']:
             enhanced_container['is_clickable'] = False
             enhanced_container['blocked_reason'] = "You already have an active container"
             
-        enhanced_containers.append(enhanced_container)
+        enhanced_containers.append(mask_owner(enhanced_container))
     
-    logger.info(f"[STATUS_ALL] Returning {len(enhanced_containers)} containers")
+    logger.info("[STATUS_ALL] Returning %s containers", len(enhanced_containers))
     return JSONResponse(status_code=200, content={
         "containers": enhanced_containers,
-        "user_active_container": user_active_container
+        "user_active_container": mask_owner(user_active_container)
     })
 
 @app.get("/session/{container_name}", response_class=HTMLResponse)
@@ -324,26 +682,28 @@ async def container_session(request: Request, container_name: str):
                 break
         
         if not container:
-            logger.warning(f"[SESSION] Container not found: {container_name}")
+            logger.warning("[SESSION] Container not found: %s", container_name)
             raise HTTPException(status_code=404, detail="Container not found")
         
         # Construct the container URL (based on Caddy configuration)
         container_url = f"/vm/{container_name}/"
         
-        logger.info(f"[SESSION] Serving session page for container: {container_name}")
+        logger.info("[SESSION] Serving session page for container: %s", container_name)
         return templates.TemplateResponse(
             "container_session.html",
             {
                 "request": request,
                 "container_id": container['id'],
                 "container_name": container_name,
-                "container_url": container_url
+                "container_url": container_url,
+                "wake_mode": get_wake_mode(container['id']) if container['status'] != 'running' else None,
+                "heartbeat_interval": config.HEARTBEAT_INTERVAL if idle.is_enabled() else 0
             }
         )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error serving session page for {container_name}: {e}")
+        logger.error("Error serving session page for %s: %s", container_name, e)
         return templates.TemplateResponse(
             "error.html",
             {"request": request},
@@ -356,15 +716,15 @@ async def verify_caddy_config(request: Request):
     Verify Caddy server configuration for container URLs
     Requires user to have an active container lock
     """
-    ip = get_client_ip(request)
-    if ip == "unknown":
+    owner = get_owner(request)
+    if owner == "unknown":
         logger.warning("[VERIFY_CONFIG] Failed: No IP provided")
         raise HTTPException(status_code=400, detail="IP address required")
     
     # Check if user has an active container
-    user_active_container = get_user_active_container(ip)
+    user_active_container = get_user_active_container(owner)
     if not user_active_container:
-        logger.warning(f"[VERIFY_CONFIG] Failed: IP {ip} has no active container")
+        logger.warning("[VERIFY_CONFIG] Failed: owner %s has no active container", public_owner(owner))
         raise HTTPException(status_code=403, detail="No active container found. Please acquire a container lock first.")
     
     try:
@@ -393,11 +753,11 @@ async def verify_caddy_config(request: Request):
                 "is_user_container": container['id'] == user_active_container["container_id"]
             })
         
-        logger.info(f"[VERIFY_CONFIG] Caddy configuration verified for IP {ip}")
+        logger.info("[VERIFY_CONFIG] Caddy configuration verified for owner %s", public_owner(owner))
         return JSONResponse(status_code=200, content=config_info)
         
     except Exception as e:
-        logger.error(f"Error verifying Caddy config: {e}")
+        logger.error("Error verifying Caddy config: %s", e)
         raise HTTPException(status_code=500, detail="Failed to verify configuration")
 
 if __name__ == "__main__":
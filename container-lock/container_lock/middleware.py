@@ -1,91 +1,122 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
 import redis
+import redis.asyncio
+import asyncio
 import time
+import uuid
+import weakref
 import logging
 from container_lock.config import config
-from container_lock.utils import get_client_ip
+from container_lock.session import get_owner, public_owner
 
 logger = logging.getLogger(__name__)
 
+# Delete the distributed lock only if this request still holds it
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 class IPLockMiddleware:
     """
-    Redis-based IP locking middleware for session endpoints.
-    Prevents concurrent session requests from the same IP address.
+    Per-owner serialization of session endpoints.
+    Requests from the same session (or, without a session cookie, the same
+    IP address) are queued behind an in-process asyncio lock and rejected
+    only if they wait longer than wait_timeout. When several
+    service replicas are configured, a Redis lock additionally orders requests
+    across replicas.
     Based on the guide for handling real IPs behind Caddy.
     """
-    
-    def __init__(self, redis_url: str = None, lock_timeout: int = 30):
-        self.redis_client = redis.Redis.from_url(redis_url or config.REDIS_URL, decode_responses=True)
+
+    def __init__(self, redis_url: str = None, lock_timeout: int = 30, wait_timeout: float = None, replicas: int = None):
         self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout if wait_timeout is not None else config.SESSION_LOCK_WAIT
         self.session_paths = ["/acquire", "/release", "/end-session"]
-    
+        # Entries disappear once no request holds or waits for the lock,
+        # so the table only ever contains owners with requests in flight
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+        replicas = replicas if replicas is not None else config.SERVICE_REPLICAS
+        self.redis_client = None
+        if replicas > 1:
+            self.redis_client = redis.asyncio.Redis.from_url(redis_url or config.REDIS_URL, decode_responses=True)
+
     async def __call__(self, request: Request, call_next):
         """
-        Middleware that implements IP-based locking for session endpoints
+        Middleware that serializes session requests per lock owner
         """
         # Check if this is a session endpoint that needs locking
         if not self._is_session_endpoint(request.url.path):
             return await call_next(request)
-        
-        # Extract real client IP (handles Caddy proxy)
-        client_ip = get_client_ip(request)
-        if client_ip == "unknown":
+
+        # Session token, or the real client IP (handles Caddy proxy)
+        owner = get_owner(request)
+        if owner == "unknown":
             logger.warning("[IP_LOCK] No valid client IP found")
             return JSONResponse(
                 status_code=400,
                 content={"error": "Unable to determine client IP address"}
             )
-        
-        # Create lock key for this IP
-        lock_key = f"session_lock:{client_ip}"
-        
-        # Try to acquire lock
-        lock_acquired = False
+
+        deadline = time.monotonic() + self.wait_timeout
+        local_lock = self._locks.get(owner)
+        if local_lock is None:
+            local_lock = asyncio.Lock()
+            self._locks[owner] = local_lock
+
+        try:
+            await asyncio.wait_for(local_lock.acquire(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            return self._busy_response(owner)
+
+        try:
+            if self.redis_client is None:
+                return await call_next(request)
+            return await self._call_with_distributed_lock(request, call_next, owner, deadline)
+        finally:
+            local_lock.release()
+
+    async def _call_with_distributed_lock(self, request: Request, call_next, owner: str, deadline: float):
+        """Hold a Redis lock for owner while the request runs on this replica"""
+        lock_key = f"session_lock:{owner}"
+        token = uuid.uuid4().hex
+        delay = 0.05
         try:
             # Use Redis SET with NX (not exists) and EX (expire) for atomic lock
-            lock_acquired = self.redis_client.set(
-                lock_key, 
-                int(time.time()), 
-                nx=True,  # Only set if key doesn't exist
-                ex=self.lock_timeout  # Expire after timeout
-            )
-            
-            if not lock_acquired:
-                logger.warning(f"[IP_LOCK] IP {client_ip} blocked - concurrent session request")
-                return JSONResponse(
-                    status_code=409,
-                    content={
-                        "error": f"IP {client_ip} already has an active session request",
-                        "retry_after": 5  # Suggest retry after 5 seconds
-                    }
-                )
-            
-            logger.info(f"[IP_LOCK] Lock acquired for IP {client_ip} on {request.url.path}")
-            
-            # Process the request
-            response = await call_next(request)
-            
-            return response
-            
+            while not await self.redis_client.set(lock_key, token, nx=True, ex=self.lock_timeout):
+                if time.monotonic() + delay > deadline:
+                    return self._busy_response(owner)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.5)
         except redis.RedisError as e:
-            logger.error(f"[IP_LOCK] Redis error: {e}")
+            logger.error("[IP_LOCK] Redis error: %s", e)
             # If Redis is down, allow request to proceed (fail open)
             return await call_next(request)
-            
+
+        try:
+            return await call_next(request)
         finally:
-            # Always release lock after request completion
-            if lock_acquired:
-                try:
-                    self.redis_client.delete(lock_key)
-                    logger.info(f"[IP_LOCK] Lock released for IP {client_ip}")
-                except redis.RedisError as e:
-                    logger.error(f"[IP_LOCK] Error releasing lock: {e}")
-    
+            try:
+                await self.redis_client.eval(RELEASE_SCRIPT, 1, lock_key, token)
+            except redis.RedisError as e:
+                logger.error("[IP_LOCK] Error releasing lock: %s", e)
+
+    def _busy_response(self, owner: str) -> JSONResponse:
+        logger.warning("[IP_LOCK] %s blocked - session request waited longer than %ss", public_owner(owner), self.wait_timeout)
+        return JSONResponse(
+            status_code=409,
+            content={
+                "error": f"{public_owner(owner)} already has an active session request",
+                "retry_after": 5  # Suggest retry after 5 seconds
+            }
+        )
+
     def _is_session_endpoint(self, path: str) -> bool:
         """Check if the path is a session endpoint that requires locking"""
         return any(path.startswith(session_path) for session_path in self.session_paths)
 
-def create_ip_lock_middleware(redis_url: str = None, lock_timeout: int = 30):
+def create_ip_lock_middleware(redis_url: str = None, lock_timeout: int = 30, wait_timeout: float = None):
     """Factory function to create IP lock middleware"""
-    return IPLockMiddleware(redis_url, lock_timeout) 
\ No newline at end of file
+    return IPLockMiddleware(redis_url, lock_timeout, wait_timeout)
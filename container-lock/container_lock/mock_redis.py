@@ -1,3 +1,22 @@
+class MockPipeline:
+    """Queues commands and runs them against the MockRedis on execute()"""
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        results = [getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in self._commands]
+        self._commands = []
+        return results
+
+
 class MockRedis:
     def __init__(self, *args, **kwargs):
         self._data = {}
@@ -7,15 +26,121 @@ class MockRedis:
         v = self._data.get(key)
         return v.encode() if isinstance(v, str) else v
 
+    def set(self, key, value, **kwargs):
+        if kwargs.get('nx') and key in self._data:
+            return None
+        self._data[key] = value
+        return True
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return MockPipeline(self)
+
     def setex(self, key, ttl, value):
         self._data[key] = value
         return True
 
-    def delete(self, key):
-        if key in self._data:
-            del self._data[key]
-            return True
-        return False
+    def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            if key in self._data:
+                del self._data[key]
+                deleted += 1
+        return deleted
+
+    def publish(self, channel, message):
+        return 0
+
+    def rpush(self, key, value):
+        self._data.setdefault(key, [])
+        self._data[key].append(value)
+        return len(self._data[key])
+
+    def lpush(self, key, value):
+        self._data.setdefault(key, [])
+        self._data[key].insert(0, value)
+        return len(self._data[key])
+
+    def blpop(self, keys, timeout=0):
+        for key in ([keys] if isinstance(keys, str) else keys):
+            if self._data.get(key):
+                value = self._data[key].pop(0)
+                return (key.encode(), value.encode() if isinstance(value, str) else value)
+        return None
+
+    def lmove(self, first_list, second_list, src="LEFT", dest="RIGHT"):
+        if not self._data.get(first_list):
+            return None
+        value = self._data[first_list].pop(0 if src == "LEFT" else -1)
+        if dest == "LEFT":
+            self.lpush(second_list, value)
+        else:
+            self.rpush(second_list, value)
+        return value.encode() if isinstance(value, str) else value
+
+    def blmove(self, first_list, second_list, timeout, src="LEFT", dest="RIGHT"):
+        return self.lmove(first_list, second_list, src, dest)
+
+    def lrem(self, key, count, value):
+        items = self._data.get(key, [])
+        normalize = lambda v: v.encode() if isinstance(v, str) else v
+        removed = 0
+        for item in list(items):
+            if (count == 0 or removed < abs(count)) and normalize(item) == normalize(value):
+                items.remove(item)
+                removed += 1
+        return removed
+
+    def zadd(self, key, mapping):
+        self._data.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def zrem(self, key, *members):
+        zset = self._data.get(key, {})
+        return sum(zset.pop(m, None) is not None for m in members)
+
+    def zscore(self, key, member):
+        return self._data.get(key, {}).get(member)
+
+    def zcard(self, key):
+        return len(self._data.get(key, {}))
+
+    def zremrangebyscore(self, key, min_score, max_score):
+        zset = self._data.get(key, {})
+        expired = [m for m, score in zset.items() if min_score <= score <= max_score]
+        for member in expired:
+            del zset[member]
+        return len(expired)
+
+    def zrangebyscore(self, key, min_score, max_score):
+        low = float(min_score)
+        high = float(max_score)
+        zset = self._data.get(key, {})
+        members = sorted((score, m) for m, score in zset.items() if low <= score <= high)
+        return [m.encode() if isinstance(m, str) else m for _, m in members]
+
+    def hincrby(self, key, field, amount=1):
+        hash_ = self._data.setdefault(key, {})
+        hash_[str(field)] = int(hash_.get(str(field), 0)) + amount
+        return hash_[str(field)]
+
+    def hset(self, key, field, value):
+        hash_ = self._data.setdefault(key, {})
+        new = str(field) not in hash_
+        hash_[str(field)] = value
+        return int(new)
+
+    def hgetall(self, key):
+        return {str(f).encode(): str(v).encode() for f, v in self._data.get(key, {}).items()}
+
+    def hdel(self, key, *fields):
+        hash_ = self._data.get(key, {})
+        return sum(hash_.pop(str(f), None) is not None for f in fields)
+
+    def expire(self, key, ttl):
+        return key in self._data
 
     def sadd(self, key, member):
         if key not in self._sets:
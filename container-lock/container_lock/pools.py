@@ -0,0 +1,101 @@
+import logging
+import docker
+from fastapi import HTTPException
+from container_lock.config import config
+from container_lock import lock
+from container_lock import reservations
+
+logger = logging.getLogger(__name__)
+
+# Docker label naming the pool a VM belongs to (render.py --pools-file)
+POOL_LABEL = "lab.pool"
+
+
+def _pool_vms(redis_client, pool: str | None = None) -> list[dict]:
+    """Managed VMs of one pool, or of all pools, with their lock state"""
+    filters = [f"sablier.group={config.GROUP_LABEL}"]
+    if pool:
+        filters.append(f"{POOL_LABEL}={pool}")
+    client = lock.get_docker_client()
+    containers = lock.docker_breaker.call(client.containers.list, all=True, filters={"label": filters})
+    vms = sorted(
+        ({"id": c.id, "name": c.name, "status": c.status, "pool": (c.labels or {}).get(POOL_LABEL)} for c in containers),
+        key=lambda vm: vm["name"]
+    )
+    for vm in vms:
+        vm["in_use"] = lock.get_container_owner(vm["id"], redis_client) is not None
+        vm["reserved"] = not vm["in_use"] and reservations.is_reserved(vm["id"], redis_client)
+    return vms
+
+
+def _summary(name: str, vms: list[dict]) -> dict:
+    capacity = config.POOL_CAPACITY.get(name)
+    in_use = sum(vm["in_use"] for vm in vms)
+    free = sum(not vm["in_use"] and not vm["reserved"] for vm in vms)
+    if capacity is not None:
+        free = max(0, min(free, capacity - in_use))
+    return {
+        "pool": name,
+        "total": len(vms),
+        "running": sum(vm["status"] == "running" for vm in vms),
+        "in_use": in_use,
+        "available": free,
+        "capacity": capacity,
+    }
+
+
+def list_pools(redis_client=None) -> list[dict]:
+    """Size, use and availability of every pool; VMs without a pool label are left out"""
+    redis_client = redis_client or lock.get_redis_client()
+    by_pool: dict[str, list[dict]] = {}
+    for vm in _pool_vms(redis_client):
+        if vm["pool"]:
+            by_pool.setdefault(vm["pool"], []).append(vm)
+    return [_summary(name, vms) for name, vms in sorted(by_pool.items())]
+
+
+def pool_of(container_id: str) -> str | None:
+    client = lock.get_docker_client()
+    try:
+        container = lock.docker_breaker.call(client.containers.get, container_id)
+    except docker.errors.NotFound:
+        return None
+    return (container.labels or {}).get(POOL_LABEL)
+
+
+def check_capacity(pool: str | None, redis_client=None) -> tuple[int, list[str]] | None:
+    """
+    Raise 409 if the pool already has POOL_CAPACITY VMs in use
+    Returns (capacity, IDs of the pool's VMs) for acquire_lock to enforce
+    again atomically with its claim, or None if the pool has no capacity.
+    """
+    capacity = config.POOL_CAPACITY.get(pool) if pool else None
+    if capacity is None:
+        return None
+    redis_client = redis_client or lock.get_redis_client()
+    vms = _pool_vms(redis_client, pool)
+    in_use = sum(vm["in_use"] for vm in vms)
+    if in_use >= capacity:
+        logger.warning("[POOL] %s is at capacity: %s of %s VMs in use", pool, in_use, capacity)
+        raise HTTPException(status_code=409, detail=f"Pool {pool} is at capacity ({capacity} VMs in use)")
+    return capacity, [vm["id"] for vm in vms]
+
+
+def free_vms(pool: str, redis_client=None) -> list[dict]:
+    """
+    Free VMs of a pool for /acquire by pool, best first
+    Running VMs come first, so a warm VM is handed out before one that must boot
+    """
+    redis_client = redis_client or lock.get_redis_client()
+    vms = _pool_vms(redis_client, pool)
+    if not vms:
+        raise HTTPException(status_code=404, detail=f"Unknown pool: {pool}")
+    free = [vm for vm in vms if not vm["in_use"] and not vm["reserved"]]
+    if not free:
+        raise HTTPException(status_code=409, detail=f"No free VMs in pool {pool}")
+    return sorted(free, key=lambda vm: (vm["status"] != "running", vm["name"]))
+
+
+def pick_vm(pool: str, redis_client=None) -> dict:
+    """The best free VM of a pool"""
+    return free_vms(pool, redis_client)[0]
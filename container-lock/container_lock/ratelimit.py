@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from fastapi import Request
+from fastapi.responses import JSONResponse
+import redis
+import redis.asyncio
+import math
+import time
+import logging
+from container_lock.config import config
+from container_lock.utils import get_client_ip
+from container_lock.session import get_owner, public_owner
+
+logger = logging.getLogger(__name__)
+
+# Token bucket in Redis: refill, try to take one token, return the wait in ms
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - ts) / 1000 * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('hset', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('pexpire', KEYS[1], math.ceil(burst / rate * 1000))
+return wait
+"""
+
+
+class TokenBucketLimiter:
+    """
+    In-memory token buckets keyed by client.
+
+    Each bucket is a (tokens, last_refill) tuple in an LRU-ordered dict. A
+    bucket that has been idle long enough to refill completely is the same as
+    no bucket, so those are dropped from the cold end as new clients arrive,
+    and the table never grows beyond max_entries.
+    """
+
+    def __init__(self, rate: float, burst: float, max_entries: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str, now: float | None = None) -> float:
+        """
+        Take one token for key
+        Returns 0 if allowed, else the seconds until a token is available
+        """
+        now = time.monotonic() if now is None else now
+        tokens, last = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        self._evict(now)
+        return wait
+
+    def _evict(self, now: float) -> None:
+        full_after = self.burst / self.rate
+        while self._buckets:
+            key, (tokens, last) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_entries and now - last < full_after:
+                break
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RateLimitMiddleware:
+    """
+    Per-client and global token-bucket limits for status and session endpoints.
+    Clients are keyed like lock owners: by session token, or by IP without a
+    session cookie. Every address also has a ceiling of RATE_LIMIT_SHARED_IP_FACTOR
+    times the per-client limit, shared by the users behind one NAT and
+    capping a client that makes up session tokens. Limited requests get a
+    429 with Retry-After. With the redis backend the per-client and per-IP
+    buckets are shared by all replicas; if Redis fails, the in-memory
+    buckets are used instead.
+    """
+
+    def __init__(self, redis_url: str = None):
+        self.limited_paths = ["/acquire", "/release", "/end-session", "/heartbeat", "/check", "/my-active-container", "/containers/status"]
+        self.per_client = TokenBucketLimiter(config.RATE_LIMIT_PER_IP, config.RATE_LIMIT_PER_IP_BURST, config.RATE_LIMIT_MAX_CLIENTS)
+        self.per_ip = TokenBucketLimiter(
+            config.RATE_LIMIT_PER_IP * config.RATE_LIMIT_SHARED_IP_FACTOR,
+            config.RATE_LIMIT_PER_IP_BURST * config.RATE_LIMIT_SHARED_IP_FACTOR,
+            config.RATE_LIMIT_MAX_CLIENTS,
+        )
+        self.global_bucket = TokenBucketLimiter(config.RATE_LIMIT_GLOBAL, config.RATE_LIMIT_GLOBAL_BURST, 1)
+        self.redis_client = None
+        if config.RATE_LIMIT_BACKEND == "redis":
+            self.redis_client = redis.asyncio.Redis.from_url(redis_url or config.REDIS_URL)
+
+    async def __call__(self, request: Request, call_next):
+        if not config.RATE_LIMIT_ENABLED or not self._is_limited_endpoint(request.url.path):
+            return await call_next(request)
+
+        owner = get_owner(request)
+        client_ip = get_client_ip(request)
+        # Narrowest bucket first, so a client over its own limit cannot drain the shared ones for everyone else
+        wait = await self._take(self.per_client, owner) if owner != client_ip else 0
+        if not wait:
+            wait = await self._take(self.per_ip, f"ip:{client_ip}")
+        if not wait:
+            wait = self.global_bucket.take("global")
+        if wait:
+            retry_after = max(1, math.ceil(wait))
+            logger.warning("[RATE_LIMIT] %s limited on %s, retry after %ss", public_owner(owner), request.url.path, retry_after)
+            return JSONResponse(
+                status_code=429,
+                content={"error": "Too many requests", "retry_after": retry_after},
+                headers={"Retry-After": str(retry_after)}
+            )
+        return await call_next(request)
+
+    async def _take(self, limiter: TokenBucketLimiter, key: str) -> float:
+        if self.redis_client is not None:
+            try:
+                wait_ms = await self.redis_client.eval(
+                    TOKEN_BUCKET_SCRIPT, 1, f"ratelimit:{key}",
+                    limiter.rate, limiter.burst, int(time.time() * 1000)
+                )
+                return int(wait_ms) / 1000
+            except redis.RedisError as e:
+                logger.error("[RATE_LIMIT] Redis error, using in-memory buckets: %s", e)
+        return limiter.take(key)
+
+    def _is_limited_endpoint(self, path: str) -> bool:
+        if path.startswith("/container/") and path.endswith("/status"):
+            return True
+        return any(path.startswith(limited_path) for limited_path in self.limited_paths)
+
+
+def create_rate_limit_middleware(redis_url: str = None):
+    """Factory function to create rate limit middleware"""
+    return RateLimitMiddleware(redis_url)
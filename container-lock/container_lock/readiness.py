@@ -0,0 +1,97 @@
+import asyncio
+import json
+import logging
+import time
+import docker
+import httpx
+from container_lock.config import config
+from container_lock import lock
+
+logger = logging.getLogger(__name__)
+
+# One prober per waking VM in this process, shared by every status stream watching it
+_probes: dict[str, asyncio.Task] = {}
+
+
+async def probe(container_name: str, client: httpx.AsyncClient) -> bool:
+    """One request to the VM's web console, like the compose healthcheck (curl -f)"""
+    try:
+        response = await client.get(f"http://{container_name}:{config.VM_WEB_PORT}/")
+        return response.status_code < 400
+    except httpx.HTTPError:
+        return False
+
+
+def _container_state(container_id: str) -> tuple[str | None, str | None, str | None]:
+    """Name, status and Docker health of a container; health is None without a healthcheck"""
+    try:
+        container = lock.docker_breaker.call(lock.get_docker_client().containers.get, container_id)
+    except docker.errors.NotFound:
+        return None, None, None
+    return container.name, container.status, container.attrs.get("State", {}).get("Health", {}).get("Status")
+
+
+async def wait_until_ready(container_id: str, timeout: float | None = None) -> bool:
+    """
+    Probe a waking VM until it serves :8006 and Docker also reports it healthy,
+    which Sablier waits for before it stops showing its waiting page
+    Probes start READINESS_INITIAL_INTERVAL apart and back off to READINESS_MAX_INTERVAL.
+    Returns False if the VM is gone or not ready within READINESS_TIMEOUT.
+    """
+    started = time.monotonic()
+    deadline = started + (timeout or config.READINESS_TIMEOUT)
+    interval = config.READINESS_INITIAL_INTERVAL
+    probes = 0
+    async with httpx.AsyncClient(timeout=config.READINESS_PROBE_TIMEOUT) as client:
+        while time.monotonic() < deadline:
+            try:
+                name, status, health = await asyncio.to_thread(_container_state, container_id)
+            except Exception as e:
+                logger.warning("[READY] Cannot inspect %s: %s", container_id, e)
+                name, status, health = container_id, None, None
+            if name is None:
+                return False
+            # Sablier starts the VM once its route is requested; until then there is nothing to probe
+            if status == "running":
+                probes += 1
+                if await probe(name, client) and health in ("healthy", None):
+                    logger.info("[READY] %s ready after %.1fs (%s probes)", name, time.monotonic() - started, probes)
+                    return True
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, config.READINESS_MAX_INTERVAL)
+    logger.warning("[READY] %s not ready after %ss", container_id, timeout or config.READINESS_TIMEOUT)
+    return False
+
+
+def watch(container_id: str) -> asyncio.Task:
+    """The prober of a VM, started if none is running in this process"""
+    task = _probes.get(container_id)
+    if task is None or task.done():
+        task = asyncio.create_task(wait_until_ready(container_id))
+        _probes[container_id] = task
+        task.add_done_callback(lambda t: _probes.pop(container_id, None) if _probes.get(container_id) is t else None)
+    return task
+
+
+def _event(state: str) -> str:
+    return f"event: status\ndata: {json.dumps({'state': state})}\n\n"
+
+
+async def status_events(container_id: str):
+    """
+    Server-sent events for the session page: `waking` if the VM is not ready
+    at once, then `ready` the moment it is (or `timeout`), then the stream ends
+    Comments are sent every STATUS_STREAM_KEEPALIVE seconds to hold the connection open.
+    """
+    task = watch(container_id)
+    try:
+        ready = await asyncio.wait_for(asyncio.shield(task), config.READINESS_INITIAL_INTERVAL)
+    except asyncio.TimeoutError:
+        yield _event("waking")
+        while True:
+            try:
+                ready = await asyncio.wait_for(asyncio.shield(task), config.STATUS_STREAM_KEEPALIVE)
+                break
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+    yield _event("ready" if ready else "timeout")
@@ -0,0 +1,260 @@
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+import time
+import uuid
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from container_lock.config import config
+from container_lock import lock
+from container_lock.leader import elector
+
+logger = logging.getLogger(__name__)
+
+# Sorted sets: reservation ID -> start / end (unix time). Ended reservations
+# are removed, so "what starts in the next T seconds" is one small range query.
+STARTS_KEY = "reservations_by_start"
+ENDS_KEY = "reservations_by_end"
+
+# How long an ended reservation stays readable through GET /reservations/{id}
+RECORD_RETENTION = 24 * 3600
+
+
+def _reservation_key(reservation_id: str) -> str:
+    return f"reservation:{reservation_id}"
+
+
+def _hold_key(container_id: str) -> str:
+    """Container ID -> reservation ID holding it back from walk-in users"""
+    return f"reserved:{container_id}"
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def parse_time(value: str) -> float:
+    """Unix timestamp or ISO 8601 time (UTC unless it carries an offset)"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def vm_image(container) -> str:
+    """Boot image of a VM container, from its BOOT environment variable"""
+    for entry in container.attrs.get("Config", {}).get("Env") or []:
+        key, _, value = entry.partition("=")
+        if key == "BOOT":
+            return value
+    return "unknown"
+
+
+def _managed_vms() -> list[dict]:
+    client = lock.get_docker_client()
+    containers = lock.docker_breaker.call(
+        client.containers.list, all=True, filters={"label": f"sablier.group={config.GROUP_LABEL}"}
+    )
+    return sorted(
+        ({"id": c.id, "name": c.name, "image": vm_image(c)} for c in containers),
+        key=lambda vm: vm["name"]
+    )
+
+
+def get_reservation(reservation_id: str, redis_client=None) -> dict | None:
+    redis_client = redis_client or lock.get_redis_client()
+    raw = redis_client.get(_reservation_key(reservation_id))
+    return json.loads(_decode(raw)) if raw else None
+
+
+def _save(reservation: dict, redis_client, now: float) -> None:
+    ttl = max(1, int(reservation["end"] - now) + RECORD_RETENTION)
+    redis_client.set(_reservation_key(reservation["id"]), json.dumps(reservation), ex=ttl)
+
+
+def list_reservations(redis_client=None, starting_before: float | str = "+inf") -> list[dict]:
+    """Reservations that have not ended, ordered by start time"""
+    redis_client = redis_client or lock.get_redis_client()
+    reservations = []
+    for reservation_id in redis_client.zrangebyscore(STARTS_KEY, "-inf", starting_before):
+        reservation = get_reservation(_decode(reservation_id), redis_client)
+        if reservation is not None:
+            reservations.append(reservation)
+    return reservations
+
+
+def create_reservation(name: str, image: str, count: int, start: float, end: float,
+                       redis_client=None, now: float | None = None) -> dict:
+    """
+    Book `count` VMs of `image` for [start, end)
+    Fails with 409 if overlapping reservations would need more VMs than exist
+    """
+    redis_client = redis_client or lock.get_redis_client()
+    now = time.time() if now is None else now
+    if count < 1:
+        raise HTTPException(status_code=400, detail="count must be at least 1")
+    if end <= start or end <= now:
+        raise HTTPException(status_code=400, detail="Reservation must end after it starts, in the future")
+
+    available = sum(1 for vm in _managed_vms() if vm["image"] == image)
+    booked = sum(
+        r["count"] for r in list_reservations(redis_client, starting_before=end)
+        if r["image"] == image and r["end"] > start
+    )
+    if booked + count > available:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Only {max(0, available - booked)} of {available} {image} VMs are free in that window"
+        )
+
+    reservation = {
+        "id": uuid.uuid4().hex[:12],
+        "name": name,
+        "image": image,
+        "count": count,
+        "start": start,
+        "end": end,
+        # Students join with /session/<vm>?reservation=<code>
+        "code": secrets.token_urlsafe(12),
+        "containers": [],
+    }
+    _save(reservation, redis_client, now)
+    redis_client.zadd(STARTS_KEY, {reservation["id"]: start})
+    redis_client.zadd(ENDS_KEY, {reservation["id"]: end})
+    logger.info("[RESERVE] %s: %s x %s from %s to %s", reservation["id"], count, image, start, end)
+    return reservation
+
+
+def _release_holds(reservation: dict, redis_client) -> None:
+    for container in reservation["containers"]:
+        if _decode(redis_client.get(_hold_key(container["id"]))) == reservation["id"]:
+            redis_client.delete(_hold_key(container["id"]))
+
+
+def cancel_reservation(reservation_id: str, redis_client=None) -> bool:
+    redis_client = redis_client or lock.get_redis_client()
+    reservation = get_reservation(reservation_id, redis_client)
+    if reservation is None:
+        return False
+    _release_holds(reservation, redis_client)
+    redis_client.delete(_reservation_key(reservation_id))
+    redis_client.zrem(STARTS_KEY, reservation_id)
+    redis_client.zrem(ENDS_KEY, reservation_id)
+    logger.info("[RESERVE] %s cancelled", reservation_id)
+    return True
+
+
+def is_reserved(container_id: str, redis_client=None) -> bool:
+    redis_client = redis_client or lock.get_redis_client()
+    return bool(redis_client.get(_hold_key(container_id)))
+
+
+def check_walk_in(container_id: str, code: str | None, redis_client=None) -> None:
+    """Raise 409 if the container is held for a reservation whose code was not given"""
+    redis_client = redis_client or lock.get_redis_client()
+    reservation_id = _decode(redis_client.get(_hold_key(container_id)))
+    if not reservation_id:
+        return
+    reservation = get_reservation(reservation_id, redis_client)
+    if reservation is None:
+        return
+    if code and hmac.compare_digest(code.encode(), reservation["code"].encode()):
+        return
+    raise HTTPException(status_code=409, detail="Container is reserved for a scheduled class")
+
+
+def assign_containers(reservation: dict, redis_client, now: float) -> list[dict]:
+    """Hold enough free VMs of the reservation's image until it ends"""
+    missing = reservation["count"] - len(reservation["containers"])
+    if missing <= 0:
+        return reservation["containers"]
+    assigned = {c["id"] for c in reservation["containers"]}
+    ttl = max(1, int(reservation["end"] - now))
+    for vm in _managed_vms():
+        if missing == 0:
+            break
+        if vm["image"] != reservation["image"] or vm["id"] in assigned:
+            continue
+        if lock.get_container_owner(vm["id"], redis_client) is not None:
+            continue
+        if not redis_client.set(_hold_key(vm["id"]), reservation["id"], nx=True, ex=ttl):
+            continue
+        reservation["containers"].append({"id": vm["id"], "name": vm["name"]})
+        missing -= 1
+    if missing:
+        logger.warning("[RESERVE] %s is short of %s VMs", reservation["id"], missing)
+    _save(reservation, redis_client, now)
+    return reservation["containers"]
+
+
+async def prewarm(reservation: dict, redis_client=None) -> int:
+    """Start the reservation's VMs, at most RESERVATION_PREWARM_PARALLELISM at a time"""
+    semaphore = asyncio.Semaphore(config.RESERVATION_PREWARM_PARALLELISM)
+
+    async def start(container):
+        async with semaphore:
+            return await asyncio.to_thread(lock.start_container, container["id"], redis_client)
+
+    results = await asyncio.gather(*(start(c) for c in reservation["containers"]))
+    return sum(results)
+
+
+def end_reservations(redis_client, now: float) -> int:
+    """Drop ended reservations from the schedule and stop their VMs nobody locked"""
+    ended = 0
+    for reservation_id in redis_client.zrangebyscore(ENDS_KEY, "-inf", now):
+        reservation_id = _decode(reservation_id)
+        reservation = get_reservation(reservation_id, redis_client)
+        if reservation is not None:
+            _release_holds(reservation, redis_client)
+            for container in reservation["containers"]:
+                if lock.get_container_owner(container["id"], redis_client) is None:
+                    lock.enqueue_stop(container["id"], redis_client)
+        redis_client.zrem(STARTS_KEY, reservation_id)
+        redis_client.zrem(ENDS_KEY, reservation_id)
+        ended += 1
+    return ended
+
+
+async def run_schedule(redis_client=None, now: float | None = None) -> int:
+    """
+    One scheduler pass: end finished reservations, then hold and start the
+    VMs of every reservation starting within RESERVATION_PREWARM_LEAD
+    Returns the number of VMs started or confirmed running
+    """
+    redis_client = redis_client or lock.get_redis_client()
+    now = time.time() if now is None else now
+    await asyncio.to_thread(end_reservations, redis_client, now)
+    started = 0
+    upcoming = await asyncio.to_thread(list_reservations, redis_client, now + config.RESERVATION_PREWARM_LEAD)
+    for reservation in upcoming:
+        await asyncio.to_thread(assign_containers, reservation, redis_client, now)
+        if now < reservation["start"]:
+            # Once the class has begun its VMs are in use; leave them to the users
+            started += await prewarm(reservation, redis_client)
+    return started
+
+
+async def reservation_scheduler():
+    """Background task (leader only): pre-warm VMs for upcoming reservations"""
+    while True:
+        try:
+            await asyncio.sleep(config.RESERVATION_CHECK_INTERVAL)
+            if not await elector.is_current():
+                continue
+            started = await run_schedule()
+            if started:
+                logger.debug("Reservation scheduler: %s VMs warm", started)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error("Error in reservation scheduler: %s", e)
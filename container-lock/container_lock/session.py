@@ -0,0 +1,85 @@
+import hashlib
+import re
+import secrets
+from fastapi import Request
+from container_lock.config import config
+from container_lock.utils import get_client_ip
+
+SESSION_PREFIX = "session:"
+TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9_-]{32,64}$")
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def get_owner(request: Request) -> str:
+    """
+    Lock owner key for a request: the browser's session token when it sent a
+    valid session cookie, otherwise the client IP (or "unknown").
+    Resolved once per request and kept on request.state.
+    """
+    owner = getattr(request.state, "owner", None)
+    if owner is not None:
+        return owner
+    token = request.cookies.get(config.SESSION_COOKIE_NAME) if config.SESSION_TOKENS_ENABLED else None
+    if token and TOKEN_PATTERN.match(token):
+        owner = f"{SESSION_PREFIX}{token}"
+    else:
+        owner = get_client_ip(request)
+    request.state.owner = owner
+    return owner
+
+
+def public_owner(owner: str | None) -> str | None:
+    """
+    Owner as shown to other users. Session tokens are bearer credentials,
+    so only a short fingerprint of them is ever returned by the API.
+    """
+    if owner and owner.startswith(SESSION_PREFIX):
+        return "session " + hashlib.sha256(owner.encode()).hexdigest()[:8]
+    return owner
+
+
+def mask_owner(info: dict | None) -> dict | None:
+    """Copy of a container/lock dict with its locked_by_ip made safe to return"""
+    if not info or not info.get("locked_by_ip"):
+        return info
+    return {**info, "locked_by_ip": public_owner(info["locked_by_ip"])}
+
+
+class SessionCookieMiddleware:
+    """
+    Issue a session token cookie to browsers that don't have one yet, when
+    they load the UI or a session page. The request that receives the
+    cookie is still identified by its IP; every later request from that
+    browser is identified by the token, so many users behind one NAT
+    address can each hold a VM.
+    """
+
+    def __init__(self):
+        self.page_paths = ["/session/"]
+
+    async def __call__(self, request: Request, call_next):
+        if not config.SESSION_TOKENS_ENABLED or not self._is_page(request.url.path):
+            return await call_next(request)
+        token = request.cookies.get(config.SESSION_COOKIE_NAME)
+        response = await call_next(request)
+        if not token or not TOKEN_PATTERN.match(token):
+            response.set_cookie(
+                config.SESSION_COOKIE_NAME,
+                new_token(),
+                max_age=config.SESSION_COOKIE_MAX_AGE,
+                path="/",
+                httponly=True,
+                samesite="lax"
+            )
+        return response
+
+    def _is_page(self, path: str) -> bool:
+        return path == "/" or any(path.startswith(page_path) for page_path in self.page_paths)
+
+
+def create_session_cookie_middleware():
+    """Factory function to create session cookie middleware"""
+    return SessionCookieMiddleware()
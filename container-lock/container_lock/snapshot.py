@@ -0,0 +1,104 @@
+import logging
+import shlex
+import time
+from container_lock.config import config
+
+logger = logging.getLogger(__name__)
+
+# Talks to the QEMU HMP monitor from inside the VM container. The monitor
+# prints a prompt on connect and another once the command has finished, so
+# wait for the second prompt before closing the connection.
+MONITOR_SCRIPT = """
+exec 3<>/dev/tcp/127.0.0.1/{port} || exit 2
+printf '%s\\n' {command} >&3
+out=''
+while IFS= read -r -t {timeout} -N 1 c <&3; do
+    out="$out$c"
+    case "$out" in *'(qemu) '*'(qemu) '*) break ;; esac
+done
+printf '%s' "$out"
+"""
+
+
+class SnapshotError(Exception):
+    """Raised when the QEMU monitor rejects or times out a snapshot command"""
+
+
+def _snapshot_key(container_id: str) -> str:
+    return f"snapshot:{container_id}"
+
+
+def monitor_command(container, command: str, timeout: int | None = None) -> str:
+    """
+    Run a single HMP command against the QEMU monitor of a running container
+    Returns the monitor output for the command
+    """
+    timeout = timeout or config.SNAPSHOT_TIMEOUT
+    script = MONITOR_SCRIPT.format(
+        port=config.QEMU_MONITOR_PORT,
+        command=shlex.quote(command),
+        timeout=timeout
+    )
+    exit_code, output = container.exec_run(["bash", "-c", script])
+    output = output.decode(errors="replace") if isinstance(output, bytes) else (output or "")
+    if exit_code != 0:
+        raise SnapshotError(f"Monitor unreachable in {container.name} (exit {exit_code})")
+    if "Error" in output or output.count("(qemu) ") < 2:
+        raise SnapshotError(f"'{command}' failed in {container.name}: {output.strip()}")
+    return output
+
+
+def save_vm_state(container, redis_client) -> bool:
+    """
+    Save guest state to the container's qcow2 disk before it is stopped
+    Returns True if a snapshot was written
+    """
+    if container.status != 'running':
+        return False
+    started = time.monotonic()
+    monitor_command(container, f"savevm {config.SNAPSHOT_TAG}")
+    redis_client.set(_snapshot_key(container.id), int(time.time()))
+    logger.info("Saved guest state for %s in %.1fs", container.name, time.monotonic() - started)
+    return True
+
+
+def restore_vm_state(container, redis_client) -> bool:
+    """
+    Restore guest state saved by save_vm_state()
+    Returns True if the snapshot was loaded. The marker is dropped either way:
+    once loaded, the guest moves on from it, and a stop that skips savevm
+    (e.g. Sablier's idle stop) must lead to a cold boot, not the same old state.
+    """
+    started = time.monotonic()
+    try:
+        monitor_command(container, f"loadvm {config.SNAPSHOT_TAG}")
+    finally:
+        redis_client.delete(_snapshot_key(container.id))
+    logger.info("Restored guest state for %s in %.1fs", container.name, time.monotonic() - started)
+    return True
+
+
+def has_snapshot(container_id: str, redis_client) -> bool:
+    return bool(redis_client.get(_snapshot_key(container_id)))
+
+
+def discard_snapshot(container_id: str, redis_client) -> bool:
+    """Forget saved guest state so the next wake cold boots"""
+    return bool(redis_client.delete(_snapshot_key(container_id)))
+
+
+def wait_for_monitor(container, timeout: int | None = None, interval: float = 0.5) -> bool:
+    """
+    Wait until the QEMU monitor of a freshly started container accepts commands
+    """
+    deadline = time.monotonic() + (timeout or config.SNAPSHOT_TIMEOUT)
+    while time.monotonic() < deadline:
+        container.reload()
+        if container.status == 'running':
+            try:
+                monitor_command(container, "info status", timeout=2)
+                return True
+            except SnapshotError:
+                pass
+        time.sleep(interval)
+    return False
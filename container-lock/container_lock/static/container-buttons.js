@@ -38,6 +38,11 @@ class ContainerButton {
     async checkStatus() {
         try {
             const response = await fetch(`/container/${this.containerId}/status`);
+            if (response.status === 429) {
+                // Rate limited: skip polls until the server says to retry
+                this.pausePolling(parseInt(response.headers.get('Retry-After') || '5', 10));
+                return null;
+            }
             if (response.ok) {
                 return await response.json();
             }
@@ -129,6 +134,11 @@ class ContainerButton {
         }, 5000);
     }
     
+    pausePolling(seconds) {
+        this.stopPolling();
+        setTimeout(() => this.startPolling(), seconds * 1000);
+    }
+    
     stopPolling() {
         if (this.pollInterval) {
             clearInterval(this.pollInterval);
@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from container_lock.config import config
+from container_lock import lock
+from container_lock import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Sample(NamedTuple):
+    """Cumulative counters of one container at one point in time"""
+    ts: float
+    cpu_ns: int
+    memory_bytes: int
+    block_read_bytes: int
+    block_write_bytes: int
+    net_rx_bytes: int
+    net_tx_bytes: int
+
+
+class TelemetryStore:
+    """
+    Fixed-size ring buffer of samples per VM.
+
+    Memory is bounded by max_samples per VM, and VMs that disappear are
+    dropped on the next pass, so the store never outgrows the lab. The
+    sampler writes from a worker thread while requests read, so every
+    access holds the store's lock; readers copy under it and compute after.
+    """
+
+    def __init__(self, max_samples: int):
+        self.max_samples = max_samples
+        self._buffers: dict[str, deque[Sample]] = {}
+        self._names: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, container_id: str, name: str, sample: Sample) -> None:
+        with self._lock:
+            buffer = self._buffers.get(container_id)
+            if buffer is None:
+                buffer = self._buffers[container_id] = deque(maxlen=self.max_samples)
+            buffer.append(sample)
+            self._names[container_id] = name
+
+    def retain(self, container_ids: set[str]) -> None:
+        with self._lock:
+            for container_id in set(self._buffers) - container_ids:
+                del self._buffers[container_id]
+                del self._names[container_id]
+
+    def resolve(self, container: str) -> str | None:
+        """Container ID for an ID or VM name"""
+        with self._lock:
+            if container in self._buffers:
+                return container
+            return next((cid for cid, name in self._names.items() if name == container), None)
+
+    def _samples(self, container_id: str) -> list[Sample]:
+        with self._lock:
+            return list(self._buffers.get(container_id, ()))
+
+    def series(self, container_id: str) -> list[dict]:
+        """Per-interval rates between consecutive samples"""
+        samples = self._samples(container_id)
+        return [_rates(previous, current) for previous, current in zip(samples, samples[1:])]
+
+    def average(self, container_id: str, window: float) -> dict | None:
+        """Rates over about the last `window` seconds, or None before two samples exist"""
+        samples = self._samples(container_id)
+        if len(samples) < 2:
+            return None
+        latest = samples[-1]
+        start = next(s for s in samples if s.ts >= latest.ts - window or s is samples[-2])
+        return _rates(start, latest)
+
+    def latest(self) -> dict[str, dict]:
+        with self._lock:
+            pairs = [(container_id, self._names[container_id], buffer[-2], buffer[-1])
+                     for container_id, buffer in self._buffers.items() if len(buffer) >= 2]
+        return {name: {"container_id": container_id, **_rates(previous, current)}
+                for container_id, name, previous, current in pairs}
+
+    def latest_sample(self, container_id: str) -> Sample | None:
+        with self._lock:
+            buffer = self._buffers.get(container_id)
+            return buffer[-1] if buffer else None
+
+    def names(self) -> dict[str, str]:
+        with self._lock:
+            return dict(self._names)
+
+
+def _rates(previous: Sample, current: Sample) -> dict:
+    elapsed = max(current.ts - previous.ts, 1e-9)
+    return {
+        "ts": current.ts,
+        "cpu_cores": round((current.cpu_ns - previous.cpu_ns) / 1e9 / elapsed, 3),
+        "memory_bytes": current.memory_bytes,
+        "block_read_bps": max(0, current.block_read_bytes - previous.block_read_bytes) / elapsed,
+        "block_write_bps": max(0, current.block_write_bytes - previous.block_write_bytes) / elapsed,
+        "net_rx_bps": max(0, current.net_rx_bytes - previous.net_rx_bytes) / elapsed,
+        "net_tx_bps": max(0, current.net_tx_bytes - previous.net_tx_bytes) / elapsed,
+    }
+
+
+store = TelemetryStore(max(2, config.TELEMETRY_RETENTION // max(1, config.TELEMETRY_INTERVAL)))
+
+
+# --- cgroup v2 reader (local Docker) ---
+
+# Container cgroup directory per container ID (systemd or cgroupfs driver)
+_cgroup_dirs: dict[str, str] = {}
+
+
+def _cgroup_dir(container_id: str) -> str | None:
+    cached = _cgroup_dirs.get(container_id)
+    if cached:
+        return cached
+    root = config.TELEMETRY_CGROUP_ROOT
+    for candidate in (
+        os.path.join(root, "system.slice", f"docker-{container_id}.scope"),
+        os.path.join(root, "docker", container_id),
+    ):
+        if os.path.isfile(os.path.join(candidate, "cpu.stat")):
+            _cgroup_dirs[container_id] = candidate
+            return candidate
+    return None
+
+
+def _read_file(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def _read_cgroup(path: str, pid: int | None, now: float) -> Sample:
+    cpu_usec = 0
+    for line in _read_file(os.path.join(path, "cpu.stat")).splitlines():
+        key, _, value = line.partition(" ")
+        if key == "usage_usec":
+            cpu_usec = int(value)
+            break
+    # Page cache the kernel can drop at once is not VM memory pressure, as `docker stats` reports it
+    memory = int(_read_file(os.path.join(path, "memory.current")))
+    for line in _read_file(os.path.join(path, "memory.stat")).splitlines():
+        key, _, value = line.partition(" ")
+        if key == "inactive_file":
+            memory = max(0, memory - int(value))
+            break
+    read_bytes = write_bytes = 0
+    for line in _read_file(os.path.join(path, "io.stat")).splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition("=")
+            if key == "rbytes":
+                read_bytes += int(value)
+            elif key == "wbytes":
+                write_bytes += int(value)
+    rx, tx = _read_net_dev(pid)
+    return Sample(now, cpu_usec * 1000, memory, read_bytes, write_bytes, rx, tx)
+
+
+def _read_net_dev(pid: int | None) -> tuple[int, int]:
+    """Interface counters from the container's network namespace; zeros if unreadable"""
+    if not pid:
+        return 0, 0
+    try:
+        lines = _read_file(os.path.join(config.TELEMETRY_PROC_ROOT, str(pid), "net", "dev")).splitlines()[2:]
+    except OSError:
+        return 0, 0
+    rx = tx = 0
+    for line in lines:
+        iface, _, counters = line.partition(":")
+        if iface.strip() == "lo":
+            continue
+        fields = counters.split()
+        rx += int(fields[0])
+        tx += int(fields[8])
+    return rx, tx
+
+
+# --- Docker stats reader (remote Docker or no cgroup access) ---
+
+def _parse_docker_stats(stats: dict, now: float) -> Sample:
+    memory_stats = stats.get("memory_stats") or {}
+    memory = memory_stats.get("usage", 0) - (memory_stats.get("stats") or {}).get("inactive_file", 0)
+    read_bytes = write_bytes = 0
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        if entry.get("op", "").lower() == "read":
+            read_bytes += entry.get("value", 0)
+        elif entry.get("op", "").lower() == "write":
+            write_bytes += entry.get("value", 0)
+    networks = (stats.get("networks") or {}).values()
+    return Sample(
+        now,
+        stats["cpu_stats"]["cpu_usage"]["total_usage"],
+        max(0, memory),
+        read_bytes,
+        write_bytes,
+        sum(n.get("rx_bytes", 0) for n in networks),
+        sum(n.get("tx_bytes", 0) for n in networks),
+    )
+
+
+_executor = ThreadPoolExecutor(max_workers=config.TELEMETRY_WORKERS, thread_name_prefix="telemetry")
+
+
+def _sample_container(container) -> Sample | None:
+    now = time.time()
+    path = _cgroup_dir(container.id)
+    if path is not None:
+        try:
+            return _read_cgroup(path, container.attrs.get("State", {}).get("Pid"), now)
+        except (OSError, ValueError) as e:
+            logger.debug("cgroup read failed for %s, using docker stats: %s", container.name, e)
+            _cgroup_dirs.pop(container.id, None)
+    stats = lock.docker_breaker.call(container.stats, stream=False, one_shot=True)
+    return _parse_docker_stats(stats, time.time())
+
+
+def sample_all() -> int:
+    """
+    One batched pass over all running managed containers
+    Returns the number of containers sampled
+    """
+    client = lock.get_docker_client()
+    containers = lock.docker_breaker.call(
+        client.containers.list, filters={"label": f"sablier.group={config.GROUP_LABEL}", "status": "running"}
+    )
+    results = _executor.map(_safe_sample, containers)
+    sampled = 0
+    for container, sample in zip(containers, results):
+        if sample is not None:
+            store.add(container.id, container.name, sample)
+            sampled += 1
+    store.retain({c.id for c in containers})
+    return sampled
+
+
+def _safe_sample(container) -> Sample | None:
+    try:
+        return _sample_container(container)
+    except Exception as e:
+        logger.debug("Failed to sample %s: %s", container.name, e)
+        return None
+
+
+async def telemetry_sampler():
+    """Background task: sample resource counters of all VMs every TELEMETRY_INTERVAL"""
+    while True:
+        try:
+            started = time.monotonic()
+            await asyncio.to_thread(sample_all)
+            await asyncio.sleep(max(0.0, config.TELEMETRY_INTERVAL - (time.monotonic() - started)))
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error("Error during telemetry sampling: %s", e)
+            await asyncio.sleep(config.TELEMETRY_INTERVAL)
+
+
+def _by_vm(field: str):
+    def collect():
+        return {(("vm", vm),): stats[field] for vm, stats in store.latest().items()}
+    return collect
+
+
+def _counter_by_vm(field: str):
+    def collect():
+        result = {}
+        for container_id, name in store.names().items():
+            sample = store.latest_sample(container_id)
+            if sample is not None:
+                result[(("vm", name),)] = getattr(sample, field)
+        return result
+    return collect
+
+
+metrics.Gauge("vm_cpu_cores", "CPU used by each VM over the last sampling interval, in cores", _by_vm("cpu_cores"))
+metrics.Gauge("vm_memory_bytes", "Memory used by each VM, excluding reclaimable page cache", _by_vm("memory_bytes"))
+metrics.Counter("vm_block_read_bytes_total", "Bytes read from block devices by each VM", _counter_by_vm("block_read_bytes"))
+metrics.Counter("vm_block_write_bytes_total", "Bytes written to block devices by each VM", _counter_by_vm("block_write_bytes"))
+metrics.Counter("vm_network_receive_bytes_total", "Bytes received by each VM", _counter_by_vm("net_rx_bytes"))
+metrics.Counter("vm_network_transmit_bytes_total", "Bytes transmitted by each VM", _counter_by_vm("net_tx_bytes"))
@@ -114,6 +114,7 @@ def test_list_all_containers_with_locks(monkeypatch, redis_client):
     monkeypatch.setattr("container_lock.lock.get_redis_client", lambda *args, **kwargs: redis_client)
     # Lock id1 to ip1
     redis_client.setex("lock:ip1", 300, "id1")
+    redis_client.setex("lock_owner:id1", 300, "ip1")
     from container_lock.lock import list_all_containers_with_locks
     containers = list_all_containers_with_locks(redis_client=redis_client)
     active = [c for c in containers if c["status"] == "running" and c["locked_by_ip"]]
@@ -1,15 +1,71 @@
 from fastapi import Request
+from functools import lru_cache
 import logging
 import ipaddress
+from container_lock.config import config
 
 logger = logging.getLogger(__name__)
 
+
+class TrustedProxies:
+    """
+    Matcher for the proxy CIDRs whose forwarding headers we believe.
+    Networks are parsed once and split by IP version, so a lookup is one
+    address parse plus a few integer range checks.
+    """
+
+    def __init__(self, cidrs: list[str]):
+        networks = [ipaddress.ip_network(cidr, strict=False) for cidr in cidrs]
+        self._ranges = {
+            version: [(int(n.network_address), int(n.broadcast_address)) for n in networks if n.version == version]
+            for version in (4, 6)
+        }
+
+    def __contains__(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        value = int(address)
+        return any(low <= value <= high for low, high in self._ranges[address.version])
+
+
+trusted_proxies = TrustedProxies(config.TRUSTED_PROXIES)
+
+
+@lru_cache(maxsize=config.CLIENT_IP_CACHE_SIZE)
+def resolve_client_ip(peer: str | None, forwarded_for: str | None, real_ip: str | None) -> str:
+    """
+    Pick the client IP from the connection peer and forwarding headers.
+    Headers are only believed when the peer is a trusted proxy. The
+    X-Forwarded-For chain is walked from the right, skipping trusted hops,
+    so entries a client prepends itself are never used.
+    Cached, since the same few (peer, header) combinations repeat constantly.
+    """
+    if not peer or peer not in trusted_proxies:
+        return peer if peer and _is_valid_ip(peer) else "unknown"
+
+    if forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",")]
+        for hop in reversed(hops):
+            if hop not in trusted_proxies:
+                return hop if _is_valid_ip(hop) else "unknown"
+        # Every hop is one of our proxies; the leftmost is the furthest out
+        return hops[0]
+
+    if real_ip:
+        real_ip = real_ip.strip()
+        if _is_valid_ip(real_ip):
+            return real_ip
+
+    return peer
+
+
 def get_client_ip(request: Request) -> str:
     """
-    Extract client IP address from request using priority based on Caddy proxy guide:
-    1. X-Forwarded-For (first IP in list) - Real client IP behind proxy chains
-    2. X-Real-IP - Direct client IP from proxy
-    3. request.client.host - Fallback for direct connections
+    Client IP address for a request, resolved once and kept on request.state.
+    X-Forwarded-For and X-Real-IP are only honoured when the direct peer is
+    in config.TRUSTED_PROXIES (Caddy); otherwise the peer address is used.
     
     Args:
         request: FastAPI Request object
@@ -17,37 +73,18 @@ def get_client_ip(request: Request) -> str:
     Returns:
         str: Client IP address or "unknown" if extraction fails
     """
-    
-    # Priority 1: X-Forwarded-For header (handles proxy chains)
+    client_ip = getattr(request.state, "client_ip", None)
+    if client_ip is not None:
+        return client_ip
+
+    peer = request.client.host if request.client else None
     forwarded_for = request.headers.get("X-Forwarded-For")
-    if forwarded_for:
-        # Split by comma and take the first (real client) IP
-        ip_list = [ip.strip() for ip in forwarded_for.split(",")]
-        if ip_list and ip_list[0]:
-            client_ip = ip_list[0]
-            if _is_valid_ip(client_ip):
-                logger.debug(f"[IP_EXTRACT] X-Forwarded-For: {client_ip} (from chain: {forwarded_for})")
-                return client_ip
-    
-    # Priority 2: X-Real-IP header (direct proxy)
     real_ip = request.headers.get("X-Real-IP")
-    if real_ip:
-        real_ip = real_ip.strip()
-        if _is_valid_ip(real_ip):
-            logger.debug(f"[IP_EXTRACT] X-Real-IP: {real_ip}")
-            return real_ip
-    
-    # Priority 3: request.client.host (direct connection fallback)
-    if request.client and request.client.host:
-        direct_ip = request.client.host
-        if _is_valid_ip(direct_ip):
-            logger.debug(f"[IP_EXTRACT] Direct: {direct_ip}")
-            return direct_ip
-    
-    # Log failure for debugging
-    logger.warning(f"[IP_EXTRACT] Failed to extract valid IP. Headers: X-Forwarded-For={forwarded_for}, X-Real-IP={real_ip}, Direct={getattr(request.client, 'host', None) if request.client else None}")
-    
-    return "unknown"
+    client_ip = resolve_client_ip(peer, forwarded_for, real_ip)
+    if client_ip == "unknown":
+        logger.warning("[IP_EXTRACT] Failed to extract valid IP. Headers: X-Forwarded-For=%s, X-Real-IP=%s, Direct=%s", forwarded_for, real_ip, peer)
+    request.state.client_ip = client_ip
+    return client_ip
 
 def _is_valid_ip(ip: str) -> bool:
     """
@@ -79,6 +116,5 @@ def get_real_ip_for_logs(request: Request) -> dict:
         "extracted_ip": get_client_ip(request),
         "x_forwarded_for": request.headers.get("X-Forwarded-For"),
         "x_real_ip": request.headers.get("X-Real-IP"),
-        "direct_ip": getattr(request.client, 'host', None) if request.client else None,
-        "headers": dict(request.headers)
+        "direct_ip": getattr(request.client, 'host', None) if request.client else None
     } 
\ No newline at end of file
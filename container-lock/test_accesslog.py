@@ -0,0 +1,86 @@
+import json
+import os
+
+from container_lock.accesslog import AccessLogAnalyzer, LogTailer, Histogram, main
+
+
+def entry(uri, ts, duration=0.01, status=200, size=100, sablier=None):
+    return {
+        "msg": "handled request",
+        "ts": ts,
+        "request": {"uri": uri, "method": "GET"},
+        "duration": duration,
+        "status": status,
+        "size": size,
+        "resp_headers": {"X-Sablier-Session-Status": [sablier]} if sablier else {},
+    }
+
+
+def test_histogram_percentiles_use_constant_memory():
+    histogram = Histogram()
+    for i in range(10000):
+        histogram.observe(0.05 if i < 9000 else 2.0)
+    assert len(histogram.counts) == len(Histogram().counts)
+    assert 0.05 <= histogram.percentile(50) < 0.0625
+    assert 2.0 <= histogram.percentile(99) < 2.5
+    assert Histogram().percentile(50) is None
+
+
+def test_latency_bytes_and_cold_start_per_vm():
+    analyzer = AccessLogAnalyzer()
+    analyzer.feed(entry("/vm/kali_1/", 100.0, sablier="not-ready"))
+    analyzer.feed(entry("/vm/kali_1/", 105.0, sablier="not-ready"))
+    analyzer.feed(entry("/vm/kali_1/", 130.0, duration=0.5, size=4000))
+    analyzer.feed(entry("/vm/kali_1/websockify", 900.0, duration=770.0, status=101))
+    analyzer.feed(entry("/vm/kali_2/", 100.0, status=502))
+    analyzer.feed(entry("/containers/status", 100.0))
+
+    report = analyzer.report()
+    assert set(report) == {"kali_1", "kali_2"}
+    kali_1 = report["kali_1"]
+    assert kali_1["requests"] == 4
+    assert kali_1["bytes_served"] == 4300
+    assert kali_1["cold_starts"] == 1
+    assert 30.0 <= kali_1["cold_start_p50"] < 37.5
+    # The console WebSocket's session length is not request latency
+    assert kali_1["latency_p99"] < 1.0
+    assert report["kali_2"]["errors"] == 1
+
+
+def test_tracked_vms_are_capped():
+    analyzer = AccessLogAnalyzer(max_vms=1)
+    analyzer.feed(entry("/vm/kali_1/", 1.0))
+    analyzer.feed(entry("/vm/bogus/", 1.0))
+    assert list(analyzer.vms) == ["kali_1"]
+
+
+def test_tailer_reads_incrementally_and_follows_rotation(tmp_path):
+    path = tmp_path / "access.log"
+    path.write_text("one\ntw")
+    tailer = LogTailer(str(path))
+    assert list(tailer.read_lines()) == ["one"]
+
+    with open(path, "a") as f:
+        f.write("o\nthree\n")
+    assert list(tailer.read_lines()) == ["two", "three"]
+    assert list(tailer.read_lines()) == []
+
+    # Caddy renames the file on roll; lines written before the rename are not lost
+    with open(path, "a") as f:
+        f.write("four\n")
+    os.rename(path, tmp_path / "access-1.log")
+    path.write_text("five\n")
+    assert list(tailer.read_lines()) == ["four", "five"]
+
+    path.write_text("")
+    with open(path, "a") as f:
+        f.write("six\n")
+    assert list(tailer.read_lines()) == ["six"]
+    tailer.close()
+
+
+def test_cli_prints_json_report(tmp_path, capsys):
+    path = tmp_path / "access.log"
+    path.write_text("\n".join(json.dumps(entry("/vm/kali_1/", float(i))) for i in range(3)) + "\nnot json\n")
+    assert main([str(path), "--json"]) == 0
+    assert json.loads(capsys.readouterr().out)["kali_1"]["requests"] == 3
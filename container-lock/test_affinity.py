@@ -0,0 +1,124 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+
+from container_lock import affinity
+from container_lock.config import config
+from container_lock.main import app
+
+# Requests arrive through Caddy, whose forwarding headers are trusted
+CADDY = ("172.18.0.2", 50000)
+
+
+def running_status(locked_by_ip="10.0.0.1", health="healthy"):
+    return {
+        "container_id": "id1",
+        "container_name": "kali_1",
+        "container_status": "running",
+        "container_health": health,
+        "is_locked": locked_by_ip is not None,
+        "locked_by_ip": locked_by_ip,
+        "is_clickable": False,
+        "wake_mode": None
+    }
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(config, "AFFINITY_SECRET", "s3cret")
+    monkeypatch.setattr(config, "SABLIER_REFRESH_INTERVAL", 3600)
+    monkeypatch.setattr(affinity, "_last_refresh", {"kali_1": float("inf")})
+    return TestClient(app, client=CADDY)
+
+
+def test_lock_holder_gets_affinity_cookie(client):
+    with patch("container_lock.main.get_container_lock_status", return_value=running_status()):
+        response = client.get("/container/id1/status", headers={"X-Real-IP": "10.0.0.1"})
+    assert response.status_code == 200
+    cookie = response.headers["set-cookie"]
+    token = cookie.split("vm_affinity_kali_1=", 1)[1].split(";", 1)[0]
+    assert affinity.verify_affinity_token(token, "kali_1", "10.0.0.1")
+    assert "Path=/vm/kali_1/" in cookie
+
+
+def test_token_is_bound_to_owner_vm_and_expiry(client):
+    token = affinity.affinity_token("kali_1", "10.0.0.1", int(time.time()) + 60)
+    assert affinity.verify_affinity_token(token, "kali_1", "10.0.0.1")
+    assert not affinity.verify_affinity_token(token, "kali_1", "10.0.0.2")
+    assert not affinity.verify_affinity_token(token, "kali_2", "10.0.0.1")
+    expired = affinity.affinity_token("kali_1", "10.0.0.1", int(time.time()) - 1)
+    assert not affinity.verify_affinity_token(expired, "kali_1", "10.0.0.1")
+    # Extending the expiry breaks the signature
+    forged = f"{int(time.time()) + 3600}.{token.split('.', 1)[1]}"
+    assert not affinity.verify_affinity_token(forged, "kali_1", "10.0.0.1")
+
+
+@pytest.mark.parametrize("vm_owner, cookie_owner, flagged", [
+    ("10.0.0.1", "10.0.0.1", True),
+    # Lock released or taken over since the cookie was issued
+    (None, "10.0.0.1", False),
+    ("10.0.0.2", "10.0.0.1", False),
+    # Cookie copied from another user
+    ("10.0.0.1", "10.0.0.2", False),
+])
+def test_affinity_check_flags_only_the_current_lock_holder(client, vm_owner, cookie_owner, flagged):
+    token = affinity.affinity_token("kali_1", cookie_owner, int(time.time()) + 60)
+    client.cookies.set("vm_affinity_kali_1", token)
+    with patch("container_lock.main.authz.get_vm_owner", AsyncMock(return_value=vm_owner)):
+        response = client.get("/affinity", params={"vm": "kali_1"}, headers={"X-Real-IP": "10.0.0.1"})
+    assert response.status_code == 200
+    assert (response.headers.get(affinity.AFFINITY_HEADER) == "1") is flagged
+
+
+def test_authz_flags_a_valid_cookie(client):
+    token = affinity.affinity_token("kali_1", "10.0.0.1", int(time.time()) + 60)
+    client.cookies.set("vm_affinity_kali_1", token)
+    with patch("container_lock.main.authz.get_vm_owner", AsyncMock(return_value="10.0.0.1")):
+        response = client.get("/authz", params={"vm": "kali_1"}, headers={"X-Real-IP": "10.0.0.1"})
+    assert response.status_code == 200
+    assert response.headers[affinity.AFFINITY_HEADER] == "1"
+
+
+@pytest.mark.parametrize("status", [
+    running_status(locked_by_ip="10.0.0.2"),
+    running_status(health="starting"),
+    {**running_status(), "container_status": "exited"},
+])
+def test_no_cookie_for_others_or_unhealthy_vm(client, status):
+    with patch("container_lock.main.get_container_lock_status", return_value=status):
+        response = client.get("/container/id1/status", headers={"X-Real-IP": "10.0.0.1"})
+    assert "set-cookie" not in response.headers
+
+
+def test_no_cookie_when_disabled(monkeypatch):
+    monkeypatch.setattr(config, "AFFINITY_SECRET", None)
+    with patch("container_lock.main.get_container_lock_status", return_value=running_status()):
+        response = TestClient(app, client=CADDY).get("/container/id1/status", headers={"X-Real-IP": "10.0.0.1"})
+    assert "set-cookie" not in response.headers
+
+
+def test_refresh_sablier_session_is_throttled(monkeypatch):
+    calls = []
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            return False
+
+        async def get(self, url, params):
+            calls.append((url, params))
+            return type("Response", (), {"status_code": 200})()
+
+    monkeypatch.setattr(affinity.httpx, "AsyncClient", FakeClient)
+    monkeypatch.setattr(affinity, "_last_refresh", {})
+    assert asyncio.run(affinity.refresh_sablier_session("kali_1")) is True
+    assert asyncio.run(affinity.refresh_sablier_session("kali_1")) is False
+    assert len(calls) == 1
+    assert calls[0][1]["names"] == "kali_1"
@@ -0,0 +1,77 @@
+import pytest
+from unittest.mock import Mock, patch
+from fastapi.testclient import TestClient
+
+from container_lock import authz
+from container_lock.config import config
+from container_lock.lock import acquire_lock, release_lock
+from container_lock.main import app
+from container_lock.mock_redis import MockRedis
+
+# Requests arrive through Caddy, whose forwarding headers are trusted
+CADDY = ("172.18.0.2", 50000)
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = MockRedis()
+    monkeypatch.setattr("container_lock.lock.get_redis_client", lambda *args, **kwargs: client)
+    return client
+
+
+@pytest.fixture
+def docker_client(monkeypatch):
+    container = Mock()
+    container.id = "id1"
+    container.labels = {"sablier.group": config.GROUP_LABEL}
+    client = Mock()
+    client.containers.get.return_value = container
+    monkeypatch.setattr("container_lock.lock.get_docker_client", lambda: client)
+    monkeypatch.setattr("container_lock.lock.is_managed_container", lambda container_id: True)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    cache = authz.OwnerCache(ttl=60)
+    monkeypatch.setattr(authz, "owner_cache", cache)
+    monkeypatch.setattr("container_lock.lock.lock_change_listeners", [cache.invalidate])
+    return cache
+
+
+def authz_request(ip, vm="kali_1"):
+    return TestClient(app, client=CADDY).get("/authz", params={"vm": vm}, headers={"X-Forwarded-For": ip})
+
+
+def test_owner_allowed_others_denied(redis_client, docker_client):
+    acquire_lock("10.0.0.1", "id1", redis_client=redis_client)
+    assert authz_request("10.0.0.1").status_code == 200
+    assert authz_request("10.0.0.2").status_code == 403
+
+
+def test_unlocked_vm_denied(redis_client, docker_client):
+    assert authz_request("10.0.0.1").status_code == 403
+
+
+def test_unknown_vm_denied(redis_client, docker_client):
+    import docker
+    docker_client.containers.get.side_effect = docker.errors.NotFound("missing")
+    assert authz_request("10.0.0.1", vm="nope").status_code == 403
+
+
+def test_hits_are_served_without_redis(redis_client, docker_client, fresh_cache):
+    acquire_lock("10.0.0.1", "id1", redis_client=redis_client)
+    assert authz_request("10.0.0.1").status_code == 200
+    with patch("container_lock.lock.get_container_owner", side_effect=AssertionError("Redis hit")):
+        for _ in range(5):
+            assert authz_request("10.0.0.1").status_code == 200
+    assert fresh_cache.hits == 5
+
+
+def test_lock_changes_invalidate_cache(redis_client, docker_client):
+    acquire_lock("10.0.0.1", "id1", redis_client=redis_client)
+    assert authz_request("10.0.0.1").status_code == 200
+    release_lock("10.0.0.1", redis_client=redis_client)
+    assert authz_request("10.0.0.1").status_code == 403
+    acquire_lock("10.0.0.2", "id1", redis_client=redis_client)
+    assert authz_request("10.0.0.2").status_code == 200
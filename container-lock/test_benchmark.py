@@ -0,0 +1,85 @@
+import asyncio
+import struct
+from unittest.mock import Mock, patch
+import httpx
+from websockets.asyncio.server import serve
+
+from container_lock import benchmark
+from container_lock.mock_redis import MockRedis
+
+
+async def fake_vnc(ws):
+    """RFB 3.8 server without a password that answers the first update request"""
+    await ws.send(b"RFB 003.008\n")
+    await ws.recv()
+    await ws.send(b"\x01\x01")
+    await ws.recv()
+    # Security result and ServerInit split across messages like a real proxy may do
+    await ws.send(struct.pack("!I", 0) + struct.pack("!HH", 64, 48))
+    await ws.recv()
+    await ws.send(bytes(16) + struct.pack("!I", 4) + b"test")
+    request = await ws.recv()
+    assert request[0] == 3 and struct.unpack("!HH", request[6:10]) == (64, 48)
+    await ws.send(b"\x02" + struct.pack("!BxH", 0, 1) + bytes(12))
+
+
+def lab_transport(waiting_pages):
+    """Caddy and container-lock: Sablier's waiting page first, then the VM"""
+    def handler(request):
+        if request.url.path == "/acquire":
+            return httpx.Response(200, json={"container_id": "id1", "status": "locked", "wake_mode": "boot"})
+        if waiting_pages:
+            waiting_pages.pop()
+            return httpx.Response(200, headers={"X-Sablier-Session-Status": "not-ready"}, text="Starting")
+        return httpx.Response(200, text="noVNC")
+    return httpx.MockTransport(handler)
+
+
+def test_measure_times_every_phase_until_the_first_frame(monkeypatch):
+    monkeypatch.setattr(benchmark, "POLL_INTERVAL", 0.01)
+
+    async def run():
+        async with serve(fake_vnc, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            waiting = [True, True]
+            async with httpx.AsyncClient(base_url="http://lab", transport=lab_transport(waiting)) as client:
+                result = await benchmark.measure(client, {"id": "id1", "name": "kali_1"},
+                                                 f"ws://127.0.0.1:{port}/websockify", timeout=5)
+            return result, waiting
+
+    result, waiting = asyncio.run(run())
+    assert waiting == []
+    assert result["wake_mode"] == "boot"
+    assert all(result[phase] >= 0 for phase in benchmark.PHASES)
+    assert result["healthy"] >= 0.02
+    assert abs(result["total"] - sum(result[phase] for phase in benchmark.PHASES)) < 0.01
+
+
+def test_cold_scenario_stops_without_saving_guest_state():
+    redis_client = MockRedis()
+    redis_client.set("snapshot:id1", 1)
+    container = Mock(status="running")
+    client = Mock()
+    client.containers.get.return_value = container
+    with patch("container_lock.lock.get_docker_client", return_value=client), \
+         patch("container_lock.lock.stop_container") as stop_container:
+        asyncio.run(benchmark.prepare({"id": "id1", "name": "kali_1"}, "cold", redis_client))
+    container.stop.assert_called_once()
+    stop_container.assert_not_called()
+    assert redis_client.get("snapshot:id1") is None
+
+
+def test_summary_groups_by_image_boot_mode_and_scenario():
+    def result(scenario, total, image="kali", **extra):
+        return {"vm": "kali_1", "image": image, "boot_mode": "legacy", "scenario": scenario,
+                "acquire": 0.1, "route": 0.1, "healthy": total - 0.3, "first_frame": 0.1, "total": total, **extra}
+
+    results = [result("resume", 4.0), result("cold", 30.0), result("cold", 20.0), result("cold", 25.0),
+               {"vm": "kali_1", "image": "kali", "boot_mode": "legacy", "scenario": "cold", "error": "timed out"},
+               result("cold", 60.0, image="windows")]
+    summary = benchmark.summarize(results)
+    assert [(e["image"], e["scenario"]) for e in summary] == [("kali", "cold"), ("kali", "resume"), ("windows", "cold")]
+    cold = summary[0]
+    assert (cold["runs"], cold["failed"]) == (4, 1)
+    assert cold["total"] == {"p50": 25.0, "p90": 30.0, "p99": 30.0, "max": 30.0}
+    assert summary[1]["total"]["p50"] == 4.0
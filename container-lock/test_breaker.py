@@ -0,0 +1,91 @@
+from unittest.mock import Mock, patch
+import docker
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+from container_lock import lock
+from container_lock.breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from container_lock.lock import get_container_lock_status, docker_breaker
+from container_lock.main import app
+
+
+@pytest.fixture(autouse=True)
+def reset_breaker():
+    docker_breaker.record_success()
+    lock._container_cache.clear()
+    yield
+    docker_breaker.record_success()
+    lock._container_cache.clear()
+
+
+def timeout():
+    raise requests.exceptions.ReadTimeout("read timed out")
+
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            breaker.call(timeout)
+    assert breaker.state == OPEN
+    never_called = Mock()
+    with pytest.raises(CircuitOpenError):
+        breaker.call(never_called)
+    never_called.assert_not_called()
+
+
+def test_half_open_trial_closes_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        breaker.call(timeout)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    # Only one trial call at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_not_found_does_not_count_as_failure():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    with pytest.raises(docker.errors.NotFound):
+        breaker.call(Mock(side_effect=docker.errors.NotFound("gone")))
+    assert breaker.state == CLOSED
+
+
+def test_status_served_stale_from_cache_while_open():
+    redis_client = Mock()
+    redis_client.scan_iter.return_value = []
+    container = Mock()
+    container.name = "kali_1"
+    container.status = "running"
+    container.labels = {"sablier.group": "qemu-lab"}
+    with patch("container_lock.lock.get_docker_client") as mock_get_client:
+        mock_get_client.return_value.containers.get.return_value = container
+        fresh = get_container_lock_status("container123", redis_client)
+        assert fresh["stale"] is False
+
+        mock_get_client.return_value.containers.get.side_effect = requests.exceptions.ConnectTimeout()
+        for _ in range(docker_breaker.failure_threshold):
+            status = get_container_lock_status("container123", redis_client)
+            assert status["stale"] is True
+        assert docker_breaker.state == OPEN
+
+        mock_get_client.return_value.containers.get.reset_mock()
+        status = get_container_lock_status("container123", redis_client)
+        mock_get_client.return_value.containers.get.assert_not_called()
+    assert status["stale"] is True
+    assert status["container_name"] == "kali_1"
+    assert status["container_status"] == "running"
+
+
+def test_breaker_state_in_docker_health_and_metrics():
+    docker_breaker.record_failure()
+    with patch("container_lock.main.test_docker_connection", return_value={"status": "connected"}):
+        client = TestClient(app)
+        health = client.get("/docker/health").json()
+        body = client.get("/metrics").text
+    assert health["circuit_breaker"]["state"] == CLOSED
+    assert health["circuit_breaker"]["consecutive_failures"] == 1
+    assert "docker_circuit_state 0" in body
+    assert "docker_circuit_consecutive_failures 1" in body
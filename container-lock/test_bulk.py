@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
+from fastapi import HTTPException
+
+from container_lock import bulk
+from container_lock.admin import require_admin
+from container_lock.config import config
+from container_lock.lock import acquire_lock, get_locked_container, get_container_owner, release_locks
+from conftest import make_vm
+
+
+@pytest.fixture
+def docker_client(docker_client):
+    docker_client.containers.list.return_value = [
+        make_vm(i, "kali" if i < 4 else "ubuntu", status="running") for i in range(1, 6)
+    ]
+    return docker_client
+
+
+def collect(operation, vms, redis_client, **kwargs):
+    async def run():
+        return [result async for result in bulk.run(operation, vms, redis_client, **kwargs)]
+    return asyncio.run(run())
+
+
+def test_selection_by_prefix_label_or_all(docker_client):
+    assert [vm["name"] for vm in bulk.select_vms(prefix="kali_")] == ["kali_1", "kali_2", "kali_3"]
+    assert len(bulk.select_vms(all_vms=True)) == 5
+    bulk.select_vms(label="lab.pool=web")
+    docker_client.containers.list.assert_called_with(
+        all=True, filters={"label": [f"sablier.group={config.GROUP_LABEL}", "lab.pool=web"]}
+    )
+    with pytest.raises(HTTPException):
+        bulk.select_vms()
+
+
+def test_locks_are_released_in_one_pipelined_batch(redis_client):
+    acquire_lock("10.0.0.1", "id1", redis_client)
+    acquire_lock("10.0.0.2", "id2", redis_client)
+    with patch.object(redis_client, "delete", wraps=redis_client.delete) as delete:
+        assert release_locks(["id1", "id2", "id3"], redis_client) == {"id1": "10.0.0.1", "id2": "10.0.0.2"}
+    assert delete.call_count == 2
+    assert get_locked_container("10.0.0.1", redis_client) is None
+    assert get_container_owner("id2", redis_client) is None
+    assert redis_client.smembers("active_containers") == set()
+
+
+def test_stop_runs_with_bounded_concurrency_and_streams_progress(redis_client):
+    acquire_lock("10.0.0.1", "id1", redis_client)
+    active = 0
+    peak = 0
+    guard = threading.Lock()
+
+    def stop(container_id, client=None, timeout=10):
+        nonlocal active, peak
+        with guard:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with guard:
+            active -= 1
+        return container_id != "id3"
+
+    vms = bulk.select_vms(prefix="kali_")
+    with patch("container_lock.lock.stop_container", side_effect=stop):
+        results = collect("stop", vms, redis_client, parallelism=2)
+
+    assert peak == 2
+    per_vm, summary = results[:-1], results[-1]
+    assert sorted(r["vm"] for r in per_vm) == ["kali_1", "kali_2", "kali_3"]
+    assert next(r for r in per_vm if r["vm"] == "kali_3")["error"] == "stop failed"
+    assert (summary["total"], summary["ok"], summary["failed"], summary["released"]) == (3, 2, 1, 1)
+    assert summary["seconds"] > 0
+    assert get_locked_container("10.0.0.1", redis_client) is None
+
+
+def test_reset_discards_saved_state_and_reboots(docker_client, redis_client):
+    redis_client.set("snapshot:id1", 1)
+    container = docker_client.containers.get.return_value
+    container.status = "running"
+    results = collect("reset", [{"id": "id1", "name": "kali_1"}], redis_client)
+    assert results[0]["ok"]
+    assert redis_client.get("snapshot:id1") is None
+    container.restart.assert_called_once()
+
+
+def test_admin_token_is_required(monkeypatch):
+    request = SimpleNamespace(headers={"Authorization": "Bearer secret"})
+    monkeypatch.setattr(config, "ADMIN_TOKEN", None)
+    with pytest.raises(HTTPException) as exc_info:
+        require_admin(request)
+    assert exc_info.value.status_code == 403
+
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    require_admin(request)
+    with pytest.raises(HTTPException) as exc_info:
+        require_admin(SimpleNamespace(headers={"Authorization": "Bearer wrong"}))
+    assert exc_info.value.status_code == 401
@@ -0,0 +1,76 @@
+import time
+from unittest.mock import patch
+import pytest
+
+from container_lock import demand
+from container_lock.config import config
+from container_lock.lock import acquire_lock, release_lock, STOP_QUEUE
+from conftest import make_vm
+
+INTERVAL = 900
+WEEK_SLOTS = 7 * 24 * 3600 // INTERVAL
+# Monday 09:00 UTC, on a bucket boundary
+MONDAY_9 = 1_700_470_800.0
+
+
+@pytest.fixture(autouse=True)
+def forecasting(monkeypatch):
+    monkeypatch.setattr(config, "DEMAND_FORECAST_ENABLED", True)
+    monkeypatch.setattr(config, "DEMAND_INTERVAL", INTERVAL)
+    monkeypatch.setattr(config, "DEMAND_ALPHA", 0.5)
+    monkeypatch.setattr(config, "DEMAND_HEADROOM", 1.0)
+    monkeypatch.setattr(config, "DEMAND_MAX_WARM", 3)
+
+
+def test_session_starts_and_ends_are_counted_per_bucket(redis_client):
+    acquire_lock("10.0.0.1", "vm1", redis_client)
+    acquire_lock("10.0.0.2", "vm2", redis_client)
+    release_lock("10.0.0.1", redis_client)
+    bucket = demand.bucket_of(time.time())
+    assert demand._counts(redis_client, demand.STARTS_KEY) == {bucket: 2}
+    assert demand._counts(redis_client, demand.ENDS_KEY) == {bucket: 1}
+
+
+def test_forecast_follows_hour_of_week_moving_average(redis_client):
+    week = WEEK_SLOTS * INTERVAL
+    demand.run_forecast(redis_client, now=MONDAY_9 - INTERVAL)
+    for weeks, starts, expected in ((0, 4, 4), (1, 8, 6)):
+        slot_start = MONDAY_9 + weeks * week
+        for _ in range(starts):
+            demand.record_session("start", "vm", redis_client, now=slot_start + 1)
+        demand.run_forecast(redis_client, now=slot_start + INTERVAL)
+        # Just before the same interval a week later
+        assert demand.run_forecast(redis_client, now=slot_start + week - INTERVAL)["forecast"] == expected
+
+    status = demand.status(redis_client)
+    assert status["forecast"] == 6
+    # Forecasts of 0 and 4 missed 4 and 8 starts; the quiet intervals between were right
+    assert status["forecast_mae"] == 2.0
+    # One number per 15 minutes of the week
+    assert status["model_bytes"] < 16 * 1024
+
+
+def test_old_buckets_are_pruned(redis_client, monkeypatch):
+    monkeypatch.setattr(config, "DEMAND_RETENTION", 2 * INTERVAL)
+    demand.record_session("start", "vm", redis_client, now=MONDAY_9)
+    demand.run_forecast(redis_client, now=MONDAY_9 + 5 * INTERVAL)
+    assert demand._counts(redis_client, demand.STARTS_KEY) == {}
+
+
+def test_warm_pool_is_sized_from_forecast_and_scores_hits(redis_client, docker_client):
+    docker_client.containers.list.return_value = [make_vm(1, status="running"), make_vm(2), make_vm(3), make_vm(4)]
+    with patch("container_lock.lock.start_container", return_value=True) as start:
+        # One free VM is already running, so two more reach the target of three
+        assert demand.size_warm_pool(3, redis_client) == {"started": 2, "stopped": 0}
+        assert [c.args[0] for c in start.call_args_list] == ["id2", "id3"]
+
+        acquire_lock("10.0.0.1", "id2", redis_client)
+        acquire_lock("10.0.0.2", "id4", redis_client)
+        status = demand.status(redis_client)
+        assert (status["hits"], status["misses"], status["hit_rate"]) == (1, 1, 0.5)
+
+        docker_client.containers.list.return_value = [make_vm(i, status="running") for i in range(1, 5)]
+        # Demand dropped: only VMs the pool started are stopped again
+        assert demand.size_warm_pool(0, redis_client) == {"started": 0, "stopped": 1}
+    assert redis_client.blpop(STOP_QUEUE, 1) == (STOP_QUEUE.encode(), b"id3")
+    assert demand.status(redis_client)["warm_pool"] == []
@@ -0,0 +1,89 @@
+import pytest
+
+from container_lock import fairness
+from container_lock.config import config
+from container_lock.telemetry import Sample, TelemetryStore
+from conftest import make_vm
+
+MB = 1024 * 1024
+
+
+def record(store, vm, ts, io_bytes=0, net_bytes=0):
+    store.add(vm.id, vm.name, Sample(ts, 0, 0, io_bytes, 0, net_bytes, 0))
+
+
+@pytest.fixture
+def setup(monkeypatch, docker_client, redis_client):
+    monkeypatch.setattr(config, "FAIRNESS_ENABLED", True)
+    monkeypatch.setattr(config, "FAIRNESS_IO_THRESHOLD", 50 * MB)
+    monkeypatch.setattr(config, "FAIRNESS_NET_THRESHOLD", 10 * MB)
+    monkeypatch.setattr(config, "FAIRNESS_WINDOW", 60)
+    monkeypatch.setattr(config, "FAIRNESS_COOLDOWN", 120)
+    vms = [
+        make_vm(index, status="running", labels=labels, attrs={"State": {"StartedAt": "t0"}, "HostConfig": {"BlkioWeight": 300}})
+        for index, labels in [(1, {}), (2, {fairness.NET_RATE_LABEL: "100mbit"})]
+    ]
+    docker_client.containers.list.return_value = vms
+    return vms, redis_client, TelemetryStore(100)
+
+
+def test_heavy_io_consumer_is_throttled_then_restored(setup):
+    vms, redis_client, store = setup
+    record(store, vms[0], 0)
+    record(store, vms[0], 60, io_bytes=6000 * MB)
+    record(store, vms[1], 0)
+    record(store, vms[1], 60, io_bytes=60 * MB)
+
+    result = fairness.run_fairness(redis_client, now=60, store=store)
+    assert result["throttled"] == ["kali_1:io"]
+    vms[0].update.assert_called_once_with(blkio_weight=config.FAIRNESS_IO_WEIGHT)
+    vms[1].update.assert_not_called()
+    assert [e["vm"] for e in fairness.status(redis_client)] == ["kali_1"]
+
+    # Quiet again: restored only after the cooldown
+    record(store, vms[0], 120, io_bytes=6000 * MB)
+    assert fairness.run_fairness(redis_client, now=120, store=store)["restored"] == []
+    record(store, vms[0], 240, io_bytes=6000 * MB)
+    assert fairness.run_fairness(redis_client, now=240, store=store)["restored"] == ["kali_1:io"]
+    vms[0].update.assert_called_with(blkio_weight=300)
+    assert fairness.status(redis_client) == []
+
+
+def test_failing_vm_does_not_stop_the_pass(setup):
+    vms, redis_client, store = setup
+    vms[0].update.side_effect = RuntimeError("cgroup busy")
+    for vm in vms:
+        record(store, vm, 0)
+        record(store, vm, 60, io_bytes=6000 * MB)
+
+    result = fairness.run_fairness(redis_client, now=60, store=store)
+    assert result["throttled"] == ["kali_2:io"]
+    assert [e["vm"] for e in fairness.status(redis_client)] == ["kali_2"]
+
+
+def test_bandwidth_caps_follow_labels_restarts_and_throttling(setup):
+    vms, redis_client, store = setup
+    fairness.run_fairness(redis_client, now=0, store=store)
+    vms[0].exec_run.assert_not_called()
+    assert "rate 100mbit" in vms[1].exec_run.call_args.args[0][2]
+
+    # Not re-applied while the VM keeps running, re-applied after a restart
+    fairness.run_fairness(redis_client, now=30, store=store)
+    assert vms[1].exec_run.call_count == 1
+    vms[1].attrs["State"]["StartedAt"] = "t1"
+    fairness.run_fairness(redis_client, now=60, store=store)
+    assert vms[1].exec_run.call_count == 2
+
+    # A heavy downloader is capped to the tighter of its label and FAIRNESS_NET_RATE
+    record(store, vms[1], 0)
+    record(store, vms[1], 60, net_bytes=1200 * MB)
+    assert fairness.run_fairness(redis_client, now=60, store=store)["throttled"] == ["kali_2:net"]
+    assert f"rate {config.FAIRNESS_NET_RATE}" in vms[1].exec_run.call_args.args[0][2]
+
+
+def test_tc_script_shapes_both_directions():
+    script = fairness.tc_script("eth0", "8mbit")
+    assert "root tbf rate 8mbit burst 32kb" in script
+    assert "police rate 8mbit" in script
+    assert fairness.tc_script("eth0", None).endswith("true")
+    assert fairness.rate_bytes("8mbit") == 1e6
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from unittest.mock import Mock, patch
+import pytest
+from fastapi import HTTPException
+
+from container_lock import groups
+from container_lock.config import config
+from container_lock.lock import (
+    acquire_lock, release_lock, release_locks, refresh_lock,
+    get_container_owner, get_locked_container, get_locked_members, STOP_QUEUE,
+    get_container_lock_status, list_all_containers_with_locks
+)
+from container_lock.mock_redis import MockRedis
+from conftest import make_vm
+
+
+@pytest.fixture
+def redis_client():
+    with patch("container_lock.lock.is_managed_container", return_value=True):
+        yield MockRedis()
+
+
+def test_group_is_locked_all_or_nothing(redis_client):
+    acquire_lock("10.0.0.2", "id3", redis_client)
+    with pytest.raises(HTTPException) as exc_info:
+        acquire_lock("10.0.0.1", "id1", redis_client, members=["id1", "id2", "id3"])
+    assert exc_info.value.status_code == 409
+    # The members claimed before the conflict were given back
+    assert get_container_owner("id1", redis_client) is None
+    assert get_container_owner("id2", redis_client) is None
+
+    assert acquire_lock("10.0.0.1", "id1", redis_client, members=["id1", "id2"])
+    assert get_locked_container("10.0.0.1", redis_client) == "id1"
+    assert get_locked_members("10.0.0.1", redis_client) == ["id1", "id2"]
+    assert get_container_owner("id2", redis_client) == "10.0.0.1"
+    assert refresh_lock("10.0.0.1", redis_client) == "id1"
+
+
+def test_releasing_a_group_frees_and_stops_every_member(redis_client):
+    acquire_lock("10.0.0.1", "id2", redis_client, members=["id1", "id2"])
+    assert release_lock("10.0.0.1", redis_client, stop_container_flag=True)
+    assert get_container_owner("id1", redis_client) is None
+    assert get_container_owner("id2", redis_client) is None
+    assert get_locked_members("10.0.0.1", redis_client) == []
+    assert {redis_client.blpop(STOP_QUEUE, 1)[1] for _ in range(2)} == {b"id1", b"id2"}
+
+
+def test_bulk_release_of_one_member_releases_its_group(redis_client):
+    acquire_lock("10.0.0.1", "id1", redis_client, members=["id1", "id2"])
+    acquire_lock("10.0.0.2", "id3", redis_client)
+    assert release_locks(["id2"], redis_client) == {"id1": "10.0.0.1", "id2": "10.0.0.1"}
+    assert get_locked_container("10.0.0.1", redis_client) is None
+    assert get_container_owner("id3", redis_client) == "10.0.0.2"
+
+
+def test_every_group_member_shows_as_locked(redis_client):
+    acquire_lock("10.0.0.1", "id1", redis_client, members=["id1", "id2"])
+    info = {"status": "running", "name": "kali_2", "health": None}
+    with patch("container_lock.lock.inspect_container", return_value=(info, False)):
+        status = get_container_lock_status("id2", redis_client)
+    assert status["is_locked"] and status["locked_by_ip"] == "10.0.0.1"
+
+    labels = {"sablier.group": config.GROUP_LABEL}
+    client = Mock()
+    client.containers.list.return_value = [make_vm(i, labels=labels) for i in (1, 2, 3)]
+    with patch("container_lock.lock.docker.from_env", return_value=client):
+        containers = list_all_containers_with_locks(redis_client)
+    assert [c["locked_by_ip"] for c in containers] == ["10.0.0.1", "10.0.0.1", None]
+
+
+def test_group_members_are_found_by_label():
+    vms = []
+    for index in (2, 1):
+        vm = Mock()
+        vm.id, vm.name, vm.labels = f"id{index}", f"kali_{index}", {groups.GROUP_NAME_LABEL: "pivot"}
+        vms.append(vm)
+    client = Mock()
+    client.containers.get.return_value = vms[0]
+    client.containers.list.return_value = vms
+    with patch("container_lock.lock.get_docker_client", return_value=client):
+        assert [vm["name"] for vm in groups.group_members("id2")] == ["kali_1", "kali_2"]
+        client.containers.list.assert_called_with(
+            all=True, filters={"label": [f"sablier.group={config.GROUP_LABEL}", f"{groups.GROUP_NAME_LABEL}=pivot"]}
+        )
+        client.containers.get.return_value = Mock(labels={})
+        assert groups.group_members("id3") == []
+
+
+def test_group_members_boot_in_parallel():
+    def start(container_id, redis_client=None):
+        time.sleep(0.1)
+        return container_id != "id3"
+
+    members = [{"id": f"id{i}", "name": f"kali_{i}"} for i in range(1, 4)]
+    with patch("container_lock.lock.start_container", side_effect=start):
+        started_at = time.monotonic()
+        result = asyncio.run(groups.start_all(members))
+        elapsed = time.monotonic() - started_at
+    assert result == {"kali_1": True, "kali_2": True, "kali_3": False}
+    # Ready after the slowest member, not the sum of all three
+    assert elapsed < 0.25
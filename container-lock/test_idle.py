@@ -0,0 +1,67 @@
+from unittest.mock import Mock, patch
+import pytest
+
+from container_lock import idle
+from container_lock.config import config
+from container_lock.lock import acquire_lock, get_locked_container, STOP_QUEUE
+from container_lock.mock_redis import MockRedis
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    monkeypatch.setattr(config, "IDLE_TIMEOUT", 600)
+    monkeypatch.setattr(config, "IDLE_CPU_THRESHOLD", 0)
+    idle._cpu_samples.clear()
+    with patch("container_lock.lock.is_managed_container", return_value=True):
+        yield MockRedis()
+
+
+def test_heartbeat_records_activity_for_owners_vm(redis_client):
+    acquire_lock("10.0.0.1", "vm1", redis_client)
+    assert idle.heartbeat("10.0.0.1", redis_client) == "vm1"
+    assert redis_client.zscore(idle.ACTIVITY_KEY, "vm1") is not None
+    assert idle.heartbeat("10.0.0.2", redis_client) is None
+
+
+def test_idle_sessions_are_released_and_stopped(redis_client):
+    acquire_lock("10.0.0.1", "vm1", redis_client)
+    acquire_lock("10.0.0.2", "vm2", redis_client)
+    idle.record_activity("vm1", redis_client, now=1000)
+    idle.record_activity("vm2", redis_client, now=1500)
+
+    assert idle.reap_idle_sessions(redis_client, now=1700) == 1
+    assert get_locked_container("10.0.0.1", redis_client) is None
+    assert get_locked_container("10.0.0.2", redis_client) == "vm2"
+    assert redis_client.blpop(STOP_QUEUE, 1) == (STOP_QUEUE.encode(), b"vm1")
+    assert redis_client.zscore(idle.ACTIVITY_KEY, "vm1") is None
+
+
+def test_untracked_lock_starts_its_idle_clock(redis_client):
+    acquire_lock("10.0.0.1", "vm1", redis_client)
+    assert idle.reap_idle_sessions(redis_client, now=1000) == 0
+    assert redis_client.zscore(idle.ACTIVITY_KEY, "vm1") == 1000
+
+
+def test_busy_guest_cpu_counts_as_activity(redis_client, monkeypatch):
+    monkeypatch.setattr(config, "IDLE_CPU_THRESHOLD", 0.2)
+    acquire_lock("10.0.0.1", "vm1", redis_client)
+    idle.record_activity("vm1", redis_client, now=1000)
+    with patch("container_lock.idle._cpu_busy", return_value=True):
+        assert idle.reap_idle_sessions(redis_client, now=5000) == 0
+    assert get_locked_container("10.0.0.1", redis_client) == "vm1"
+
+
+def test_cpu_busy_compares_against_previous_sample(monkeypatch):
+    idle._cpu_samples.clear()
+    monkeypatch.setattr(config, "IDLE_CPU_THRESHOLD", 0.2)
+    container = Mock()
+    client = Mock()
+    client.containers.get.return_value = container
+    usage = iter([0, int(0.1e9), int(1.1e9)])
+    container.stats.side_effect = lambda **kwargs: {"cpu_stats": {"cpu_usage": {"total_usage": next(usage)}}}
+    clock = iter([0.0, 1.0, 2.0])
+    with patch("container_lock.lock.get_docker_client", return_value=client), \
+         patch("container_lock.idle.time.monotonic", side_effect=lambda: next(clock)):
+        assert idle._cpu_busy("vm1") is False   # first sample
+        assert idle._cpu_busy("vm1") is False   # 0.1 cores
+        assert idle._cpu_busy("vm1") is True    # 1 core
@@ -0,0 +1,234 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from container_lock.leader import LeaderElector, LEADER_KEY, FENCE_KEY, RENEW_SCRIPT
+from container_lock.lock import release_lock, STOP_QUEUE
+from container_lock.mock_redis import MockRedis
+
+
+class FakeAsyncRedis:
+    """Shared lease store; expiry is driven by the test via expire_lease()"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    async def eval(self, script, numkeys, key, identity, *args):
+        if self.data.get(key) != identity:
+            return 0
+        if script != RENEW_SCRIPT:
+            del self.data[key]
+        return 1
+
+    def expire_lease(self):
+        self.data.pop(LEADER_KEY, None)
+
+
+def make_elector(redis_client, started):
+    elector = LeaderElector(replicas=3, lease_ttl=0.03)
+    elector.redis_client = redis_client
+
+    async def job():
+        started.append(elector.identity)
+        await asyncio.Event().wait()
+
+    elector.register("job", job)
+    return elector
+
+
+def test_single_replica_always_leads():
+    async def scenario():
+        elector = LeaderElector(replicas=1)
+        assert elector.redis_client is None
+        task = asyncio.create_task(elector.run())
+        await asyncio.sleep(0)
+        assert elector.is_leader and await elector.is_current()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert not elector.is_leader
+
+    asyncio.run(scenario())
+
+
+def test_only_one_replica_runs_jobs():
+    async def scenario():
+        redis_client = FakeAsyncRedis()
+        started = []
+        electors = [make_elector(redis_client, started) for _ in range(3)]
+        tasks = [asyncio.create_task(e.run()) for e in electors]
+        await asyncio.sleep(0.1)
+        leaders = [e for e in electors if e.is_leader]
+        assert len(leaders) == 1
+        assert started == [leaders[0].identity]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # The leader resigns on shutdown
+        assert LEADER_KEY not in redis_client.data
+
+    asyncio.run(scenario())
+
+
+def test_stale_leader_is_fenced_after_failover():
+    async def scenario():
+        redis_client = FakeAsyncRedis()
+        started = []
+        old, new = make_elector(redis_client, started), make_elector(redis_client, started)
+        old_task = asyncio.create_task(old.run())
+        await asyncio.sleep(0.01)
+        assert old.is_leader and await old.is_current()
+
+        # The old leader stalls, its lease expires and another replica takes over
+        old_task.cancel()
+        await asyncio.gather(old_task, return_exceptions=True)
+        old.is_leader, old.fencing_token = True, 1
+        redis_client.expire_lease()
+        new_task = asyncio.create_task(new.run())
+        await asyncio.sleep(0.01)
+
+        assert new.is_leader and new.fencing_token == 2
+        assert redis_client.data[FENCE_KEY] == 2
+        assert await new.is_current()
+        assert not await old.is_current()
+        new_task.cancel()
+        await asyncio.gather(new_task, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_release_with_stop_queues_container():
+    redis_client = MockRedis()
+    redis_client.set("lock:10.0.0.1", b"container123")
+    with patch("container_lock.lock.is_managed_container", return_value=True), \
+         patch("container_lock.lock.stop_container") as mock_stop:
+        assert release_lock("10.0.0.1", redis_client=redis_client, stop_container_flag=True)
+    mock_stop.assert_not_called()
+    assert redis_client.blpop(STOP_QUEUE, 1) == (STOP_QUEUE.encode(), b"container123")
+
+
+def test_stop_worker_finishes_stops_left_by_a_cancelled_worker():
+    from container_lock import main
+    from container_lock.lock import STOP_PROCESSING
+
+    redis_client = MockRedis()
+    # Taken off the queue by a worker that was cancelled before stopping it
+    redis_client.rpush(STOP_PROCESSING, "container1")
+    redis_client.rpush(STOP_QUEUE, "container2")
+    stopped = []
+
+    def stop_container(container_id, redis_client=None):
+        stopped.append(container_id)
+        return True
+
+    async def scenario():
+        task = asyncio.create_task(main.stop_worker())
+        while len(stopped) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    with patch.object(main, "get_redis_client", return_value=redis_client), \
+         patch.object(main, "stop_container", side_effect=stop_container), \
+         patch.object(main.elector, "is_current", AsyncMock(return_value=True)):
+        asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert stopped == ["container1", "container2"]
+    assert not redis_client._data.get(STOP_PROCESSING) and not redis_client._data.get(STOP_QUEUE)
+
+
+def test_stop_worker_without_the_lease_hands_back_only_its_own_stop():
+    from container_lock import main
+    from container_lock.lock import STOP_PROCESSING
+
+    redis_client = MockRedis()
+    # Being stopped by the leader right now
+    redis_client.rpush(STOP_PROCESSING, "container1")
+    redis_client.rpush(STOP_QUEUE, "container2")
+    stopped = []
+    checks = []
+    # Take the queued stop once, then find the queue empty
+    blmove = redis_client.blmove
+    redis_client.blmove = lambda *args: blmove(*args) if len(checks) < 2 else None
+
+    async def is_current():
+        checks.append(True)
+        return False
+
+    async def scenario():
+        task = asyncio.create_task(main.stop_worker())
+        # Once at startup, once for the stop it took
+        while len(checks) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    with patch.object(main, "get_redis_client", return_value=redis_client), \
+         patch.object(main, "stop_container", side_effect=lambda *args, **kwargs: stopped.append(args[0])), \
+         patch.object(main.elector, "is_current", is_current):
+        asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert stopped == []
+    assert redis_client._data[STOP_PROCESSING] == ["container1"]
+    assert redis_client._data[STOP_QUEUE] == ["container2"]
+
+
+def requests_per_second(replicas, total_requests, docker_latency):
+    """
+    Status requests per second served by in-process replicas sharing one Redis
+    Each replica gets its own thread and event loop, like its own worker
+    process; Docker answers each lookup after docker_latency seconds.
+    """
+    import threading
+    import time
+    from unittest.mock import Mock
+    import httpx
+    from container_lock.main import app
+
+    container = Mock(status="running", labels={}, attrs={"State": {}})
+    container.name = "kali_1"
+
+    def get_container(container_id):
+        time.sleep(docker_latency)
+        return container
+
+    docker_client = Mock()
+    docker_client.containers.get.side_effect = get_container
+
+    async def client_load(count):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(client.get("/container/id1/status") for _ in range(count)))
+        assert all(r.status_code == 200 for r in responses)
+
+    threads = [threading.Thread(target=asyncio.run, args=(client_load(total_requests // replicas),))
+               for _ in range(replicas)]
+    with patch("container_lock.lock.get_docker_client", return_value=docker_client), \
+         patch("container_lock.lock.get_redis_client", return_value=MockRedis()):
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    assert docker_client.containers.get.call_count == total_requests
+    return total_requests / elapsed
+
+
+def test_throughput_scales_with_replicas(monkeypatch):
+    from container_lock.config import config
+
+    monkeypatch.setattr(config, "RATE_LIMIT_ENABLED", False)
+    # A replica waits for Docker on its event loop, so one replica serves one status request at a time
+    single = requests_per_second(1, 40, docker_latency=0.02)
+    four = requests_per_second(4, 40, docker_latency=0.02)
+    assert four > 2 * single
@@ -383,8 +383,8 @@ class TestContainerListing:
 class TestCleanup:
     def test_cleanup_exited_containers(self):
         mock_redis = Mock()
-        mock_redis.scan_iter.return_value = [b"lock:192.168.1.1"]
-        mock_redis.get.return_value = b"container123"
+        # lock_owner:container123 -> owner
+        mock_redis.get.return_value = b"192.168.1.1"
         mock_redis.delete.return_value = 1
         mock_redis.srem.return_value = 1
         
@@ -406,7 +406,7 @@ class TestCleanup:
 class TestContainerStatus:
     def test_get_container_lock_status_not_locked(self):
         mock_redis = Mock()
-        mock_redis.scan_iter.return_value = []
+        mock_redis.get.return_value = None
         
         mock_container = Mock()
         mock_container.name = "test-container"
@@ -423,8 +423,8 @@ class TestContainerStatus:
 
     def test_get_container_lock_status_locked(self):
         mock_redis = Mock()
-        mock_redis.scan_iter.return_value = [b"lock:192.168.1.1"]
-        mock_redis.get.return_value = b"container123"
+        # lock_owner:container123 -> owner
+        mock_redis.get.return_value = b"192.168.1.1"
         
         mock_container = Mock()
         mock_container.name = "test-container"
@@ -450,4 +450,38 @@ class TestContainerStatus:
             
             result = get_container_lock_status("container123", mock_redis)
             assert result["container_status"] == "not_found"
-            assert result["is_locked"] is False 
\ No newline at end of file
+            assert result["is_locked"] is False 
+
+class TestVolumeUsage:
+    def test_get_volume_usage(self):
+        from container_lock.lock import get_volume_usage
+
+        managed = Mock()
+        managed.name = "kali_1"
+        managed.status = "running"
+        managed.labels = {"sablier.group": config.GROUP_LABEL}
+        managed.attrs = {"Mounts": [{"Type": "volume", "Name": "output_kali_1", "Destination": "/storage"}]}
+
+        other = Mock()
+        other.name = "redis"
+        other.labels = {}
+
+        with patch('container_lock.lock.get_docker_client') as mock_get_client:
+            mock_client = Mock()
+            mock_client.containers.list.return_value = [managed, other]
+            mock_client.df.return_value = {"Volumes": [{
+                "Name": "output_kali_1",
+                "Options": {"type": "tmpfs", "device": "tmpfs", "o": "size=7680m"},
+                "UsageData": {"Size": 3 * 1024 ** 3, "RefCount": 1}
+            }]}
+            mock_get_client.return_value = mock_client
+
+            result = get_volume_usage()
+            assert result == [{
+                "container_name": "kali_1",
+                "container_status": "running",
+                "volume": "output_kali_1",
+                "type": "tmpfs",
+                "size_bytes": 3 * 1024 ** 3,
+                "limit_bytes": 7680 * 1024 ** 2
+            }]
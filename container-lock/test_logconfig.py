@@ -0,0 +1,51 @@
+import io
+import json
+import logging
+import pytest
+
+from container_lock.logconfig import JsonFormatter, SamplingFilter, setup_logging, shutdown_logging
+
+
+def make_record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord("container_lock.main", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_tag_and_extra_fields():
+    line = JsonFormatter().format(make_record("[ACQUIRE] Success: ip=%s", "10.0.0.1", ip="10.0.0.1"))
+    entry = json.loads(line)
+    assert entry["msg"] == "[ACQUIRE] Success: ip=10.0.0.1"
+    assert entry["tag"] == "ACQUIRE"
+    assert entry["ip"] == "10.0.0.1"
+    assert entry["level"] == "INFO"
+
+
+def test_sampling_drops_routine_logs_but_never_warnings():
+    sampler = SamplingFilter({"STATUS": 0.0})
+    assert not sampler.filter(make_record("[STATUS] Request for container %s", "abc"))
+    assert sampler.filter(make_record("[STATUS] failed", level=logging.WARNING))
+    assert sampler.filter(make_record("[STATUS] failed", level=logging.ERROR))
+    # Unlisted tags are always kept
+    assert sampler.filter(make_record("[ACQUIRE] Success"))
+
+
+@pytest.fixture
+def pipeline():
+    root = logging.getLogger()
+    level, handlers = root.level, list(root.handlers)
+    stream = io.StringIO()
+    yield stream
+    shutdown_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_queue_pipeline_writes_json_after_flush(pipeline):
+    setup_logging(level="WARNING", fmt="json", sample_rates={"STATUS": 0.0}, stream=pipeline)
+    logger = logging.getLogger("container_lock.test")
+    logger.info("[ACQUIRE] below level")
+    logger.warning("[STATUS] kept despite sampling")
+    shutdown_logging()
+    lines = [json.loads(line) for line in pipeline.getvalue().splitlines()]
+    assert [entry["msg"] for entry in lines] == ["[STATUS] kept despite sampling"]
@@ -0,0 +1,102 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+import httpx
+
+from container_lock.middleware import IPLockMiddleware
+
+
+def make_app(middleware, delay=0.05):
+    app = FastAPI()
+    app.middleware("http")(middleware)
+    state = {"active": 0, "max_active": 0}
+
+    @app.post("/acquire")
+    async def acquire():
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        await asyncio.sleep(delay)
+        state["active"] -= 1
+        return JSONResponse({"ok": True})
+
+    return app, state
+
+
+async def post_many(app, ips):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*[
+            client.post("/acquire", headers={"X-Real-IP": ip}) for ip in ips
+        ])
+
+
+def test_same_ip_requests_are_serialized_not_rejected():
+    middleware = IPLockMiddleware(wait_timeout=5, replicas=1)
+    app, state = make_app(middleware)
+    responses = asyncio.run(post_many(app, ["10.0.0.1"] * 5))
+    assert [r.status_code for r in responses] == [200] * 5
+    assert state["max_active"] == 1
+
+
+def test_different_ips_run_concurrently():
+    middleware = IPLockMiddleware(wait_timeout=5, replicas=1)
+    app, state = make_app(middleware)
+    responses = asyncio.run(post_many(app, ["10.0.0.1", "10.0.0.2", "10.0.0.3"]))
+    assert all(r.status_code == 200 for r in responses)
+    assert state["max_active"] == 3
+
+
+def test_waiting_is_bounded():
+    middleware = IPLockMiddleware(wait_timeout=0.05, replicas=1)
+    app, _ = make_app(middleware, delay=0.3)
+    responses = asyncio.run(post_many(app, ["10.0.0.1"] * 2))
+    assert sorted(r.status_code for r in responses) == [200, 409]
+
+
+def test_lock_table_is_evicted():
+    middleware = IPLockMiddleware(wait_timeout=5, replicas=1)
+    app, _ = make_app(middleware, delay=0)
+    asyncio.run(post_many(app, [f"10.0.{i // 250}.{i % 250}" for i in range(500)]))
+    assert len(middleware._locks) == 0
+
+
+class FakeAsyncRedis:
+    def __init__(self):
+        self.data = {}
+        self.calls = []
+
+    async def set(self, key, value, nx=False, ex=None):
+        self.calls.append(("set", key))
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):
+        self.calls.append(("eval", key))
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+
+def test_distributed_lock_only_with_replicas():
+    single = IPLockMiddleware(wait_timeout=5, replicas=1)
+    assert single.redis_client is None
+
+    middleware = IPLockMiddleware(wait_timeout=5, replicas=3)
+    middleware.redis_client = FakeAsyncRedis()
+    app, _ = make_app(middleware)
+    responses = asyncio.run(post_many(app, ["10.0.0.1"] * 2))
+    assert all(r.status_code == 200 for r in responses)
+    assert middleware.redis_client.calls.count(("eval", "session_lock:10.0.0.1")) == 2
+    assert middleware.redis_client.data == {}
+
+
+def test_distributed_lock_held_elsewhere_times_out():
+    middleware = IPLockMiddleware(wait_timeout=0.2, replicas=2)
+    middleware.redis_client = FakeAsyncRedis()
+    middleware.redis_client.data["session_lock:10.0.0.1"] = "other-replica"
+    app, _ = make_app(middleware)
+    responses = asyncio.run(post_many(app, ["10.0.0.1"]))
+    assert responses[0].status_code == 409
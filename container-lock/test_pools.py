@@ -0,0 +1,92 @@
+import asyncio
+from unittest.mock import patch
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from container_lock import pools
+from container_lock.config import config
+from container_lock.lock import acquire_lock, get_container_owner
+from conftest import make_vm
+
+VMS = [
+    make_vm(index, pool, status, labels={pools.POOL_LABEL: pool})
+    for index, pool, status in [(1, "win", "running"), (2, "win", "exited"), (3, "kali", "exited"),
+                                (4, "kali", "running"), (5, "kali", "exited")]
+]
+
+
+@pytest.fixture(autouse=True)
+def lab_vms(monkeypatch, docker_client):
+    monkeypatch.setattr(config, "POOL_CAPACITY", {"win": 1})
+
+    def list_containers(all=True, filters=None):
+        wanted = [f.split("=", 1)[1] for f in filters["label"] if f.startswith(pools.POOL_LABEL + "=")]
+        return [vm for vm in VMS if not wanted or vm.labels[pools.POOL_LABEL] in wanted]
+
+    docker_client.containers.list.side_effect = list_containers
+    docker_client.containers.get.side_effect = lambda container_id: next(vm for vm in VMS if vm.id == container_id)
+
+
+def test_pool_availability_respects_capacity(redis_client):
+    acquire_lock("10.0.0.1", "id3", redis_client)
+    assert pools.list_pools(redis_client) == [
+        {"pool": "kali", "total": 3, "running": 1, "in_use": 1, "available": 2, "capacity": None},
+        {"pool": "win", "total": 2, "running": 1, "in_use": 0, "available": 1, "capacity": 1},
+    ]
+    acquire_lock("10.0.0.2", "id2", redis_client)
+    assert pools.list_pools(redis_client)[1]["available"] == 0
+    with pytest.raises(HTTPException) as exc_info:
+        pools.check_capacity(pools.pool_of("id1"), redis_client)
+    assert exc_info.value.status_code == 409
+    pools.check_capacity("kali", redis_client)
+
+
+def test_acquire_by_pool_prefers_a_running_free_vm(redis_client):
+    assert pools.pick_vm("kali", redis_client)["name"] == "kali_4"
+    acquire_lock("10.0.0.1", "id4", redis_client)
+    assert pools.pick_vm("kali", redis_client)["name"] == "kali_3"
+    acquire_lock("10.0.0.2", "id3", redis_client)
+    acquire_lock("10.0.0.3", "id5", redis_client)
+    with pytest.raises(HTTPException) as exc_info:
+        pools.pick_vm("kali", redis_client)
+    assert exc_info.value.status_code == 409
+    with pytest.raises(HTTPException) as exc_info:
+        pools.pick_vm("ubuntu", redis_client)
+    assert exc_info.value.status_code == 404
+
+
+def test_capacity_is_enforced_with_the_claim(redis_client):
+    # Both owners passed check_capacity before either claimed
+    pool_limit = pools.check_capacity("win", redis_client)
+    assert pool_limit == (1, ["id1", "id2"])
+    acquire_lock("10.0.0.1", "id2", redis_client, pool_limit=pool_limit)
+    with pytest.raises(HTTPException) as exc_info:
+        acquire_lock("10.0.0.2", "id1", redis_client, pool_limit=pool_limit)
+    assert exc_info.value.status_code == 409
+    assert get_container_owner("id1", redis_client) is None
+
+
+def test_acquire_by_pool_moves_on_when_the_picked_vm_is_taken(redis_client, monkeypatch):
+    from container_lock import main
+
+    list_free = pools.free_vms
+
+    def free_vms_then_race(pool, redis_client=None):
+        free = list_free(pool, redis_client)
+        # Another session locks the best VM between listing and claiming
+        acquire_lock("10.0.0.9", free[0]["id"], redis_client)
+        return free
+
+    monkeypatch.setattr(pools, "free_vms", free_vms_then_race)
+
+    async def acquire():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/acquire", data={"pool": "kali"}, headers={"X-Real-IP": "10.0.0.1"})
+
+    with patch("container_lock.lock.get_redis_client", return_value=redis_client):
+        response = asyncio.run(acquire())
+    assert response.status_code == 200
+    assert response.json()["container_id"] == "id3"
+    assert get_container_owner("id4", redis_client) == "10.0.0.9"
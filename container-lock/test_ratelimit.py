@@ -0,0 +1,146 @@
+import asyncio
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+import httpx
+
+from container_lock.config import config
+from container_lock.ratelimit import TokenBucketLimiter, RateLimitMiddleware
+
+
+class TestTokenBucket:
+    def test_burst_then_refill(self):
+        limiter = TokenBucketLimiter(rate=2, burst=3)
+        assert [limiter.take("ip", now=0) for _ in range(3)] == [0, 0, 0]
+        assert limiter.take("ip", now=0) == 0.5
+        assert limiter.take("ip", now=0.5) == 0
+
+    def test_clients_are_independent(self):
+        limiter = TokenBucketLimiter(rate=1, burst=1)
+        assert limiter.take("a", now=0) == 0
+        assert limiter.take("b", now=0) == 0
+        assert limiter.take("a", now=0) > 0
+
+    def test_idle_buckets_are_evicted(self):
+        limiter = TokenBucketLimiter(rate=1, burst=2)
+        for i in range(1000):
+            limiter.take(f"ip{i}", now=0)
+        # Every earlier bucket has refilled by now, so only the new one stays
+        limiter.take("late", now=10)
+        assert len(limiter) == 1
+
+    def test_table_is_bounded(self):
+        limiter = TokenBucketLimiter(rate=1, burst=2, max_entries=100)
+        for i in range(1000):
+            limiter.take(f"ip{i}", now=0)
+        assert len(limiter) == 100
+
+
+def make_app():
+    app = FastAPI()
+    app.middleware("http")(RateLimitMiddleware())
+
+    @app.get("/container/{container_id}/status")
+    async def status(container_id: str):
+        return JSONResponse({"container_id": container_id})
+
+    @app.get("/health")
+    async def health():
+        return JSONResponse({"status": "healthy"})
+
+    return app
+
+
+async def get_many(app, path, count, ip="10.0.0.1", session=None):
+    transport = httpx.ASGITransport(app=app)
+    cookies = {config.SESSION_COOKIE_NAME: session} if session else None
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", cookies=cookies) as client:
+        return [await client.get(path, headers={"X-Real-IP": ip}) for _ in range(count)]
+
+
+def token(name):
+    return name.ljust(32, "x")
+
+
+def test_status_polling_gets_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP", 1.0)
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP_BURST", 2.0)
+    responses = asyncio.run(get_many(make_app(), "/container/id1/status", 3, session=token("a")))
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert responses[2].headers["Retry-After"] == "1"
+
+
+def test_unlimited_paths_pass(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP_BURST", 1.0)
+    responses = asyncio.run(get_many(make_app(), "/health", 5))
+    assert all(r.status_code == 200 for r in responses)
+
+
+def test_global_limit_applies_across_ips(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_GLOBAL", 1.0)
+    monkeypatch.setattr(config, "RATE_LIMIT_GLOBAL_BURST", 2.0)
+    app = make_app()
+
+    async def run():
+        return [
+            (await get_many(app, "/container/id1/status", 1, ip=f"10.0.0.{i}"))[0]
+            for i in range(3)
+        ]
+
+    assert [r.status_code for r in asyncio.run(run())] == [200, 200, 429]
+
+
+def test_flooding_ip_does_not_use_up_the_global_limit(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP", 0.01)
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP_BURST", 2.0)
+    monkeypatch.setattr(config, "RATE_LIMIT_GLOBAL", 0.01)
+    monkeypatch.setattr(config, "RATE_LIMIT_GLOBAL_BURST", 5.0)
+    app = make_app()
+
+    async def run():
+        flood = await get_many(app, "/container/id1/status", 20, ip="10.0.0.1", session=token("a"))
+        quiet = await get_many(app, "/container/id2/status", 2, ip="10.0.0.2", session=token("b"))
+        return flood, quiet
+
+    flood, quiet = asyncio.run(run())
+    assert [r.status_code for r in flood] == [200, 200] + [429] * 18
+    assert [r.status_code for r in quiet] == [200, 200]
+
+
+def test_sessions_behind_one_address_have_their_own_buckets(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP", 0.01)
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP_BURST", 2.0)
+    monkeypatch.setattr(config, "RATE_LIMIT_SHARED_IP_FACTOR", 3.0)
+    app = make_app()
+
+    async def run():
+        first = await get_many(app, "/container/id1/status", 3, session=token("a"))
+        second = await get_many(app, "/container/id1/status", 3, session=token("b"))
+        # Made-up tokens only get what is left of the address's ceiling of 6
+        forged = [(await get_many(app, "/container/id1/status", 1, session=token(f"f{i}")))[0] for i in range(4)]
+        return first, second, forged
+
+    first, second, forged = asyncio.run(run())
+    assert [r.status_code for r in first] == [200, 200, 429]
+    assert [r.status_code for r in second] == [200, 200, 429]
+    assert [r.status_code for r in forged] == [200, 200, 429, 429]
+
+
+def test_clients_without_session_share_a_larger_address_ceiling(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP", 0.01)
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP_BURST", 2.0)
+    monkeypatch.setattr(config, "RATE_LIMIT_SHARED_IP_FACTOR", 3.0)
+    responses = asyncio.run(get_many(make_app(), "/container/id1/status", 7))
+    assert [r.status_code for r in responses] == [200] * 6 + [429]
+
+
+def test_redis_backend_falls_back_to_memory(monkeypatch):
+    import redis
+
+    monkeypatch.setattr(config, "RATE_LIMIT_BACKEND", "redis")
+    monkeypatch.setattr(config, "RATE_LIMIT_PER_IP_BURST", 1.0)
+    monkeypatch.setattr(config, "RATE_LIMIT_SHARED_IP_FACTOR", 1.0)
+    app = make_app()
+    with patch("redis.asyncio.Redis.eval", side_effect=redis.ConnectionError("down")):
+        responses = asyncio.run(get_many(app, "/container/id1/status", 2))
+    assert [r.status_code for r in responses] == [200, 429]
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+
+from container_lock import readiness
+from container_lock.config import config
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record readiness back-off delays instead of sleeping"""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(readiness.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(config, "READINESS_INITIAL_INTERVAL", 0.25)
+    monkeypatch.setattr(config, "READINESS_MAX_INTERVAL", 1.0)
+    return delays
+
+
+def vm_states(monkeypatch, states):
+    """Feed the prober one (status, health, serving) tuple per probe round"""
+    states = list(states)
+    current = {}
+
+    def container_state(container_id):
+        current["state"] = states.pop(0) if len(states) > 1 else states[0]
+        status, health, _ = current["state"]
+        return "kali_1", status, health
+
+    async def probe(name, client):
+        return current["state"][2]
+
+    monkeypatch.setattr(readiness, "_container_state", container_state)
+    monkeypatch.setattr(readiness, "probe", probe)
+
+
+def test_ready_once_serving_and_healthy_with_backoff(monkeypatch, sleeps):
+    vm_states(monkeypatch, [
+        ("exited", None, False),
+        ("running", "starting", False),
+        ("running", "starting", True),
+        ("running", "healthy", False),
+        ("running", "healthy", True),
+    ])
+    assert asyncio.run(readiness.wait_until_ready("id1", timeout=5)) is True
+    assert sleeps == [0.25, 0.5, 1.0, 1.0]
+
+
+def test_gone_vm_is_never_ready(monkeypatch, sleeps):
+    monkeypatch.setattr(readiness, "_container_state", lambda container_id: (None, None, None))
+    assert asyncio.run(readiness.wait_until_ready("id1", timeout=5)) is False
+
+
+def test_status_stream_reports_waking_then_ready(monkeypatch):
+    monkeypatch.setattr(config, "READINESS_INITIAL_INTERVAL", 0.01)
+    monkeypatch.setattr(config, "STATUS_STREAM_KEEPALIVE", 0.02)
+
+    def events_for(delay, ready=True):
+        async def wait_until_ready(container_id):
+            await asyncio.sleep(delay)
+            return ready
+        monkeypatch.setattr(readiness, "wait_until_ready", wait_until_ready)
+
+        async def collect():
+            return [event async for event in readiness.status_events("id1")]
+        return asyncio.run(collect())
+
+    events = events_for(0.05)
+    assert events[0] == 'event: status\ndata: {"state": "waking"}\n\n'
+    assert ": keepalive\n\n" in events
+    assert events[-1] == 'event: status\ndata: {"state": "ready"}\n\n'
+    assert events_for(0) == ['event: status\ndata: {"state": "ready"}\n\n']
+    assert events_for(0.05, ready=False)[-1] == 'event: status\ndata: {"state": "timeout"}\n\n'
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from unittest.mock import patch
+import pytest
+from fastapi import HTTPException
+
+from container_lock import reservations
+from container_lock.config import config
+from container_lock.lock import acquire_lock, STOP_QUEUE
+from conftest import make_vm
+
+NOW = 1_000_000.0
+
+
+@pytest.fixture(autouse=True)
+def lab_vms(docker_client):
+    docker_client.containers.list.return_value = [
+        make_vm(index, image, attrs={"Config": {"Env": ["RAM_SIZE=2G", f"BOOT={image}"]}})
+        for index, image in [(1, "kali"), (2, "kali"), (3, "kali"), (4, "kali"), (5, "ubuntu")]
+    ]
+
+
+def book(redis_client, count, start=NOW + 3600, end=NOW + 7200, image="kali"):
+    return reservations.create_reservation("Class", image, count, start, end, redis_client, now=NOW)
+
+
+def test_overlapping_reservations_cannot_overbook(redis_client):
+    book(redis_client, 3)
+    with pytest.raises(HTTPException) as exc_info:
+        book(redis_client, 2, start=NOW + 5000, end=NOW + 9000)
+    assert exc_info.value.status_code == 409
+    # Back-to-back classes and other images are unaffected
+    book(redis_client, 4, start=NOW + 7200, end=NOW + 9000)
+    book(redis_client, 1, image="ubuntu")
+
+
+def test_schedule_index_answers_what_starts_soon(redis_client):
+    soon = book(redis_client, 1, start=NOW + 300)
+    book(redis_client, 1, start=NOW + 86400, end=NOW + 90000)
+    upcoming = reservations.list_reservations(redis_client, starting_before=NOW + 600)
+    assert [r["id"] for r in upcoming] == [soon["id"]]
+
+
+def test_prewarm_holds_and_starts_vms_with_bounded_parallelism(redis_client, monkeypatch):
+    monkeypatch.setattr(config, "RESERVATION_PREWARM_LEAD", 600)
+    monkeypatch.setattr(config, "RESERVATION_PREWARM_PARALLELISM", 2)
+    acquire_lock("10.0.0.9", "id1", redis_client)
+    reservation = book(redis_client, 3, start=NOW + 300)
+
+    running = 0
+    peak = 0
+
+    def start(container_id, client=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        time.sleep(0.02)
+        running -= 1
+        return True
+
+    with patch("container_lock.lock.start_container", side_effect=start) as started:
+        assert asyncio.run(reservations.run_schedule(redis_client, now=NOW)) == 3
+    assert peak <= 2
+    # The walk-in user's VM is skipped
+    assert sorted(call.args[0] for call in started.call_args_list) == ["id2", "id3", "id4"]
+    held = reservations.get_reservation(reservation["id"], redis_client)["containers"]
+    assert [c["name"] for c in held] == ["kali_2", "kali_3", "kali_4"]
+
+
+def test_reserved_vms_are_held_back_from_walk_ins(redis_client):
+    reservation = book(redis_client, 1, start=NOW + 300)
+    reservations.assign_containers(reservation, redis_client, NOW)
+    with pytest.raises(HTTPException) as exc_info:
+        reservations.check_walk_in("id1", None, redis_client)
+    assert exc_info.value.status_code == 409
+    reservations.check_walk_in("id1", reservation["code"], redis_client)
+    reservations.check_walk_in("id2", None, redis_client)
+
+
+def test_ended_reservations_release_and_stop_unused_vms(redis_client):
+    reservation = book(redis_client, 2, start=NOW + 300, end=NOW + 600)
+    reservations.assign_containers(reservation, redis_client, NOW)
+    acquire_lock("10.0.0.1", "id1", redis_client)
+
+    assert reservations.end_reservations(redis_client, now=NOW + 700) == 1
+    reservations.check_walk_in("id2", None, redis_client)
+    assert redis_client.blpop(STOP_QUEUE, 1) == (STOP_QUEUE.encode(), b"id2")
+    assert redis_client.blpop(STOP_QUEUE, 1) is None
+    assert reservations.list_reservations(redis_client) == []
+
+
+def test_parse_time_accepts_unix_and_iso():
+    assert reservations.parse_time("1700000000") == 1700000000
+    assert reservations.parse_time("2023-11-14T22:13:20Z") == 1700000000
+    assert reservations.parse_time("2023-11-14T23:13:20+01:00") == 1700000000
@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+
+from container_lock.config import config
+from container_lock.lock import acquire_lock, release_lock, get_locked_container, get_container_owner
+from container_lock.mock_redis import MockRedis
+from container_lock.session import (
+    SessionCookieMiddleware, get_owner, public_owner, mask_owner, new_token, SESSION_PREFIX
+)
+
+NAT_IP = "10.0.0.1"
+
+
+def make_request(cookies=None, ip=NAT_IP):
+    return SimpleNamespace(
+        cookies=cookies or {},
+        client=SimpleNamespace(host="172.18.0.2"),
+        headers={"X-Real-IP": ip},
+        state=SimpleNamespace()
+    )
+
+
+@pytest.fixture
+def redis_client():
+    with patch("container_lock.lock.is_managed_container", return_value=True):
+        yield MockRedis()
+
+
+def test_owner_is_session_token_with_ip_fallback():
+    token = new_token()
+    assert get_owner(make_request({config.SESSION_COOKIE_NAME: token})) == f"{SESSION_PREFIX}{token}"
+    assert get_owner(make_request()) == NAT_IP
+    # Malformed tokens are ignored rather than trusted
+    assert get_owner(make_request({config.SESSION_COOKIE_NAME: "short"})) == NAT_IP
+
+
+def test_sessions_behind_one_nat_ip_each_hold_a_vm(redis_client):
+    alice, bob = f"{SESSION_PREFIX}{new_token()}", f"{SESSION_PREFIX}{new_token()}"
+    assert acquire_lock(alice, "vm1", redis_client, client_ip=NAT_IP)
+    assert acquire_lock(bob, "vm2", redis_client, client_ip=NAT_IP)
+    assert get_locked_container(alice, redis_client) == "vm1"
+    assert get_container_owner("vm2", redis_client) == bob
+
+    with pytest.raises(HTTPException) as exc_info:
+        acquire_lock(f"{SESSION_PREFIX}{new_token()}", "vm1", redis_client, client_ip=NAT_IP)
+    assert exc_info.value.status_code == 409
+
+
+def test_locks_per_ip_are_capped(redis_client, monkeypatch):
+    monkeypatch.setattr(config, "MAX_LOCKS_PER_IP", 2)
+    owners = [f"{SESSION_PREFIX}{new_token()}" for _ in range(3)]
+    assert acquire_lock(owners[0], "vm1", redis_client, client_ip=NAT_IP)
+    assert acquire_lock(owners[1], "vm2", redis_client, client_ip=NAT_IP)
+    with pytest.raises(HTTPException) as exc_info:
+        acquire_lock(owners[2], "vm3", redis_client, client_ip=NAT_IP)
+    assert exc_info.value.status_code == 429
+
+    assert release_lock(owners[0], redis_client, client_ip=NAT_IP)
+    assert acquire_lock(owners[2], "vm3", redis_client, client_ip=NAT_IP)
+
+
+def test_tokens_are_never_returned_to_other_users():
+    owner = f"{SESSION_PREFIX}{new_token()}"
+    masked = mask_owner({"container_id": "vm1", "locked_by_ip": owner})
+    assert masked["locked_by_ip"] == public_owner(owner)
+    assert owner[len(SESSION_PREFIX):] not in masked["locked_by_ip"]
+    assert public_owner(NAT_IP) == NAT_IP
+
+
+def test_cookie_issued_on_page_load_only():
+    app = FastAPI()
+    app.middleware("http")(SessionCookieMiddleware())
+
+    @app.get("/session/{name}")
+    async def page(name: str):
+        return JSONResponse({})
+
+    @app.get("/containers/status")
+    async def status():
+        return JSONResponse({})
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.get("/session/kali_1")
+            polled = await client.get("/containers/status")
+            again = await client.get("/session/kali_1")
+        return first, polled, again
+
+    first, polled, again = asyncio.run(run())
+    assert config.SESSION_COOKIE_NAME in first.cookies
+    assert "set-cookie" not in polled.headers
+    # The browser already has a token, so it keeps it
+    assert "set-cookie" not in again.headers
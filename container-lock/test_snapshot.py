@@ -0,0 +1,123 @@
+import pytest
+from unittest.mock import Mock, patch
+
+from container_lock import snapshot
+from container_lock.config import config
+from container_lock.lock import stop_container, resume_container, get_wake_mode
+from container_lock.mock_redis import MockRedis
+
+PROMPT_OK = b"QEMU 8.2 monitor - type 'help' for more information\r\n(qemu) savevm scale-to-zero\r\n(qemu) "
+
+
+def make_container(status="running", output=PROMPT_OK, exit_code=0):
+    container = Mock()
+    container.id = "container123"
+    container.name = "kali_1"
+    container.status = status
+    container.exec_run.return_value = (exit_code, output)
+    return container
+
+
+@pytest.fixture
+def snapshots_enabled(monkeypatch):
+    monkeypatch.setattr(config, "SNAPSHOT_ENABLED", True)
+
+
+class TestMonitor:
+    def test_save_vm_state_records_marker(self):
+        redis_client = MockRedis()
+        container = make_container()
+
+        assert snapshot.save_vm_state(container, redis_client) is True
+        cmd = container.exec_run.call_args[0][0]
+        assert cmd[:2] == ["bash", "-c"]
+        assert "savevm scale-to-zero" in cmd[2]
+        assert f"/dev/tcp/127.0.0.1/{config.QEMU_MONITOR_PORT}" in cmd[2]
+        assert snapshot.has_snapshot("container123", redis_client)
+
+    def test_save_vm_state_skips_stopped_container(self):
+        container = make_container(status="exited")
+        assert snapshot.save_vm_state(container, MockRedis()) is False
+        container.exec_run.assert_not_called()
+
+    def test_monitor_error_raises(self):
+        container = make_container(output=b"(qemu) savevm x\r\nError: no block device can store vmstate\r\n(qemu) ")
+        with pytest.raises(snapshot.SnapshotError):
+            snapshot.monitor_command(container, "savevm x")
+
+    def test_failed_restore_drops_marker(self):
+        redis_client = MockRedis()
+        redis_client.set("snapshot:container123", 1)
+        container = make_container(exit_code=2, output=b"")
+        with pytest.raises(snapshot.SnapshotError):
+            snapshot.restore_vm_state(container, redis_client)
+        assert not snapshot.has_snapshot("container123", redis_client)
+
+
+class TestLockIntegration:
+    def test_stop_container_saves_state_first(self, snapshots_enabled):
+        redis_client = MockRedis()
+        container = make_container()
+        with patch("container_lock.lock.get_docker_client") as mock_get_client:
+            mock_get_client.return_value.containers.get.return_value = container
+            assert stop_container("container123", redis_client=redis_client) is True
+        container.stop.assert_called_once()
+        assert get_wake_mode("container123", redis_client) == "resume"
+
+    def test_stop_container_stops_even_if_save_fails(self, snapshots_enabled):
+        redis_client = MockRedis()
+        # Left over from an earlier session; restoring it would roll the guest back
+        redis_client.set("snapshot:container123", 1)
+        container = make_container(exit_code=2, output=b"")
+        with patch("container_lock.lock.get_docker_client") as mock_get_client:
+            mock_get_client.return_value.containers.get.return_value = container
+            assert stop_container("container123", redis_client=redis_client) is True
+        container.stop.assert_called_once()
+        assert get_wake_mode("container123", redis_client) == "boot"
+
+    def test_stop_container_without_snapshots(self):
+        container = make_container()
+        with patch("container_lock.lock.get_docker_client") as mock_get_client:
+            mock_get_client.return_value.containers.get.return_value = container
+            assert stop_container("container123", redis_client=MockRedis()) is True
+        container.exec_run.assert_not_called()
+
+    def test_resume_container_starts_and_loads(self, snapshots_enabled):
+        redis_client = MockRedis()
+        redis_client.set("snapshot:container123", 1)
+        container = make_container(status="exited")
+        container.start.side_effect = lambda: setattr(container, "status", "running")
+        with patch("container_lock.lock.get_docker_client") as mock_get_client:
+            mock_get_client.return_value.containers.get.return_value = container
+            assert resume_container("container123", redis_client=redis_client) is True
+        container.start.assert_called_once()
+        assert "loadvm scale-to-zero" in container.exec_run.call_args[0][0][2]
+
+    def test_resume_container_without_snapshot_is_cold_boot(self, snapshots_enabled):
+        assert resume_container("container123", redis_client=MockRedis()) is False
+        assert get_wake_mode("container123", MockRedis()) == "boot"
+
+    def test_resume_container_leaves_a_running_guest_alone(self, snapshots_enabled):
+        redis_client = MockRedis()
+        redis_client.set("snapshot:container123", 1)
+        container = make_container(status="running")
+        with patch("container_lock.lock.get_docker_client") as mock_get_client:
+            mock_get_client.return_value.containers.get.return_value = container
+            assert resume_container("container123", redis_client=redis_client) is False
+        container.exec_run.assert_not_called()
+        # The live guest is newer than the snapshot, so it must never be restored later
+        assert get_wake_mode("container123", redis_client) == "boot"
+
+    def test_snapshot_is_restored_only_once(self, snapshots_enabled):
+        redis_client = MockRedis()
+        redis_client.set("snapshot:container123", 1)
+        container = make_container(status="exited")
+        container.start.side_effect = lambda: setattr(container, "status", "running")
+        with patch("container_lock.lock.get_docker_client") as mock_get_client:
+            mock_get_client.return_value.containers.get.return_value = container
+            assert resume_container("container123", redis_client=redis_client) is True
+            # Stopped again without savevm, as Sablier's idle stop does
+            container.status = "exited"
+            container.exec_run.reset_mock()
+            assert resume_container("container123", redis_client=redis_client) is False
+        container.exec_run.assert_not_called()
@@ -0,0 +1,101 @@
+from unittest.mock import Mock, patch
+import pytest
+
+from container_lock import telemetry, metrics
+from container_lock.config import config
+from container_lock.telemetry import Sample, TelemetryStore
+
+
+def write_cgroup(root, container_id, usage_usec, memory, rbytes, wbytes, inactive_file=0):
+    path = root / "system.slice" / f"docker-{container_id}.scope"
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "cpu.stat").write_text(f"usage_usec {usage_usec}\nuser_usec 1\nsystem_usec 1\n")
+    (path / "memory.current").write_text(f"{memory}\n")
+    (path / "memory.stat").write_text(f"anon {memory - inactive_file}\nfile {inactive_file}\ninactive_file {inactive_file}\n")
+    (path / "io.stat").write_text(f"8:0 rbytes={rbytes} wbytes={wbytes} rios=1 wios=1\n")
+
+
+def write_net_dev(root, pid, rx, tx):
+    path = root / str(pid) / "net"
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "dev").write_text(
+        "Inter-|   Receive                            |  Transmit\n"
+        " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets\n"
+        "    lo:     999       1    0    0    0     0          0         0      999       1    0    0    0     0       0          0\n"
+        "  eth0:  %d       1    0    0    0     0          0         0  %d       1    0    0    0     0       0          0\n" % (rx, tx)
+    )
+
+
+def make_container(container_id, name, pid=None):
+    container = Mock()
+    container.id = container_id
+    container.name = name
+    container.attrs = {"State": {"Pid": pid}}
+    return container
+
+
+@pytest.fixture
+def host(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TELEMETRY_CGROUP_ROOT", str(tmp_path / "cgroup"))
+    monkeypatch.setattr(config, "TELEMETRY_PROC_ROOT", str(tmp_path / "proc"))
+    monkeypatch.setattr(telemetry, "store", TelemetryStore(max_samples=3))
+    telemetry._cgroup_dirs.clear()
+    return tmp_path
+
+
+def test_ring_buffer_is_bounded_and_reports_rates():
+    store = TelemetryStore(max_samples=3)
+    for i in range(5):
+        store.add("abc", "kali_1", Sample(float(i), i * 500_000_000, 100, i * 10, 0, i * 20, 0))
+    series = store.series("abc")
+    assert len(series) == 2
+    assert series[-1]["cpu_cores"] == 0.5
+    assert series[-1]["block_read_bps"] == 10
+    assert store.latest()["kali_1"]["net_rx_bps"] == 20
+    assert store.resolve("kali_1") == "abc"
+
+    store.retain(set())
+    assert store.latest() == {} and store.resolve("kali_1") is None
+
+
+def test_cgroup_files_are_read_without_docker(host):
+    write_cgroup(host / "cgroup", "abc", 1_000_000, 5120, 100, 200, inactive_file=1024)
+    write_net_dev(host / "proc", 42, 300, 400)
+    container = make_container("abc", "kali_1", pid=42)
+    container.stats.side_effect = AssertionError("docker stats must not be called")
+
+    sample = telemetry._sample_container(container)
+    assert sample.cpu_ns == 1_000_000_000
+    # Inactive page cache is not counted, like docker stats does
+    assert (sample.memory_bytes, sample.block_read_bytes, sample.block_write_bytes) == (4096, 100, 200)
+    # Loopback traffic is not VM network traffic
+    assert (sample.net_rx_bytes, sample.net_tx_bytes) == (300, 400)
+
+
+def test_docker_stats_fallback_without_cgroup_access(host):
+    container = make_container("abc", "kali_1")
+    container.stats.return_value = {
+        "cpu_stats": {"cpu_usage": {"total_usage": 7}},
+        "memory_stats": {"usage": 1000, "stats": {"inactive_file": 200}},
+        "blkio_stats": {"io_service_bytes_recursive": [{"op": "read", "value": 5}, {"op": "write", "value": 6}]},
+        "networks": {"eth0": {"rx_bytes": 1, "tx_bytes": 2}, "eth1": {"rx_bytes": 3, "tx_bytes": 4}},
+    }
+    assert telemetry._sample_container(container)[1:] == (7, 800, 5, 6, 4, 6)
+    container.stats.assert_called_once_with(stream=False, one_shot=True)
+
+
+def test_sample_all_batches_and_prunes_removed_vms(host):
+    write_cgroup(host / "cgroup", "abc", 0, 1, 0, 0)
+    client = Mock()
+    client.containers.list.return_value = [make_container("abc", "kali_1")]
+    with patch("container_lock.lock.get_docker_client", return_value=client):
+        assert telemetry.sample_all() == 1
+        write_cgroup(host / "cgroup", "abc", 2_000_000, 1, 0, 0)
+        assert telemetry.sample_all() == 1
+        assert "kali_1" in telemetry.store.latest()
+        assert 'vm_memory_bytes{vm="kali_1"} 1' in metrics.render_latest()
+
+        client.containers.list.return_value = []
+        assert telemetry.sample_all() == 0
+    client.containers.list.assert_called_with(filters={"label": "sablier.group=qemu-lab", "status": "running"})
+    assert telemetry.store.latest() == {}
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from container_lock.utils import TrustedProxies, resolve_client_ip, get_client_ip
+
+CADDY = "172.18.0.2"
+
+
+def make_request(peer, headers=None):
+    return SimpleNamespace(
+        client=SimpleNamespace(host=peer) if peer else None,
+        headers=headers or {},
+        state=SimpleNamespace()
+    )
+
+
+def test_trusted_proxies_matcher():
+    proxies = TrustedProxies(["172.16.0.0/12", "::1/128"])
+    assert "172.18.0.2" in proxies
+    assert "::1" in proxies
+    assert "10.0.0.1" not in proxies
+    assert "2001:db8::1" not in proxies
+    assert "not-an-ip" not in proxies
+
+
+def test_headers_from_untrusted_peer_are_ignored():
+    assert resolve_client_ip("10.0.0.1", "1.2.3.4", "5.6.7.8") == "10.0.0.1"
+
+
+def test_rightmost_untrusted_hop_is_the_client():
+    # The client prepended a spoofed entry; Caddy appended the real address
+    assert resolve_client_ip(CADDY, "6.6.6.6, 10.0.0.7", None) == "10.0.0.7"
+    assert resolve_client_ip(CADDY, "10.0.0.7, 172.18.0.9", None) == "10.0.0.7"
+
+
+def test_real_ip_and_peer_fallbacks():
+    assert resolve_client_ip(CADDY, None, "10.0.0.8") == "10.0.0.8"
+    assert resolve_client_ip(CADDY, None, None) == CADDY
+    assert resolve_client_ip(CADDY, "garbage", None) == "unknown"
+    assert resolve_client_ip(None, None, None) == "unknown"
+
+
+def test_client_ip_is_resolved_once_per_request():
+    request = make_request(CADDY, {"X-Real-IP": "10.0.0.8"})
+    with patch("container_lock.utils.resolve_client_ip", wraps=resolve_client_ip) as resolve:
+        assert get_client_ip(request) == "10.0.0.8"
+        assert get_client_ip(request) == "10.0.0.8"
+    assert resolve.call_count == 1
+    assert request.state.client_ip == "10.0.0.8"
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import subprocess
+import sys
+
+QEMU_IMG = os.environ.get('QEMU_IMG', 'qemu-img')
+BASE_DIR = 'base'
+OVERLAY_FILE = 'boot.qcow2'
+
+
+class OverlayError(Exception):
+    """Raised when qemu-img fails to prepare a base image or overlay"""
+
+
+def get_storage_root(volume_prefix):
+    """Resolve the host directory holding base images and per-VM overlays.
+
+    The default volume prefix '.' is relative to the rendered compose file,
+    which lives in output/. Backing file references inside an overlay must be
+    absolute, so always resolve to an absolute path here.
+    """
+    if volume_prefix == '.':
+        return os.path.abspath('output')
+    return os.path.abspath(volume_prefix)
+
+
+def base_image_path(storage_root, boot_image):
+    return os.path.join(storage_root, BASE_DIR, f'{boot_image}.qcow2')
+
+
+def overlay_path(storage_root, container_name):
+    return os.path.join(storage_root, container_name, OVERLAY_FILE)
+
+
+def _run_qemu_img(*args):
+    cmd = [QEMU_IMG, *args]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise OverlayError(f"{QEMU_IMG} not found; install qemu-utils to use overlay disks")
+    except subprocess.CalledProcessError as e:
+        raise OverlayError(f"{' '.join(cmd)} failed: {e.stderr.strip()}")
+
+
+def prepare_base_image(source, dest):
+    """Convert the source disk image into a read-only qcow2 base image once.
+
+    Returns True if the base image was created, False if it already existed.
+    """
+    if os.path.exists(dest):
+        return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = f'{dest}.tmp'
+    _run_qemu_img('convert', '-O', 'qcow2', source, tmp)
+    os.replace(tmp, dest)
+    os.chmod(dest, 0o444)
+    return True
+
+
+def create_overlay(base, overlay):
+    """(Re)create a thin qcow2 overlay backed by base.
+
+    The overlay is written next to its final location and moved into place,
+    so a running reset never leaves a half-written disk behind.
+    """
+    os.makedirs(os.path.dirname(overlay), exist_ok=True)
+    tmp = f'{overlay}.tmp'
+    _run_qemu_img('create', '-f', 'qcow2', '-F', 'qcow2', '-b', base, tmp)
+    os.replace(tmp, overlay)
+
+
+def prepare_overlays(storage_root, boot_image, source, container_names):
+    """Prepare the shared base image and one overlay per container.
+
+    Existing overlays are kept so re-rendering never discards guest state;
+    use reset_overlay() to start a VM from a clean disk.
+    """
+    base = base_image_path(storage_root, boot_image)
+    prepare_base_image(source, base)
+    created = []
+    for name in container_names:
+        overlay = overlay_path(storage_root, name)
+        if os.path.exists(overlay):
+            continue
+        create_overlay(base, overlay)
+        created.append(name)
+    return created
+
+
+def reset_overlay(storage_root, boot_image, container_name):
+    """Discard a VM's disk changes by recreating its overlay"""
+    base = base_image_path(storage_root, boot_image)
+    if not os.path.exists(base):
+        raise OverlayError(f"Base image not found: {base}")
+    create_overlay(base, overlay_path(storage_root, container_name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage copy-on-write qcow2 overlays for QEMU containers')
+    parser.add_argument('--volume-prefix', default='.',
+                      help='Volume path prefix used when rendering (default: .)')
+    parser.add_argument('--boot-image', default='kali',
+                      help='Boot image the base disk was prepared for (default: kali)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    prepare = subparsers.add_parser('prepare', help='Prepare the base image and missing overlays')
+    prepare.add_argument('--base-image', required=True, help='Source disk image for the shared base')
+    prepare.add_argument('names', nargs='+', help='Container names to create overlays for')
+
+    reset = subparsers.add_parser('reset', help='Recreate overlays from the base image')
+    reset.add_argument('names', nargs='+', help='Container names to reset (stop them first)')
+
+    args = parser.parse_args()
+    storage_root = get_storage_root(args.volume_prefix)
+
+    try:
+        if args.command == 'prepare':
+            created = prepare_overlays(storage_root, args.boot_image, os.path.abspath(args.base_image), args.names)
+            print(f"✅ Prepared {len(created)} overlay(s) in {storage_root}")
+        else:
+            for name in args.names:
+                reset_overlay(storage_root, args.boot_image, name)
+                print(f"♻️  Reset overlay for {name}")
+    except OverlayError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import yaml
+
+DOCKER = os.environ.get('DOCKER', 'docker')
+BLOB_DIR = 'sha256'
+INDEX_DIR = 'images'
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_PARALLELISM = 4
+
+# Files the qemux/qemu image boots from instead of downloading BOOT, by extension
+BOOT_FILES = {'.iso': '/boot.iso', '.img': '/boot.img', '.qcow2': '/boot.qcow2'}
+DEFAULT_BOOT_FILE = '/boot.iso'
+
+
+class PrefetchError(Exception):
+    """Raised when a boot image cannot be downloaded or verified, or an image pull fails"""
+
+
+def load_sources(path):
+    """
+    Read the boot image sources file:
+
+        images:
+          kali: https://example.org/kali-live-amd64.iso
+          ubuntu:
+            url: https://example.org/ubuntu-24.04-desktop-amd64.iso
+            sha256: 0123...
+
+    Returns {image: {'url': ..., 'sha256': ... or None}}.
+    """
+    try:
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise PrefetchError(f"Cannot read sources file {path}: {e}")
+    images = data.get('images') if isinstance(data, dict) else None
+    if not images or not isinstance(images, dict):
+        raise PrefetchError(f"Sources file {path} needs an 'images' mapping of boot image to URL")
+    sources = {}
+    for image, source in images.items():
+        source = {'url': source} if isinstance(source, str) else (source or {})
+        if not source.get('url'):
+            raise PrefetchError(f"Boot image {image} in {path} has no url")
+        sources[str(image)] = {'url': source['url'], 'sha256': (source.get('sha256') or '').lower() or None}
+    return sources
+
+
+def blob_path(cache_root, digest):
+    return os.path.join(cache_root, BLOB_DIR, digest)
+
+
+def index_path(cache_root, image):
+    return os.path.join(cache_root, INDEX_DIR, f'{image}.json')
+
+
+def boot_file(url):
+    """Where the VM container expects a local boot file with this URL's extension"""
+    path = urllib.parse.urlparse(url).path.lower()
+    return next((target for ext, target in BOOT_FILES.items() if path.endswith(ext)), DEFAULT_BOOT_FILE)
+
+
+def cached_image(cache_root, image):
+    """Index entry of a prefetched boot image, or None if it is not in the cache"""
+    try:
+        with open(index_path(cache_root, image)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(blob_path(cache_root, entry.get('sha256', ''))):
+        return None
+    return {**entry, 'path': blob_path(cache_root, entry['sha256'])}
+
+
+def _write_index(cache_root, image, url, digest):
+    entry = {'url': url, 'sha256': digest, 'size': os.path.getsize(blob_path(cache_root, digest)),
+             'boot_file': boot_file(url)}
+    os.makedirs(os.path.join(cache_root, INDEX_DIR), exist_ok=True)
+    tmp = f'{index_path(cache_root, image)}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(entry, f, indent=2)
+    os.replace(tmp, index_path(cache_root, image))
+    return {**entry, 'path': blob_path(cache_root, digest)}
+
+
+def download(cache_root, url, sha256=None, session=None):
+    """
+    Download a URL into the cache, named by its SHA-256
+    The file is hashed while it streams in and only moved into place once
+    complete (and matching sha256, when given). Returns the digest.
+    """
+    blobs = os.path.join(cache_root, BLOB_DIR)
+    os.makedirs(blobs, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=blobs, prefix='.download-')
+    try:
+        with os.fdopen(fd, 'wb') as f, (session or requests).get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                digest.update(chunk)
+        actual = digest.hexdigest()
+        if sha256 and actual != sha256:
+            raise PrefetchError(f"{url} has sha256 {actual}, expected {sha256}")
+        if os.path.exists(blob_path(cache_root, actual)):
+            os.remove(tmp)
+        else:
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, blob_path(cache_root, actual))
+        return actual
+    except requests.RequestException as e:
+        raise PrefetchError(f"Cannot download {url}: {e}")
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def prefetch_images(cache_root, sources, parallelism=DEFAULT_PARALLELISM):
+    """
+    Make every boot image in sources available in the cache
+
+    Each distinct URL is downloaded once, several at a time, and images with
+    the same content share one file. Images already cached from the same URL
+    (or whose sha256 is already present) are not downloaded again.
+    Returns one {'image', 'sha256', 'size', 'downloaded'} per image.
+    """
+    cache_root = os.path.abspath(cache_root)
+    results, wanted = [], {}
+    for image, source in sorted(sources.items()):
+        entry = cached_image(cache_root, image)
+        if entry and entry['url'] == source['url'] and source['sha256'] in (None, entry['sha256']):
+            results.append({'image': image, 'sha256': entry['sha256'], 'size': entry['size'], 'downloaded': False})
+        elif source['sha256'] and os.path.exists(blob_path(cache_root, source['sha256'])):
+            entry = _write_index(cache_root, image, source['url'], source['sha256'])
+            results.append({'image': image, 'sha256': entry['sha256'], 'size': entry['size'], 'downloaded': False})
+        else:
+            wanted.setdefault((source['url'], source['sha256']), []).append(image)
+
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=parallelism) as executor:
+        downloads = {key: executor.submit(download, cache_root, key[0], key[1], session) for key in wanted}
+    errors = []
+    for (url, sha256), future in downloads.items():
+        try:
+            digest = future.result()
+        except PrefetchError as e:
+            errors.append(str(e))
+            continue
+        # Index what did download, so a re-run only fetches the failures
+        for image in wanted[(url, sha256)]:
+            entry = _write_index(cache_root, image, url, digest)
+            results.append({'image': image, 'sha256': digest, 'size': entry['size'], 'downloaded': True})
+    if errors:
+        raise PrefetchError('; '.join(errors))
+    return sorted(results, key=lambda r: r['image'])
+
+
+def compose_images(compose_path):
+    """Container images a rendered compose file pulls (services built locally are skipped)"""
+    try:
+        with open(compose_path) as f:
+            compose = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise PrefetchError(f"Cannot read {compose_path}: {e}")
+    return sorted({
+        service['image'] for service in (compose.get('services') or {}).values()
+        if service.get('image') and not service.get('build')
+    })
+
+
+def _pull(image):
+    try:
+        subprocess.run([DOCKER, 'pull', '--quiet', image], check=True, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise PrefetchError(f"{DOCKER} not found")
+    except subprocess.CalledProcessError as e:
+        raise PrefetchError(f"docker pull {image} failed: {e.stderr.strip()}")
+
+
+def pull_images(images, parallelism=DEFAULT_PARALLELISM):
+    """Pull container images several at a time; returns {image: error} for those that failed"""
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        futures = {image: executor.submit(_pull, image) for image in images}
+    return {image: str(future.exception()) for image, future in futures.items() if future.exception()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prefetch boot images and container images for QEMU containers')
+    parser.add_argument('--parallelism', type=int, default=DEFAULT_PARALLELISM,
+                      help=f'Downloads or pulls at once (default: {DEFAULT_PARALLELISM})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    images = subparsers.add_parser('images', help='Download each distinct boot image once into the cache')
+    images.add_argument('--sources', required=True, help='YAML file mapping boot images to download URLs')
+    images.add_argument('--cache', required=True, help='Cache directory, later passed to render.py --image-cache')
+
+    pull = subparsers.add_parser('pull', help='Pull the container images of a rendered compose file')
+    pull.add_argument('compose', nargs='?', default='output/docker-compose.yml',
+                      help='Rendered compose file (default: output/docker-compose.yml)')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'images':
+            for result in prefetch_images(args.cache, load_sources(args.sources), args.parallelism):
+                mark = '⬇️ ' if result['downloaded'] else '✅'
+                print(f"{mark} {result['image']}: sha256:{result['sha256'][:12]} ({result['size']} bytes)")
+        else:
+            names = compose_images(args.compose)
+            failed = pull_images(names, args.parallelism)
+            for image, error in failed.items():
+                print(f"❌ {error}")
+            print(f"🐳 Pulled {len(names) - len(failed)}/{len(names)} image(s)")
+            if failed:
+                sys.exit(1)
+    except PrefetchError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,295 @@
 #!/usr/bin/env python3
 
 import argparse
+import secrets
 from jinja2 import Environment, FileSystemLoader
 import os
+import re
 import sys
+import yaml
+import overlay
+import prefetch
+import topology
 
 VALID_BOOT_MODES = ['legacy', 'uefi']
 DEFAULT_BOOT_MODE = 'legacy'
+VALID_DISK_MODES = ['volume', 'overlay']
+DEFAULT_DISK_MODE = 'volume'
 DEFAULT_BOOT_IMAGE = 'kali'
 DEFAULT_RAM_SIZE = '2G'
 DEFAULT_CPU_CORES = '2'
 DEFAULT_CONTAINERS = 3  # Changed from 6 to 3 as a more reasonable default
 DEFAULT_VOLUME_PREFIX = '.'  # Use current directory as default
+VALID_STORAGE_BACKENDS = ['tmpfs', 'sparse']
+DEFAULT_STORAGE_BACKEND = 'tmpfs'
+DEFAULT_TMPFS_SIZE = '50g'  # Per-VM tmpfs size when no budget is given
+TMPFS_HEADROOM = 1.25  # Room for guest writes on top of the image footprint
+# Approximate on-disk footprint (boot image + installed disk) per boot image
+IMAGE_FOOTPRINTS = {
+    'kali': '6g',
+    'ubuntu': '8g',
+    'debian': '4g',
+    'alpine': '1g',
+    'windows': '24g',
+}
+SIZE_UNITS = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+MAX_CONTAINERS = 100
+QEMU_MEMORY_OVERHEAD = '512m'  # QEMU process memory on top of guest RAM, for mem_limit
+HUGEPAGE_ARGUMENTS = '-mem-path /dev/hugepages -mem-prealloc'
+# Per-VM IO, process and network limits; set on the command line or per pool
+LIMIT_KEYS = ('io_weight', 'io_read_bps', 'io_write_bps', 'pids_limit', 'net_rate')
+POOL_KEYS = {'name', 'count', 'boot_image', 'base_image', 'boot_mode', 'ram_size', 'cpu_cores', 'prefix', 'capacity', 'groups', *LIMIT_KEYS}
 
 def validate_boot_mode(mode):
     if mode not in VALID_BOOT_MODES:
         raise argparse.ArgumentTypeError(f"Boot mode must be one of: {', '.join(VALID_BOOT_MODES)}")
     return mode
 
+def validate_disk_mode(mode):
+    if mode not in VALID_DISK_MODES:
+        raise argparse.ArgumentTypeError(f"Disk mode must be one of: {', '.join(VALID_DISK_MODES)}")
+    return mode
+
+def validate_storage_backend(backend):
+    if backend not in VALID_STORAGE_BACKENDS:
+        raise argparse.ArgumentTypeError(f"Storage backend must be one of: {', '.join(VALID_STORAGE_BACKENDS)}")
+    return backend
+
+def parse_size(size):
+    """Parse a size like '50g', '512M' or '1024' (bytes) into bytes"""
+    value = str(size).strip().lower().rstrip('b')
+    try:
+        if value and value[-1] in SIZE_UNITS:
+            return int(float(value[:-1]) * SIZE_UNITS[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size: {size} (use e.g. 512m, 50g, 1t)")
+
+def format_size(num_bytes):
+    """Format bytes as the largest whole tmpfs size unit, e.g. 7680m"""
+    for unit in ('t', 'g', 'm', 'k'):
+        if num_bytes % SIZE_UNITS[unit] == 0:
+            return f"{num_bytes // SIZE_UNITS[unit]}{unit}"
+    return f"{-(-num_bytes // SIZE_UNITS['m'])}m"
+
+def get_physical_memory():
+    """Return physical memory of this host in bytes, or None if unknown"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def compute_tmpfs_size(num_containers, boot_image, budget=None, footprint=None, host_memory=None):
+    """
+    Derive the per-VM tmpfs size.
+
+    Without a budget the historic fixed size is kept. With a budget, each VM
+    gets its image footprint plus headroom, capped at an even share of the
+    budget. Either way the total is checked against host_memory.
+    Returns (size_string, warnings).
+    """
+    warnings = []
+    if budget is None:
+        per_vm = parse_size(DEFAULT_TMPFS_SIZE)
+    else:
+        footprint_bytes = parse_size(footprint or IMAGE_FOOTPRINTS.get(boot_image, DEFAULT_TMPFS_SIZE))
+        wanted = int(footprint_bytes * TMPFS_HEADROOM)
+        share = parse_size(budget) // num_containers
+        per_vm = min(wanted, share)
+        # Round down to whole megabytes so the sum never exceeds the budget
+        per_vm -= per_vm % SIZE_UNITS['m']
+        if per_vm < footprint_bytes:
+            warnings.append(
+                f"tmpfs budget {budget} gives {format_size(per_vm)} per VM, less than the "
+                f"{format_size(footprint_bytes)} footprint of '{boot_image}'"
+            )
+    total = per_vm * num_containers
+    if host_memory and total > host_memory:
+        warnings.append(
+            f"tmpfs volumes may use {format_size(total)}, more than the host's "
+            f"{format_size(host_memory)} of physical memory; consider --storage-backend sparse"
+        )
+    return format_size(per_vm), warnings
+
 def validate_container_count(count):
     if int(count) < 1:
         raise argparse.ArgumentTypeError("Number of containers must be at least 1")
-    if int(count) > 100:
-        raise argparse.ArgumentTypeError("Number of containers cannot exceed 100")
+    if int(count) > MAX_CONTAINERS:
+        raise argparse.ArgumentTypeError(f"Number of containers cannot exceed {MAX_CONTAINERS}")
+    return int(count)
+
+def validate_lock_replicas(count):
+    if int(count) < 1:
+        raise argparse.ArgumentTypeError("Number of container-lock replicas must be at least 1")
     return int(count)
 
+def validate_io_weight(weight):
+    if not 10 <= int(weight) <= 1000:
+        raise argparse.ArgumentTypeError("IO weight must be between 10 and 1000")
+    return int(weight)
+
+def validate_pids_limit(limit):
+    if int(limit) < 1:
+        raise argparse.ArgumentTypeError("pids limit must be at least 1")
+    return int(limit)
+
+def validate_size(size):
+    parse_size(size)
+    return str(size)
+
+def validate_net_rate(rate):
+    """A tc rate such as 100mbit or 512kbit"""
+    if not re.fullmatch(r'\d+(\.\d+)?[kmg]?bit', str(rate)):
+        raise argparse.ArgumentTypeError(f"Invalid network rate: {rate} (use e.g. 512kbit, 100mbit, 1gbit)")
+    return str(rate)
+
+def validate_limits(limits):
+    """Check per-VM limits and drop unset ones"""
+    checks = {
+        'io_weight': validate_io_weight,
+        'io_read_bps': validate_size,
+        'io_write_bps': validate_size,
+        'pids_limit': validate_pids_limit,
+        'net_rate': validate_net_rate,
+    }
+    try:
+        return {key: checks[key](value) for key, value in (limits or {}).items() if value is not None}
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def cli_limits(args):
+    """Per-VM limits given on the command line, the defaults for every pool"""
+    return {key: getattr(args, key, None) for key in LIMIT_KEYS if getattr(args, key, None) is not None}
+
+def validate_vm_group(spec):
+    """Parse NAME=1,2 into (name, [1, 2]); members are VM numbers"""
+    name, _, members = spec.partition('=')
+    if not re.fullmatch(r'[A-Za-z0-9_-]+', name) or not members:
+        raise argparse.ArgumentTypeError(f"Invalid VM group: {spec} (use e.g. redteam=1,2)")
+    try:
+        indices = sorted({int(m) for m in members.split(',')})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid VM group members: {members} (use VM numbers, e.g. 1,2)")
+    if len(indices) < 2:
+        raise argparse.ArgumentTypeError(f"VM group {name} needs at least two VMs")
+    return name, indices
+
+def build_vm_groups(groups, num_containers):
+    """Map each grouped VM number to its group's name and members"""
+    by_vm = {}
+    for name, indices in groups or []:
+        for i in indices:
+            if not 1 <= i <= num_containers:
+                raise argparse.ArgumentTypeError(f"VM group {name}: there is no VM {i}")
+            if i in by_vm:
+                raise argparse.ArgumentTypeError(f"VM {i} is in both {by_vm[i]['name']} and {name}")
+            by_vm[i] = {'name': name, 'members': indices}
+    return by_vm
+
+def load_pools(path, defaults=None):
+    """
+    Read a pools file: a list of VM pools, each with its own image and size
+
+        pools:
+          - name: windows
+            count: 2
+            boot_image: windows
+            base_image: win.qcow2  # overlay mode: source of this boot image's base
+            ram_size: 8G
+            cpu_cores: 4
+            capacity: 1          # most VMs of the pool in use at once
+            io_weight: 200
+          - name: kali
+            count: 10
+            net_rate: 50mbit
+            groups:
+              redteam: [1, 2]
+
+    Unset fields take the command-line defaults (limits from `defaults`);
+    prefix defaults to the name.
+    """
+    try:
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+    except yaml.YAMLError as e:
+        raise argparse.ArgumentTypeError(f"Invalid pools file {path}: {e}")
+    entries = data.get('pools') if isinstance(data, dict) else None
+    if not entries or not isinstance(entries, list):
+        raise argparse.ArgumentTypeError(f"Pools file {path} needs a non-empty 'pools' list")
+    pools = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('name'):
+            raise argparse.ArgumentTypeError("Every pool needs a name")
+        unknown = set(entry) - POOL_KEYS
+        if unknown:
+            raise argparse.ArgumentTypeError(f"Pool {entry['name']}: unknown keys {', '.join(sorted(unknown))}")
+        groups = [validate_vm_group(f"{name}={','.join(str(m) for m in members)}")
+                  for name, members in (entry.get('groups') or {}).items()]
+        pools.append(make_pool(
+            name=str(entry['name']),
+            count=validate_container_count(entry.get('count', DEFAULT_CONTAINERS)),
+            boot_image=str(entry.get('boot_image', DEFAULT_BOOT_IMAGE)),
+            boot_mode=validate_boot_mode(entry.get('boot_mode', DEFAULT_BOOT_MODE)),
+            ram_size=str(entry.get('ram_size', DEFAULT_RAM_SIZE)),
+            cpu_cores=str(entry.get('cpu_cores', DEFAULT_CPU_CORES)),
+            prefix=entry.get('prefix'),
+            capacity=entry.get('capacity'),
+            groups=groups,
+            base_image=os.path.abspath(str(entry['base_image'])) if entry.get('base_image') else None,
+            limits={**(defaults or {}), **{key: entry[key] for key in LIMIT_KEYS if key in entry}},
+        ))
+    return pools
+
+def make_pool(name, count, boot_image, boot_mode, ram_size, cpu_cores, prefix=None, capacity=None, groups=None,
+              limits=None, base_image=None):
+    """One pool of identical VMs named <prefix>_1 .. <prefix>_<count>"""
+    prefix = prefix or name
+    if not re.fullmatch(r'[A-Za-z0-9_-]+', prefix):
+        raise argparse.ArgumentTypeError(f"Invalid pool prefix: {prefix}")
+    if capacity is not None and (not isinstance(capacity, int) or capacity < 1):
+        raise argparse.ArgumentTypeError(f"Pool {name}: capacity must be a positive number of VMs")
+    try:
+        vm_groups = build_vm_groups(groups, count)
+        limits = validate_limits(limits)
+    except argparse.ArgumentTypeError as e:
+        raise argparse.ArgumentTypeError(f"Pool {name}: {e}")
+    return {
+        'name': name,
+        'prefix': prefix,
+        'count': count,
+        'boot_image': boot_image,
+        'base_image': base_image,
+        'boot_mode': boot_mode,
+        'ram_size': ram_size,
+        'cpu_cores': cpu_cores,
+        'capacity': capacity,
+        'groups': vm_groups,
+        'limits': limits,
+    }
+
+def build_pools(args):
+    """The pools to render: from --pools-file, or one pool from the single-image options"""
+    if getattr(args, 'pools_file', None):
+        if getattr(args, 'vm_group', None):
+            raise argparse.ArgumentTypeError("--vm-group numbers the VMs of a single pool; declare groups in the pools file")
+        pools = load_pools(args.pools_file, cli_limits(args))
+    else:
+        prefix = args.prefix if args.prefix else args.boot_image
+        pools = [make_pool(prefix, args.num_containers, args.boot_image, args.boot_mode, args.ram_size,
+                           args.cpu_cores, groups=getattr(args, 'vm_group', None), limits=cli_limits(args))]
+    throttled = [pool['name'] for pool in pools if {'io_read_bps', 'io_write_bps'} & set(pool['limits'])]
+    if throttled and not getattr(args, 'io_device', None):
+        raise argparse.ArgumentTypeError(f"IO throttles (pool {throttled[0]}) need --io-device, the host disk holding VM storage")
+    seen = set()
+    for pool in pools:
+        if pool['name'] in seen or pool['prefix'] in seen:
+            raise argparse.ArgumentTypeError(f"Pool names and prefixes must be unique: {pool['name']}")
+        seen.update({pool['name'], pool['prefix']})
+    total = sum(pool['count'] for pool in pools)
+    if total > MAX_CONTAINERS:
+        raise argparse.ArgumentTypeError(f"Pools hold {total} containers; at most {MAX_CONTAINERS} are supported")
+    return pools
+
 def validate_volume_path(path):
     # Convert to absolute path if relative
     if path == '.':
@@ -43,6 +308,38 @@ def validate_file_path(path):
         raise argparse.ArgumentTypeError(f"File does not exist: {abs_path}")
     return abs_path
 
+def overlay_sources(pools, base_image):
+    """
+    Source disk image of each boot image's shared base in overlay mode:
+    a pool's own base_image, else --base-image when all pools boot the same image
+    """
+    boot_images = {pool['boot_image'] for pool in pools}
+    sources = {}
+    for pool in pools:
+        source = pool.get('base_image')
+        if source:
+            source = validate_file_path(source)
+        elif len(boot_images) > 1:
+            raise argparse.ArgumentTypeError(
+                f"Pool {pool['name']}: pools boot several images, so overlay mode needs a base_image per pool"
+            )
+        else:
+            source = base_image
+        if not source:
+            raise argparse.ArgumentTypeError("--disk-mode overlay requires --base-image")
+        if sources.setdefault(pool['boot_image'], source) != source:
+            raise argparse.ArgumentTypeError(
+                f"Pools booting {pool['boot_image']} share one base, so they need the same base_image"
+            )
+    return sources
+
+def validate_overlay_config(args):
+    """Validate that overlay disk mode has a base image for every pool to share"""
+    if getattr(args, 'disk_mode', DEFAULT_DISK_MODE) == 'overlay':
+        overlay_sources(build_pools(args), getattr(args, 'base_image', None))
+    if getattr(args, 'disk_mode', DEFAULT_DISK_MODE) == 'overlay' and getattr(args, 'image_cache', None):
+        raise argparse.ArgumentTypeError("--image-cache cannot be combined with --disk-mode overlay, which boots from the base image")
+
 def validate_tls_config(args):
     """Validate TLS configuration when using remote Docker host"""
     if args.docker_host and not all([args.docker_ca, args.docker_cert, args.docker_key]):
@@ -200,13 +497,55 @@ def get_user_input():
 def show_config_summary(args):
     print("\n🔧 Current Configuration:")
     print("------------------------")
-    print(f"📦 Containers: {args.num_containers}")
-    print(f"🏷️  Prefix: {args.prefix if args.prefix else args.boot_image}")
-    print(f"💾 Boot Mode: {args.boot_mode}")
-    print(f"🖼️  Boot Image: {args.boot_image}")
-    print(f"🧠 RAM: {args.ram_size}")
-    print(f"⚡ CPU Cores: {args.cpu_cores}")
+    if getattr(args, 'pools_file', None):
+        print(f"🏊 Pools File: {args.pools_file}")
+        for pool in load_pools(args.pools_file, cli_limits(args)):
+            capacity = f", at most {pool['capacity']} in use" if pool['capacity'] else ""
+            print(f"   - {pool['name']}: {pool['count']} × {pool['boot_image']} "
+                  f"({pool['ram_size']} RAM, {pool['cpu_cores']} cores, {pool['boot_mode']}{capacity})")
+    else:
+        print(f"📦 Containers: {args.num_containers}")
+        print(f"🏷️  Prefix: {args.prefix if args.prefix else args.boot_image}")
+        print(f"💾 Boot Mode: {args.boot_mode}")
+        print(f"🖼️  Boot Image: {args.boot_image}")
+        print(f"🧠 RAM: {args.ram_size}")
+        print(f"⚡ CPU Cores: {args.cpu_cores}")
     print(f"📂 Volume Path: {args.volume_prefix}")
+    if getattr(args, 'disk_mode', DEFAULT_DISK_MODE) == 'overlay':
+        print(f"🧬 Disk Mode: overlay (base: {args.base_image or 'per pool'})")
+    if getattr(args, 'snapshot', False):
+        print("💤 Snapshot Resume: enabled")
+    if getattr(args, 'stand_in', False):
+        print("🎭 VM Image: stand-in imitating QEMU boot delays (no KVM needed)")
+    if getattr(args, 'storage_backend', DEFAULT_STORAGE_BACKEND) != DEFAULT_STORAGE_BACKEND:
+        print(f"🗄️  Storage Backend: {args.storage_backend}")
+    if getattr(args, 'image_cache', None):
+        print(f"📀 Boot Image Cache: {args.image_cache} (mounted read-only)")
+    if getattr(args, 'tmpfs_budget', None):
+        print(f"🧮 tmpfs Budget: {args.tmpfs_budget}")
+    if getattr(args, 'session_affinity', False):
+        print("🍪 Session Affinity: lock holders bypass Sablier")
+    if getattr(args, 'enforce_locks', False):
+        print("🛡️  Lock Enforcement: only lock holders can reach a VM")
+    if getattr(args, 'lock_replicas', 1) > 1:
+        print(f"🔁 container-lock Replicas: {args.lock_replicas}")
+    if getattr(args, 'cpu_pinning', False):
+        print(f"📌 CPU Pinning: one NUMA node per VM ({getattr(args, 'topology', None) or 'this host'})")
+    if getattr(args, 'hugepages', False):
+        print("🗜️  Hugepages: guest memory backed by /dev/hugepages")
+    limits = cli_limits(args)
+    if limits:
+        print(f"🚦 VM Limits: {', '.join(f'{key}={value}' for key, value in limits.items())}")
+    if getattr(args, 'fairness', False):
+        print("⚖️  Fairness: heavy IO and network users are throttled at runtime")
+    if getattr(args, 'idle_timeout', None) is not None:
+        print(f"😴 Idle Timeout: {args.idle_timeout}s" if args.idle_timeout else "😴 Idle Timeout: disabled")
+    for name, indices in getattr(args, 'vm_group', None) or []:
+        print(f"👥 VM Group {name}: VMs {', '.join(str(i) for i in indices)}")
+    if getattr(args, 'prewarm', False):
+        print("🔮 Predictive Pre-warm: warm pool sized from session history")
+    if getattr(args, 'admin_token', None):
+        print("📅 Reservations: enabled (admin token set)")
     
     # TLS Docker configuration
     if args.docker_host:
@@ -243,18 +582,136 @@ def render_templates(args):
     # Setup Jinja2 environment
     env = Environment(loader=FileSystemLoader('templates'))
     
-    # Use custom prefix or boot image name
-    container_prefix = args.prefix if args.prefix else args.boot_image
+    # VM pools (one unless --pools-file is given); groups within a pool wake together
+    try:
+        pools = build_pools(args)
+    except argparse.ArgumentTypeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    names = [f"{pool['prefix']}_{i}" for pool in pools for i in range(1, pool['count'] + 1)]
+    
+    # Overlay disks: one read-only base image per boot image, one thin qcow2 overlay per VM
+    disk_mode = getattr(args, 'disk_mode', DEFAULT_DISK_MODE)
+    storage_root = overlay.get_storage_root(args.volume_prefix)
+    base_sources = {}
+    if disk_mode == 'overlay':
+        try:
+            base_sources = overlay_sources(pools, getattr(args, 'base_image', None))
+        except argparse.ArgumentTypeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    for pool in pools:
+        pool['base_image_path'] = overlay.base_image_path(storage_root, pool['boot_image'])
+        if disk_mode == 'overlay':
+            pool_names = [f"{pool['prefix']}_{i}" for i in range(1, pool['count'] + 1)]
+            try:
+                created = overlay.prepare_overlays(storage_root, pool['boot_image'], base_sources[pool['boot_image']],
+                                                   pool_names)
+            except overlay.OverlayError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            print(f"🧬 Prepared {len(created)} new overlay(s) in {storage_root}")
+    
+    # Boot images prefetched once into a shared cache, mounted read-only instead of downloaded per VM
+    image_cache = getattr(args, 'image_cache', None)
+    for pool in pools:
+        pool['boot_file'] = None
+        if image_cache:
+            entry = prefetch.cached_image(os.path.abspath(image_cache), pool['boot_image'])
+            if not entry:
+                print(f"❌ Boot image {pool['boot_image']} is not in {image_cache}; run prefetch.py images first")
+                sys.exit(1)
+            pool['boot_file'] = {'path': entry['path'], 'target': entry['boot_file']}
+    
+    # RAM-backed storage: size kali tmpfs volumes from the image footprint and budget
+    storage_backend = getattr(args, 'storage_backend', DEFAULT_STORAGE_BACKEND)
+    tmpfs_pools = [
+        pool for pool in pools
+        if pool['boot_image'] == 'kali' and disk_mode != 'overlay' and storage_backend == 'tmpfs'
+    ]
+    if getattr(args, 'snapshot', False) and tmpfs_pools:
+        # Docker unmounts a tmpfs volume when its container stops, taking the qcow2 and its snapshot along
+        print(f"❌ --snapshot needs persistent VM storage, but {', '.join(p['name'] for p in tmpfs_pools)} "
+              f"keep theirs in tmpfs; add --storage-backend sparse")
+        sys.exit(1)
+    for pool in pools:
+        pool['use_tmpfs'] = pool in tmpfs_pools
+        pool['tmpfs_size'] = DEFAULT_TMPFS_SIZE
+        if pool['use_tmpfs']:
+            # The budget is shared evenly by every tmpfs-backed VM across pools
+            pool['tmpfs_size'], warnings = compute_tmpfs_size(
+                sum(p['count'] for p in tmpfs_pools),
+                pool['boot_image'],
+                budget=getattr(args, 'tmpfs_budget', None),
+                footprint=getattr(args, 'image_footprint', None),
+                host_memory=get_physical_memory(),
+            )
+            for warning in warnings:
+                print(f"⚠️  {warning}")
+    
+    # CPU pinning: every VM gets its own cores on one NUMA node, with matching limits
+    resources = {}
+    if getattr(args, 'cpu_pinning', False):
+        if getattr(args, 'docker_host', None) and not getattr(args, 'topology', None):
+            print("⚠️  Pinning to this machine's CPU topology; pass --topology for the Docker host's")
+        try:
+            nodes = topology.load_topology(args.topology) if getattr(args, 'topology', None) else topology.read_topology()
+            placement = topology.assign_cpusets(nodes, [
+                (f"{pool['prefix']}_{i}", int(pool['cpu_cores'])) for pool in pools for i in range(1, pool['count'] + 1)
+            ])
+            for pool in pools:
+                mem_limit = format_size(parse_size(pool['ram_size']) + parse_size(QEMU_MEMORY_OVERHEAD))
+                for i in range(1, pool['count'] + 1):
+                    node, cpus = placement[f"{pool['prefix']}_{i}"]
+                    resources[f"{pool['prefix']}_{i}"] = {
+                        'node': node,
+                        'cpuset': topology.format_cpulist(cpus),
+                        'cpus': len(cpus),
+                        'mem_limit': mem_limit,
+                    }
+        except (topology.TopologyError, argparse.ArgumentTypeError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"📌 Pinned {len(resources)} VM(s) across {len({r['node'] for r in resources.values()})} NUMA node(s)")
+    
+    # Hugepage-backed guest memory must be reserved on the host beforehand
+    hugepages = getattr(args, 'hugepages', False)
+    if hugepages and not getattr(args, 'docker_host', None):
+        guest_memory = sum(parse_size(pool['ram_size']) * pool['count'] for pool in pools)
+        free = topology.free_hugepages()
+        if free is not None and guest_memory > free:
+            print(f"⚠️  VMs need {format_size(guest_memory)} of hugepages when all are running, "
+                  f"the host has {format_size(free) if free else 'none'} free; reserve more with vm.nr_hugepages")
+    
+    # Session affinity: container-lock signs the lock holder's cookie that skips Sablier
+    affinity_secret = None
+    if getattr(args, 'session_affinity', False):
+        affinity_secret = getattr(args, 'affinity_secret', None) or secrets.token_hex(32)
     
     # Load template variables
     template_vars = {
-        'n': args.num_containers,
-        'boot_mode': args.boot_mode,
-        'boot_image': args.boot_image,
-        'ram_size': args.ram_size,
-        'cpu_cores': args.cpu_cores,
-        'container_prefix': container_prefix,
+        'pools': pools,
+        'names': names,
+        'pool_capacity': {pool['name']: pool['capacity'] for pool in pools if pool['capacity']},
         'volume_prefix': args.volume_prefix,
+        'disk_mode': disk_mode,
+        'storage_root': storage_root,
+        'snapshot': getattr(args, 'snapshot', False),
+        'stand_in': getattr(args, 'stand_in', False),
+        'storage_backend': storage_backend,
+        'use_tmpfs': bool(tmpfs_pools),
+        'resources': resources,
+        'hugepages': hugepages,
+        'hugepage_arguments': HUGEPAGE_ARGUMENTS,
+        'io_device': getattr(args, 'io_device', None),
+        'fairness': getattr(args, 'fairness', False),
+        'affinity_secret': affinity_secret,
+        'session_affinity': bool(affinity_secret),
+        'enforce_locks': getattr(args, 'enforce_locks', False),
+        'lock_replicas': getattr(args, 'lock_replicas', 1),
+        'idle_timeout': getattr(args, 'idle_timeout', None),
+        'admin_token': getattr(args, 'admin_token', None),
+        'prewarm': getattr(args, 'prewarm', False),
         # TLS Docker options (None if not provided)
         'docker_host': getattr(args, 'docker_host', None),
         'docker_ca': getattr(args, 'docker_ca', None),
@@ -280,7 +737,7 @@ def render_templates(args):
     with open('output/Caddyfile', 'w') as f:
         f.write(caddyfile_output)
     
-    print(f"✅ Generated configuration for {args.num_containers} QEMU containers")
+    print(f"✅ Generated configuration for {len(names)} QEMU containers in {len(pools)} pool(s)")
     print(f"📁 Configuration files generated in 'output/' directory")
 
 def main():
@@ -297,8 +754,65 @@ def main():
                       help=f'CPU cores per container (default: {DEFAULT_CPU_CORES})')
     parser.add_argument('--prefix', default=None,
                       help='Custom container name prefix (default: boot image name)')
+    parser.add_argument('--pools-file', type=validate_file_path, default=None,
+                      help='YAML file declaring several VM pools, each with its own count, image, RAM, cores and capacity; '
+                           'replaces -n, --boot-image, --boot-mode, --ram-size, --cpu-cores and --prefix')
     parser.add_argument('--volume-prefix', type=validate_volume_path, default=DEFAULT_VOLUME_PREFIX,
                       help=f'Volume path prefix (default: {DEFAULT_VOLUME_PREFIX})')
+    parser.add_argument('--disk-mode', type=validate_disk_mode, default=DEFAULT_DISK_MODE,
+                      help=f'VM disk layout (default: {DEFAULT_DISK_MODE}, valid: {", ".join(VALID_DISK_MODES)}). '
+                           'overlay shares one read-only base image with a qcow2 overlay per VM')
+    parser.add_argument('--base-image', type=validate_file_path, default=None,
+                      help='Source disk image for the shared base in overlay mode (e.g., /path/to/kali.qcow2)')
+    parser.add_argument('--storage-backend', type=validate_storage_backend, default=DEFAULT_STORAGE_BACKEND,
+                      help=f'Backing for kali VM storage (default: {DEFAULT_STORAGE_BACKEND}, valid: {", ".join(VALID_STORAGE_BACKENDS)}). '
+                           'sparse uses disk-backed sparse files that bypass the host page cache')
+    parser.add_argument('--tmpfs-budget', type=str, default=None,
+                      help='Total RAM for all tmpfs volumes, e.g. 200g (default: 50g per VM)')
+    parser.add_argument('--image-footprint', type=str, default=None,
+                      help='Override the per-VM disk footprint of the boot image used for tmpfs sizing, e.g. 8g')
+    parser.add_argument('--image-cache', default=None,
+                      help='Boot image cache filled by prefetch.py; each VM mounts its boot image from it read-only instead of downloading it')
+    parser.add_argument('--cpu-pinning', action='store_true',
+                      help='Pin every VM to its own CPUs on one NUMA node (cpuset) and set cpus/mem_limit to match')
+    parser.add_argument('--topology', type=validate_file_path, default=None,
+                      help='YAML file mapping NUMA nodes to CPU lists for --cpu-pinning (default: read from /sys/devices/system/node)')
+    parser.add_argument('--hugepages', action='store_true',
+                      help='Back guest memory with hugepages from /dev/hugepages (reserve them on the host first)')
+    parser.add_argument('--io-weight', type=validate_io_weight, default=None,
+                      help='Relative block IO weight of every VM (10-1000)')
+    parser.add_argument('--io-read-bps', default=None,
+                      help='Cap on disk reads per VM, e.g. 100mb (needs --io-device)')
+    parser.add_argument('--io-write-bps', default=None,
+                      help='Cap on disk writes per VM, e.g. 50mb (needs --io-device)')
+    parser.add_argument('--io-device', default=None,
+                      help='Host block device holding VM storage, for IO caps (e.g. /dev/nvme0n1)')
+    parser.add_argument('--pids-limit', type=validate_pids_limit, default=None,
+                      help='Most processes per VM container')
+    parser.add_argument('--net-rate', type=validate_net_rate, default=None,
+                      help='Network bandwidth cap per VM in each direction, e.g. 100mbit (applied by container-lock with tc)')
+    parser.add_argument('--fairness', action='store_true',
+                      help='Let container-lock throttle the IO and network of VMs that stay above its thresholds')
+    parser.add_argument('--session-affinity', action='store_true',
+                      help='Let the lock holder of a healthy VM skip the Sablier check on every request')
+    parser.add_argument('--affinity-secret', default=None,
+                      help='Secret for affinity cookies (default: randomly generated per render)')
+    parser.add_argument('--enforce-locks', action='store_true',
+                      help='Check every VM request against container-lock so only the lock holder can reach a VM')
+    parser.add_argument('--lock-replicas', type=validate_lock_replicas, default=1,
+                      help='Number of container-lock replicas behind Caddy (default: 1); background jobs run on an elected leader')
+    parser.add_argument('--idle-timeout', type=int, default=None,
+                      help='Seconds without user activity or guest CPU load before a session is ended and its VM stopped (0 disables; default: 900)')
+    parser.add_argument('--vm-group', type=validate_vm_group, action='append', default=None, metavar='NAME=1,2',
+                      help='VMs that wake and are locked together, by number (repeatable), e.g. redteam=1,2')
+    parser.add_argument('--prewarm', action='store_true',
+                      help='Keep VMs running ahead of demand forecast from past sessions (same interval of the week)')
+    parser.add_argument('--admin-token', default=None,
+                      help='Bearer token for the container-lock admin API; enables scheduled class reservations')
+    parser.add_argument('--snapshot', action='store_true',
+                      help='Save guest state before a VM is stopped and resume it on the next wake')
+    parser.add_argument('--stand-in', action='store_true',
+                      help='Run a lightweight stand-in that imitates QEMU boot delays instead of qemux/qemu, for benchmarks')
     # TLS / remote Docker options
     parser.add_argument('--docker-host', default=None,
                       help='Remote Docker host, e.g. tcp://host:2376 or tcp://192.168.1.100:2376')
@@ -317,9 +831,14 @@ def main():
     if len(sys.argv) == 1 or not args.non_interactive:
         args = get_user_input()
     
-    # Validate TLS configuration
+    # Validate TLS, overlay and storage configuration
     try:
         validate_tls_config(args)
+        validate_overlay_config(args)
+        build_pools(args)
+        for size in (getattr(args, 'tmpfs_budget', None), getattr(args, 'image_footprint', None)):
+            if size:
+                parse_size(size)
     except argparse.ArgumentTypeError as e:
         parser.error(str(e))
     
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the qemux/qemu VM image, for benchmarking the lab without KVM or
+guest images
+
+It serves what the lab talks to, with QEMU-like delays:
+- the web UI on :8006, with a VNC server behind /websockify that holds back
+  its first frame until the imitated guest has booted (or been resumed)
+- the HMP monitor on QEMU_MONITOR_PORT, answering savevm/loadvm like QEMU
+
+Boot time depends on BOOT and BOOT_MODE like a real guest's would, and
+varies a little from run to run. Every delay can be overridden:
+STARTUP_DELAY, BOOT_DELAY, RESUME_DELAY, SAVE_DELAY (seconds).
+"""
+
+import asyncio
+import base64
+import hashlib
+import os
+import random
+import struct
+import time
+
+WEB_PORT = 8006
+MONITOR_PORT = int(os.environ.get('QEMU_MONITOR_PORT', '7100'))
+
+# Seconds from power-on to a usable desktop, per BOOT image
+BOOT_DELAYS = {'windows': 60, 'kali': 25, 'ubuntu': 20, 'alpine': 5}
+DEFAULT_BOOT_DELAY = 20
+UEFI_EXTRA_DELAY = 5
+JITTER = 0.1
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+FRAME_WIDTH, FRAME_HEIGHT = 64, 48
+
+PAGE = b"""<!DOCTYPE html>
+<html><head><title>noVNC</title></head>
+<body><p>QEMU stand-in: connect to /websockify</p></body></html>
+"""
+
+
+def _delay(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def boot_delay(image, boot_mode):
+    """Seconds this guest takes to boot, with some run-to-run jitter"""
+    delay = BOOT_DELAYS.get(image.lower(), DEFAULT_BOOT_DELAY)
+    if boot_mode.lower() == 'uefi':
+        delay += UEFI_EXTRA_DELAY
+    return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+class Guest:
+    """Boot state of the imitated guest"""
+
+    def __init__(self):
+        image, boot_mode = os.environ.get('BOOT', 'kali'), os.environ.get('BOOT_MODE', 'legacy')
+        self.started = time.monotonic()
+        self.startup_delay = _delay('STARTUP_DELAY', 1.0)
+        self.resume_delay = _delay('RESUME_DELAY', 3.0)
+        self.save_delay = _delay('SAVE_DELAY', 2.0)
+        self.ready_at = self.started + _delay('BOOT_DELAY', boot_delay(image, boot_mode))
+        self.ready = asyncio.Event()
+        self._timer = None
+        self._schedule()
+
+    def _schedule(self):
+        loop = asyncio.get_running_loop()
+        if self._timer:
+            self._timer.cancel()
+        self._timer = loop.call_later(max(0.0, self.ready_at - time.monotonic()), self.ready.set)
+
+    def resume(self):
+        """loadvm: the guest is back after RESUME_DELAY, unless it has already booted"""
+        if not self.ready.is_set():
+            self.ready_at = min(self.ready_at, time.monotonic() + self.resume_delay)
+            self._schedule()
+
+
+class WebSocket:
+    """Server side of a binary WebSocket, read as a byte stream"""
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.buffer = b''
+
+    async def read(self, size):
+        while len(self.buffer) < size:
+            self.buffer += await self._frame()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    async def _frame(self):
+        head = await self.reader.readexactly(2)
+        opcode, length = head[0] & 0x0f, head[1] & 0x7f
+        if length == 126:
+            length, = struct.unpack('!H', await self.reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', await self.reader.readexactly(8))
+        mask = await self.reader.readexactly(4) if head[1] & 0x80 else b'\0\0\0\0'
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await self.reader.readexactly(length)))
+        if opcode == 0x8:
+            raise ConnectionResetError('WebSocket closed by client')
+        return payload if opcode in (0x0, 0x1, 0x2) else b''
+
+    async def send(self, data):
+        if len(data) < 126:
+            head = struct.pack('!BB', 0x82, len(data))
+        elif len(data) < 1 << 16:
+            head = struct.pack('!BBH', 0x82, 126, len(data))
+        else:
+            head = struct.pack('!BBQ', 0x82, 127, len(data))
+        self.writer.write(head + data)
+        await self.writer.drain()
+
+
+async def serve_vnc(ws, guest):
+    """RFB 3.8 without authentication; the first update waits for the guest"""
+    await ws.send(b'RFB 003.008\n')
+    await ws.read(12)
+    await ws.send(b'\x01\x01')  # one security type: None
+    await ws.read(1)
+    await ws.send(struct.pack('!I', 0))
+    await ws.read(1)  # ClientInit
+    name = b'QEMU stand-in'
+    pixel_format = struct.pack('!BBBBHHHBBB3x', 32, 24, 0, 1, 255, 255, 255, 16, 8, 0)
+    await ws.send(struct.pack('!HH', FRAME_WIDTH, FRAME_HEIGHT) + pixel_format + struct.pack('!I', len(name)) + name)
+    message_sizes = {0: 19, 2: 3, 3: 9, 4: 7, 5: 5}
+    while True:
+        message_type = (await ws.read(1))[0]
+        if message_type == 2:  # SetEncodings
+            count, = struct.unpack('!xH', await ws.read(3))
+            await ws.read(4 * count)
+        elif message_type == 6:  # ClientCutText
+            length, = struct.unpack('!3xI', await ws.read(7))
+            await ws.read(length)
+        elif message_type == 3:  # FramebufferUpdateRequest
+            await ws.read(9)
+            await guest.ready.wait()
+            rect = struct.pack('!HHHHi', 0, 0, FRAME_WIDTH, FRAME_HEIGHT, 0)
+            await ws.send(struct.pack('!BxH', 0, 1) + rect + bytes(FRAME_WIDTH * FRAME_HEIGHT * 4))
+        elif message_type in message_sizes:
+            await ws.read(message_sizes[message_type])
+        else:
+            raise ConnectionResetError(f'Unknown RFB message {message_type}')
+
+
+async def handle_web(reader, writer, guest):
+    try:
+        request = (await reader.readuntil(b'\r\n\r\n')).decode(errors='replace').split('\r\n')
+        path = request[0].split(' ')[1] if len(request[0].split(' ')) > 1 else '/'
+        headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(':') for line in request[1:] if line)}
+        if path.startswith('/websockify') and headers.get('upgrade', '').lower() == 'websocket':
+            accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WS_GUID).encode()).digest())
+            protocol = b'Sec-WebSocket-Protocol: binary\r\n' if 'binary' in headers.get('sec-websocket-protocol', '') else b''
+            writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                         b'Sec-WebSocket-Accept: ' + accept + b'\r\n' + protocol + b'\r\n')
+            await writer.drain()
+            await serve_vnc(WebSocket(reader, writer), guest)
+        else:
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: %d\r\n'
+                         b'Connection: close\r\n\r\n' % len(PAGE) + PAGE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError, asyncio.LimitOverrunError, KeyError):
+        pass
+    finally:
+        writer.close()
+
+
+async def handle_monitor(reader, writer, guest):
+    """Enough of the HMP monitor for container-lock's snapshot commands"""
+    try:
+        writer.write(b'QEMU 9.0.0 monitor - type \'help\' for more information\r\n(qemu) ')
+        await writer.drain()
+        while line := (await reader.readline()).decode(errors='replace').strip():
+            command = line.split()[0]
+            if command == 'savevm':
+                await asyncio.sleep(guest.save_delay)
+            elif command == 'loadvm':
+                guest.resume()
+            elif command == 'info' and line.split()[1:] == ['status']:
+                writer.write(b'VM status: running\r\n')
+            writer.write(b'(qemu) ')
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def main():
+    guest = Guest()
+    monitor = await asyncio.start_server(lambda r, w: handle_monitor(r, w, guest), '0.0.0.0', MONITOR_PORT)
+    await asyncio.sleep(guest.startup_delay)
+    web = await asyncio.start_server(lambda r, w: handle_web(r, w, guest), '0.0.0.0', WEB_PORT)
+    print(f"Stand-in guest up on :{WEB_PORT}, desktop in {max(0.0, guest.ready_at - time.monotonic()):.1f}s", flush=True)
+    async with monitor, web:
+        await asyncio.gather(monitor.serve_forever(), web.serve_forever())
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -51,4 +51,101 @@ def test_kali_uses_tmpfs_named_volumes(tmp_path):
             assert driver_opts.get('o') == 'size=50g'
     finally:
         if os.path.isdir('output'):
-            shutil.rmtree('output') 
\ No newline at end of file
+            shutil.rmtree('output') 
+
+def test_tmpfs_budget_sizes_volumes_from_footprint(monkeypatch):
+    import render
+    monkeypatch.setattr(render, 'get_physical_memory', lambda: 16 * 1024 ** 3)
+    args = SimpleNamespace(
+        num_containers=4,
+        boot_mode='legacy',
+        boot_image='kali',
+        ram_size='2G',
+        cpu_cores='2',
+        prefix=None,
+        volume_prefix='.',
+        tmpfs_budget='20g',
+        docker_host=None,
+        docker_ca=None,
+        docker_cert=None,
+        docker_key=None,
+        force=True,
+    )
+
+    try:
+        render_templates(args)
+        with open(os.path.join('output', 'docker-compose.yml'), 'r') as f:
+            data = yaml.safe_load(f)
+        # 6g footprint * 1.25 headroom = 7.5g wanted, capped at 20g / 4 = 5g
+        for i in range(1, 5):
+            assert data['volumes'][f'kali_{i}']['driver_opts']['o'] == 'size=5g'
+    finally:
+        if os.path.isdir('output'):
+            shutil.rmtree('output')
+
+
+def test_compute_tmpfs_size_warnings():
+    from render import compute_tmpfs_size
+    size, warnings = compute_tmpfs_size(2, 'kali', budget='100g', host_memory=8 * 1024 ** 3)
+    assert size == '7680m'
+    assert len(warnings) == 1 and 'physical memory' in warnings[0]
+
+    size, warnings = compute_tmpfs_size(10, 'kali', budget='20g', footprint='4g')
+    assert size == '2g'
+    assert any('footprint' in w for w in warnings)
+
+
+def test_default_tmpfs_size_warns_beyond_host_memory(monkeypatch, capsys):
+    import render
+    monkeypatch.setattr(render, 'get_physical_memory', lambda: 64 * 1024 ** 3)
+    args = SimpleNamespace(
+        num_containers=20,
+        boot_mode='legacy',
+        boot_image='kali',
+        ram_size='2G',
+        cpu_cores='2',
+        prefix=None,
+        volume_prefix='.',
+        docker_host=None,
+        docker_ca=None,
+        docker_cert=None,
+        docker_key=None,
+        force=True,
+    )
+    try:
+        render_templates(args)
+    finally:
+        shutil.rmtree('output', ignore_errors=True)
+    # 20 VMs at the fixed 50g each
+    assert "tmpfs volumes may use 1000g, more than the host's 64g of physical memory" in capsys.readouterr().out
+
+
+def test_sparse_backend_uses_disk_with_page_cache_bypass():
+    args = SimpleNamespace(
+        num_containers=1,
+        boot_mode='legacy',
+        boot_image='kali',
+        ram_size='2G',
+        cpu_cores='2',
+        prefix=None,
+        volume_prefix='.',
+        storage_backend='sparse',
+        docker_host=None,
+        docker_ca=None,
+        docker_cert=None,
+        docker_key=None,
+        force=True,
+    )
+
+    try:
+        render_templates(args)
+        with open(os.path.join('output', 'docker-compose.yml'), 'r') as f:
+            data = yaml.safe_load(f)
+        svc = data['services']['kali_1']
+        assert './kali_1:/storage:rw' in svc['volumes']
+        assert svc['environment']['ALLOCATE'] == 'N'
+        assert svc['environment']['DISK_CACHE'] == 'none'
+        assert 'kali_1' not in (data.get('volumes') or {})
+    finally:
+        if os.path.isdir('output'):
+            shutil.rmtree('output')
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import shutil
+import threading
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from types import SimpleNamespace
+import pytest
+import yaml
+import prefetch
+from render import render_templates
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    """Local HTTP stand-in for the boot image mirrors; records the paths fetched"""
+    root = tmp_path / 'mirror'
+    root.mkdir()
+    (root / 'kali.iso').write_bytes(b'kali' * 1000)
+    (root / 'ubuntu.qcow2').write_bytes(b'ubuntu' * 1000)
+    requests_seen = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.path)
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), partial(Handler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield SimpleNamespace(url=f'http://127.0.0.1:{server.server_port}', requests=requests_seen)
+    server.shutdown()
+
+
+def test_each_boot_image_is_downloaded_once_and_content_addressed(tmp_path, mirror):
+    cache = tmp_path / 'cache'
+    sources = {
+        'kali': {'url': f'{mirror.url}/kali.iso', 'sha256': None},
+        'kali-lab': {'url': f'{mirror.url}/kali.iso', 'sha256': None},
+        'ubuntu': {'url': f'{mirror.url}/ubuntu.qcow2', 'sha256': hashlib.sha256(b'ubuntu' * 1000).hexdigest()},
+    }
+    results = prefetch.prefetch_images(str(cache), sources)
+    assert [r['downloaded'] for r in results] == [True, True, True]
+    assert sorted(mirror.requests) == ['/kali.iso', '/ubuntu.qcow2']
+
+    kali = prefetch.cached_image(str(cache), 'kali')
+    assert kali['sha256'] == hashlib.sha256(b'kali' * 1000).hexdigest()
+    assert kali['path'] == prefetch.cached_image(str(cache), 'kali-lab')['path']
+    assert kali['boot_file'] == '/boot.iso'
+    assert prefetch.cached_image(str(cache), 'ubuntu')['boot_file'] == '/boot.qcow2'
+    assert os.stat(kali['path']).st_mode & 0o777 == 0o444
+    assert sorted(os.listdir(cache / 'sha256')) == sorted({r['sha256'] for r in results})
+
+    results = prefetch.prefetch_images(str(cache), sources)
+    assert not any(r['downloaded'] for r in results)
+    assert len(mirror.requests) == 2
+
+
+def test_checksum_mismatch_leaves_nothing_cached(tmp_path, mirror):
+    cache = tmp_path / 'cache'
+    with pytest.raises(prefetch.PrefetchError, match='expected'):
+        prefetch.prefetch_images(str(cache), {'kali': {'url': f'{mirror.url}/kali.iso', 'sha256': '0' * 64}})
+    assert os.listdir(cache / 'sha256') == []
+    assert prefetch.cached_image(str(cache), 'kali') is None
+    with pytest.raises(prefetch.PrefetchError, match='Cannot download'):
+        prefetch.prefetch_images(str(cache), {'kali': {'url': f'{mirror.url}/missing.iso', 'sha256': None}})
+
+
+def test_sources_file_and_parallel_pulls(tmp_path, monkeypatch):
+    sources = tmp_path / 'images.yml'
+    sources.write_text(yaml.safe_dump({'images': {'kali': 'http://mirror/kali.iso', 'win': {'url': 'http://mirror/win.iso', 'sha256': 'AB'}}}))
+    assert prefetch.load_sources(str(sources)) == {
+        'kali': {'url': 'http://mirror/kali.iso', 'sha256': None},
+        'win': {'url': 'http://mirror/win.iso', 'sha256': 'ab'},
+    }
+    compose = tmp_path / 'docker-compose.yml'
+    compose.write_text(yaml.safe_dump({'services': {
+        'caddy': {'build': {'context': '..'}},
+        'kali_1': {'image': 'qemux/qemu'},
+        'kali_2': {'image': 'qemux/qemu'},
+        'redis': {'image': 'redis:7.2-alpine'},
+    }}))
+    images = prefetch.compose_images(str(compose))
+    assert images == ['qemux/qemu', 'redis:7.2-alpine']
+
+    barrier = threading.Barrier(len(images), timeout=5)
+
+    def fake_run(cmd, **kwargs):
+        # Both pulls must be in flight at once to pass the barrier
+        barrier.wait()
+        if cmd[-1] == 'redis:7.2-alpine':
+            raise prefetch.subprocess.CalledProcessError(1, cmd, stderr='not found')
+
+    monkeypatch.setattr(prefetch.subprocess, 'run', fake_run)
+    assert prefetch.pull_images(images) == {'redis:7.2-alpine': 'docker pull redis:7.2-alpine failed: not found'}
+
+
+def test_render_mounts_cached_boot_image_read_only(tmp_path, mirror):
+    cache = tmp_path / 'cache'
+    prefetch.prefetch_images(str(cache), {'kali': {'url': f'{mirror.url}/kali.iso', 'sha256': None}})
+    args = SimpleNamespace(
+        num_containers=2, boot_mode='legacy', boot_image='kali', ram_size='2G', cpu_cores='2', prefix=None,
+        volume_prefix='.', docker_host=None, docker_ca=None, docker_cert=None, docker_key=None, force=True,
+        image_cache=str(cache),
+    )
+    try:
+        render_templates(args)
+        with open(os.path.join('output', 'docker-compose.yml')) as f:
+            compose = yaml.safe_load(f)
+    finally:
+        shutil.rmtree('output', ignore_errors=True)
+    blob = prefetch.cached_image(str(cache), 'kali')['path']
+    for name in ('kali_1', 'kali_2'):
+        assert f'{blob}:/boot.iso:ro' in compose['services'][name]['volumes']
@@ -0,0 +1,202 @@
+import argparse
+import os
+import shutil
+from types import SimpleNamespace
+import pytest
+from render import render_templates, validate_vm_group, build_vm_groups, load_pools
+
+
+def make_args(**overrides):
+    args = dict(
+        num_containers=2,
+        boot_mode='legacy',
+        boot_image='kali',
+        ram_size='2G',
+        cpu_cores='2',
+        prefix=None,
+        volume_prefix='.',
+        docker_host=None,
+        docker_ca=None,
+        docker_cert=None,
+        docker_key=None,
+        force=True,
+    )
+    args.update(overrides)
+    return SimpleNamespace(**args)
+
+
+def render_caddyfile(args):
+    try:
+        render_templates(args)
+        with open(os.path.join('output', 'Caddyfile'), 'r') as f:
+            caddyfile = f.read()
+        with open(os.path.join('output', 'docker-compose.yml'), 'r') as f:
+            compose = f.read()
+        return caddyfile, compose
+    finally:
+        if os.path.isdir('output'):
+            shutil.rmtree('output')
+
+
+def test_default_routes_always_use_sablier():
+    caddyfile, _ = render_caddyfile(make_args())
+    assert 'sablier http://sablier:10000 {' in caddyfile
+    assert 'vm_affinity_' not in caddyfile
+
+
+def test_session_affinity_skips_sablier_for_cookie_holders():
+    caddyfile, compose = render_caddyfile(make_args(session_affinity=True, affinity_secret='s3cret'))
+    for name in ['kali_1', 'kali_2']:
+        assert f'@{name}_affinity header Cookie *vm_affinity_{name}=*' in caddyfile
+        assert f'uri /affinity?vm={name}' in caddyfile
+        assert f'sablier @{name}_cold http://sablier:10000 {{' in caddyfile
+    # No cookie value is baked in: container-lock checks it, and clients cannot forge its verdict
+    assert 's3cret' not in caddyfile
+    assert 'request_header -X-VM-Affinity' in caddyfile
+    assert 'copy_headers X-VM-Affinity' in caddyfile
+    assert 'not header X-VM-Affinity 1' in caddyfile
+    assert 'AFFINITY_SECRET: "s3cret"' in compose
+
+
+def test_session_affinity_with_enforced_locks_reuses_authz():
+    caddyfile, _ = render_caddyfile(make_args(session_affinity=True, affinity_secret='s3cret', enforce_locks=True))
+    assert 'uri /affinity?vm=' not in caddyfile
+    assert caddyfile.count('copy_headers X-VM-Affinity') == 2
+
+
+def test_enforce_locks_adds_forward_auth_per_vm():
+    caddyfile, _ = render_caddyfile(make_args(enforce_locks=True))
+    for name in ['kali_1', 'kali_2']:
+        assert f'uri /authz?vm={name}' in caddyfile
+    # forward_auth must run before Sablier can wake the VM
+    assert caddyfile.index('forward_auth container-lock:8000') < caddyfile.index('sablier http://sablier:10000')
+
+
+def test_forward_auth_passes_the_client_address_without_port():
+    caddyfile, _ = render_caddyfile(make_args(enforce_locks=True))
+    block = caddyfile[caddyfile.index('forward_auth container-lock:8000'):caddyfile.index('uri strip_prefix')]
+    # {remote} is host:port, which would not parse as the client IP behind the lock
+    assert 'header_up X-Real-IP {remote_host}\n' in block
+    assert 'header_up X-Forwarded-For {remote_host}\n' in block
+
+
+def test_single_lock_replica_uses_fixed_upstream():
+    caddyfile, compose = render_caddyfile(make_args())
+    assert 'reverse_proxy container-lock:8000 {' in caddyfile
+    assert 'container_lock_upstream' not in caddyfile
+    assert '"8000:8000"' in compose
+    assert 'SERVICE_REPLICAS' not in compose
+
+
+def test_lock_replicas_balance_across_dynamic_upstreams():
+    caddyfile, compose = render_caddyfile(make_args(lock_replicas=3, enforce_locks=True))
+    assert 'dynamic a container-lock 8000' in caddyfile
+    assert 'lb_policy least_conn' in caddyfile
+    assert 'container-lock:8000' not in caddyfile
+    # Root, fallback and every forward_auth block share the upstream snippet
+    assert caddyfile.count('import container_lock_upstream') == 2 + 2
+    assert 'replicas: 3' in compose
+    assert 'SERVICE_REPLICAS: "3"' in compose
+    # Replicas cannot share a host port
+    assert '"8000:8000"' not in compose
+
+
+def test_idle_timeout_is_passed_to_container_lock():
+    _, compose = render_caddyfile(make_args(idle_timeout=300))
+    assert 'IDLE_TIMEOUT: "300"' in compose
+    _, compose = render_caddyfile(make_args())
+    assert 'IDLE_TIMEOUT' not in compose
+
+
+def test_access_log_is_shared_with_container_lock():
+    caddyfile, compose = render_caddyfile(make_args())
+    assert 'log access {' in caddyfile
+    assert 'ACCESS_LOG_PATH: "/var/log/caddy/access.log"' in compose
+    assert 'caddy_logs:/var/log/caddy:ro' in compose
+
+
+def test_admin_token_enables_reservations():
+    _, compose = render_caddyfile(make_args(admin_token='s3cret'))
+    assert 'ADMIN_TOKEN: "s3cret"' in compose
+    _, compose = render_caddyfile(make_args())
+    assert 'ADMIN_TOKEN' not in compose
+
+
+def test_prewarm_enables_warm_pool():
+    _, compose = render_caddyfile(make_args(prewarm=True))
+    assert 'DEMAND_PREWARM: "true"' in compose
+
+
+def test_vm_group_members_share_one_sablier_session():
+    caddyfile, compose = render_caddyfile(make_args(num_containers=3, vm_group=[('redteam', [1, 2])]))
+    assert caddyfile.count('names kali_1 kali_2\n') == 2
+    assert 'names kali_3\n' in caddyfile
+    assert compose.count('lab.group=redteam') == 2
+
+
+def test_vm_group_spec_is_validated():
+    assert validate_vm_group('redteam=2,1') == ('redteam', [1, 2])
+    for spec in ('redteam', 'red team=1,2', 'redteam=1', 'redteam=a,b'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            validate_vm_group(spec)
+    with pytest.raises(argparse.ArgumentTypeError):
+        build_vm_groups([('a', [1, 2]), ('b', [2, 3])], 3)
+    with pytest.raises(argparse.ArgumentTypeError):
+        build_vm_groups([('a', [1, 9])], 3)
+
+
+def test_pools_file_renders_heterogeneous_pools(tmp_path):
+    pools_file = tmp_path / 'pools.yml'
+    pools_file.write_text(
+        "pools:\n"
+        "  - name: win\n"
+        "    count: 1\n"
+        "    boot_image: windows\n"
+        "    ram_size: 8G\n"
+        "    cpu_cores: 4\n"
+        "    capacity: 1\n"
+        "  - name: kali\n"
+        "    count: 2\n"
+        "    groups:\n"
+        "      redteam: [1, 2]\n"
+    )
+    caddyfile, compose = render_caddyfile(make_args(pools_file=str(pools_file)))
+    assert '@containers path /vm/win_1 /vm/kali_1 /vm/kali_2\n' in caddyfile
+    assert 'route /vm/win_1/* {' in caddyfile
+    assert caddyfile.count('names kali_1 kali_2\n') == 2
+    assert 'RAM_SIZE: "8G"' in compose and 'RAM_SIZE: "2G"' in compose
+    assert compose.count('lab.pool=kali') == 2 and compose.count('lab.pool=win') == 1
+    assert """POOL_CAPACITY: '{"win": 1}'""" in compose
+    # Only the kali pool is tmpfs-backed
+    assert '  kali_1:\n    driver: local' in compose
+    assert '  win_1:\n    driver: local' not in compose
+
+
+def test_pools_file_is_validated(tmp_path):
+    pools_file = tmp_path / 'pools.yml'
+    for content in ("pools: []\n", "pools:\n  - count: 2\n", "pools:\n  - name: a\n    size: 2\n",
+                    "pools:\n  - name: a\n    capacity: 0\n"):
+        pools_file.write_text(content)
+        with pytest.raises(argparse.ArgumentTypeError):
+            load_pools(str(pools_file))
+
+
+def test_io_and_network_limits_have_per_pool_overrides(tmp_path):
+    pools_file = tmp_path / 'pools.yml'
+    pools_file.write_text(
+        "pools:\n"
+        "  - name: win\n"
+        "    count: 1\n"
+        "    io_weight: 500\n"
+        "    net_rate: 1gbit\n"
+        "  - name: kali\n"
+        "    count: 1\n"
+    )
+    _, compose = render_caddyfile(make_args(pools_file=str(pools_file), io_weight=100, io_write_bps='50mb',
+                                            io_device='/dev/sda', pids_limit=512, net_rate='100mbit', fairness=True))
+    win, kali = compose.split('  win_1:')[1].split('  kali_1:')
+    assert 'weight: 500' in win and 'weight: 100' in kali
+    assert 'lab.net_rate=1gbit' in win and 'lab.net_rate=100mbit' in kali
+    assert compose.count('pids_limit: 512') == 2
+    assert compose.count('- path: /dev/sda') == 2
+    assert 'FAIRNESS_ENABLED: "true"' in compose
@@ -0,0 +1,127 @@
+import os
+import pytest
+import shutil
+import yaml
+from types import SimpleNamespace
+import overlay
+from render import render_templates
+
+
+def test_overlay_mode_mounts_overlay_and_shared_base(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(overlay, 'prepare_overlays',
+                        lambda root, image, source, names: calls.append((root, image, source, names)) or names)
+
+    args = SimpleNamespace(
+        num_containers=2,
+        boot_mode='legacy',
+        boot_image='kali',
+        ram_size='2G',
+        cpu_cores='2',
+        prefix=None,
+        volume_prefix=str(tmp_path),
+        disk_mode='overlay',
+        base_image=str(tmp_path / 'kali.img'),
+        docker_host=None,
+        docker_ca=None,
+        docker_cert=None,
+        docker_key=None,
+        force=True,
+    )
+
+    try:
+        render_templates(args)
+        with open(os.path.join('output', 'docker-compose.yml'), 'r') as f:
+            data = yaml.safe_load(f)
+
+        assert calls == [(str(tmp_path), 'kali', str(tmp_path / 'kali.img'), ['kali_1', 'kali_2'])]
+        base = os.path.join(str(tmp_path), 'base', 'kali.qcow2')
+        for name in ['kali_1', 'kali_2']:
+            vols = data['services'][name]['volumes']
+            assert f"{tmp_path}/{name}:/storage:rw" in vols
+            assert f"{tmp_path}/{name}/boot.qcow2:/boot.qcow2:rw" in vols
+            assert f"{base}:{base}:ro" in vols
+        # No per-VM tmpfs volumes in overlay mode
+        assert 'kali_1' not in (data.get('volumes') or {})
+    finally:
+        if os.path.isdir('output'):
+            shutil.rmtree('output')
+
+
+def test_create_overlay_uses_backing_file(tmp_path, monkeypatch):
+    commands = []
+
+    def fake_run(cmd, **kwargs):
+        commands.append(cmd)
+        open(cmd[-1], 'w').close()
+
+    monkeypatch.setattr(overlay.subprocess, 'run', fake_run)
+    base = str(tmp_path / 'base' / 'kali.qcow2')
+    source = str(tmp_path / 'kali.img')
+
+    created = overlay.prepare_overlays(str(tmp_path), 'kali', source, ['kali_1', 'kali_2'])
+    assert created == ['kali_1', 'kali_2']
+    assert commands[0][:4] == [overlay.QEMU_IMG, 'convert', '-O', 'qcow2']
+    assert commands[1][:7] == [overlay.QEMU_IMG, 'create', '-f', 'qcow2', '-F', 'qcow2', '-b']
+    assert commands[1][7] == base
+    assert os.path.exists(overlay.overlay_path(str(tmp_path), 'kali_1'))
+
+    # Existing overlays are kept, reset recreates them
+    commands.clear()
+    assert overlay.prepare_overlays(str(tmp_path), 'kali', source, ['kali_1']) == []
+    assert commands == []
+    overlay.reset_overlay(str(tmp_path), 'kali', 'kali_1')
+    assert len(commands) == 1 and commands[0][1] == 'create'
+
+
+def overlay_args(tmp_path, **kwargs):
+    args = dict(
+        num_containers=1, boot_mode='legacy', boot_image='kali', ram_size='2G', cpu_cores='2', prefix=None,
+        volume_prefix=str(tmp_path), disk_mode='overlay', base_image=None,
+        docker_host=None, docker_ca=None, docker_cert=None, docker_key=None, force=True,
+    )
+    args.update(kwargs)
+    return SimpleNamespace(**args)
+
+
+def test_overlay_mode_gives_each_pool_its_own_base(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(overlay, 'prepare_overlays',
+                        lambda root, image, source, names: calls.append((image, source, names)) or names)
+    (tmp_path / 'kali.img').touch()
+    (tmp_path / 'win.img').touch()
+    pools_file = tmp_path / 'pools.yml'
+    pools_file.write_text(
+        f"pools:\n"
+        f"  - {{name: win, count: 1, boot_image: windows, base_image: {tmp_path / 'win.img'}}}\n"
+        f"  - {{name: kali, count: 2, base_image: {tmp_path / 'kali.img'}}}\n"
+    )
+
+    try:
+        render_templates(overlay_args(tmp_path, pools_file=str(pools_file)))
+        with open(os.path.join('output', 'docker-compose.yml'), 'r') as f:
+            data = yaml.safe_load(f)
+    finally:
+        if os.path.isdir('output'):
+            shutil.rmtree('output')
+
+    assert calls == [
+        ('windows', str(tmp_path / 'win.img'), ['win_1']),
+        ('kali', str(tmp_path / 'kali.img'), ['kali_1', 'kali_2']),
+    ]
+    win_base = os.path.join(str(tmp_path), 'base', 'windows.qcow2')
+    assert f"{win_base}:{win_base}:ro" in data['services']['win_1']['volumes']
+
+
+def test_overlay_mode_rejects_one_base_for_several_boot_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(overlay, 'prepare_overlays', lambda *args: pytest.fail("overlays prepared"))
+    (tmp_path / 'kali.img').touch()
+    pools_file = tmp_path / 'pools.yml'
+    pools_file.write_text("pools:\n  - {name: win, boot_image: windows}\n  - {name: kali}\n")
+
+    try:
+        with pytest.raises(SystemExit):
+            render_templates(overlay_args(tmp_path, pools_file=str(pools_file), base_image=str(tmp_path / 'kali.img')))
+    finally:
+        if os.path.isdir('output'):
+            shutil.rmtree('output')
@@ -0,0 +1,100 @@
+import os
+import shutil
+import pytest
+import yaml
+from types import SimpleNamespace
+import topology
+from render import render_templates
+
+
+def make_args(**overrides):
+    args = dict(
+        num_containers=3,
+        boot_mode='legacy',
+        boot_image='kali',
+        ram_size='2G',
+        cpu_cores='2',
+        prefix=None,
+        volume_prefix='.',
+        docker_host=None,
+        docker_ca=None,
+        docker_cert=None,
+        docker_key=None,
+        force=True,
+    )
+    args.update(overrides)
+    return SimpleNamespace(**args)
+
+
+def render_compose(args):
+    try:
+        render_templates(args)
+        with open(os.path.join('output', 'docker-compose.yml'), 'r') as f:
+            return yaml.safe_load(f)
+    finally:
+        if os.path.isdir('output'):
+            shutil.rmtree('output')
+
+
+def test_cpulist_round_trip():
+    assert topology.parse_cpulist('0-3,8,10-11\n') == [0, 1, 2, 3, 8, 10, 11]
+    assert topology.format_cpulist([11, 0, 1, 2, 3, 8, 10]) == '0-3,8,10-11'
+
+
+def test_topology_is_read_from_sysfs(tmp_path):
+    for node, cpus in ((0, '0-3'), (1, '4-7')):
+        (tmp_path / f'node{node}').mkdir()
+        (tmp_path / f'node{node}' / 'cpulist').write_text(cpus + '\n')
+    (tmp_path / 'possible').write_text('0-1\n')
+    assert topology.read_topology(str(tmp_path)) == {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+
+
+def test_vms_get_disjoint_cpus_on_a_single_node():
+    placement = topology.assign_cpusets({0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}, [('a', 2), ('b', 4), ('c', 2)])
+    assert placement['b'] == (0, [0, 1, 2, 3])
+    assert {node for node, _ in placement.values()} == {0, 1}
+    cpus = [cpu for _, vm_cpus in placement.values() for cpu in vm_cpus]
+    assert len(cpus) == len(set(cpus)) == 8
+    with pytest.raises(topology.TopologyError):
+        topology.assign_cpusets({0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}, [('a', 6)])
+
+
+def test_cpu_pinning_and_hugepages_are_rendered(tmp_path):
+    topology_file = tmp_path / 'topology.yml'
+    topology_file.write_text('nodes:\n  0: 0-3\n  1: 4-7\n')
+    data = render_compose(make_args(cpu_pinning=True, topology=str(topology_file), hugepages=True))
+    services = [data['services'][f'kali_{i}'] for i in (1, 2, 3)]
+    assert [s['cpuset'] for s in services] == ['0-1', '4-5', '2-3']
+    assert all(s['cpus'] == 2 and s['mem_limit'] == '2560m' for s in services)
+    assert all(s['environment']['ARGUMENTS'] == '-mem-path /dev/hugepages -mem-prealloc' for s in services)
+    assert all('/dev/hugepages:/dev/hugepages' in s['volumes'] for s in services)
+
+    data = render_compose(make_args())
+    assert 'cpuset' not in data['services']['kali_1']
+    assert 'ARGUMENTS' not in data['services']['kali_1']['environment']
+
+
+def test_stand_in_replaces_qemu_image():
+    compose = render_compose(make_args(stand_in=True, snapshot=True, storage_backend='sparse'))
+    vm = compose['services']['kali_1']
+    assert vm['image'] == 'qemu-stand-in'
+    assert vm['build'] == '../stand-in'
+    assert 'devices' not in vm
+    assert vm['environment']['BOOT'] == 'kali'
+    assert compose['services']['container-lock']['environment']['SNAPSHOT_ENABLED'] == 'true'
+    vm = render_compose(make_args())['services']['kali_1']
+    assert vm['image'] == 'repository.ncr.ntnu.no/qemux/qemu'
+    assert '/dev/kvm' in vm['devices']
+
+
+def test_vm_healthcheck_is_fast_while_booting_and_sparse_after():
+    healthcheck = render_compose(make_args())['services']['kali_1']['healthcheck']
+    assert (healthcheck['start_interval'], healthcheck['interval']) == ('1s', '60s')
+    assert healthcheck['start_period'] == '10m'
+
+
+def test_snapshot_is_rejected_for_tmpfs_storage():
+    with pytest.raises(SystemExit):
+        render_compose(make_args(snapshot=True))
+    compose = render_compose(make_args(snapshot=True, storage_backend='sparse'))
+    assert compose['services']['kali_1']['environment']['DISK_FMT'] == 'qcow2'
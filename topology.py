@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import glob
+import os
+import re
+import yaml
+
+NODE_ROOT = '/sys/devices/system/node'
+HUGEPAGES_ROOT = '/sys/kernel/mm/hugepages'
+
+
+class TopologyError(Exception):
+    """Raised when the host topology cannot be read or the VMs do not fit on it"""
+
+
+def parse_cpulist(cpulist):
+    """Parse a kernel CPU list like '0-3,8,10-11' into a sorted list of CPU numbers"""
+    cpus = set()
+    for part in str(cpulist).strip().split(','):
+        if not part:
+            continue
+        try:
+            first, _, last = part.partition('-')
+            cpus.update(range(int(first), int(last or first) + 1))
+        except ValueError:
+            raise TopologyError(f"Invalid CPU list: {cpulist}")
+    return sorted(cpus)
+
+
+def format_cpulist(cpus):
+    """Format CPU numbers as a compact list, e.g. [0, 1, 2, 5] -> '0-2,5'"""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(f"{a}-{b}" if a != b else f"{a}" for a, b in ranges)
+
+
+def read_topology(node_root=NODE_ROOT):
+    """Map each NUMA node to its CPUs, from sysfs; a host without NUMA info is one node"""
+    nodes = {}
+    for path in glob.glob(os.path.join(node_root, 'node[0-9]*', 'cpulist')):
+        node = int(re.search(r'node(\d+)', path).group(1))
+        with open(path) as f:
+            cpus = parse_cpulist(f.read())
+        if cpus:
+            nodes[node] = cpus
+    if not nodes:
+        nodes[0] = list(range(os.cpu_count() or 1))
+    return dict(sorted(nodes.items()))
+
+
+def load_topology(path):
+    """
+    Read a topology file for a host other than this one:
+
+        nodes:
+          0: 0-15
+          1: 16-31
+    """
+    try:
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise TopologyError(f"Cannot read topology file {path}: {e}")
+    nodes = data.get('nodes') if isinstance(data, dict) else None
+    if not nodes or not isinstance(nodes, dict):
+        raise TopologyError(f"Topology file {path} needs a 'nodes' mapping of node to CPU list")
+    return {int(node): parse_cpulist(cpus) for node, cpus in sorted(nodes.items())}
+
+
+def free_hugepages(hugepages_root=HUGEPAGES_ROOT):
+    """Bytes of free hugepages of all sizes on this host, or None if unknown"""
+    total = None
+    for path in glob.glob(os.path.join(hugepages_root, 'hugepages-*kB', 'free_hugepages')):
+        size_kb = int(re.search(r'hugepages-(\d+)kB', path).group(1))
+        with open(path) as f:
+            total = (total or 0) + int(f.read()) * size_kb * 1024
+    return total
+
+
+def assign_cpusets(nodes, vms):
+    """
+    Give every VM its own CPUs, all on one NUMA node
+
+    vms is a list of (name, cores). Larger VMs are placed first, each on the
+    node with the most free CPUs, so guests neither share cores nor span nodes.
+    Returns {name: (node, [cpus])}.
+    """
+    free = {node: list(cpus) for node, cpus in nodes.items()}
+    placement = {}
+    for name, cores in sorted(vms, key=lambda vm: -vm[1]):
+        node = max(free, key=lambda n: (len(free[n]), -n))
+        if len(free[node]) < cores:
+            needed = sum(c for _, c in vms)
+            available = sum(len(cpus) for cpus in nodes.values())
+            raise TopologyError(
+                f"Cannot pin {name} to {cores} CPUs on one NUMA node: the VMs need {needed} CPUs, "
+                f"the host has {available} in {len(nodes)} node(s)"
+            )
+        placement[name] = (node, free[node][:cores])
+        free[node] = free[node][cores:]
+    return placement